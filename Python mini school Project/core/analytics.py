@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .models import Submission
+
+DEFAULTS = {
+    'TTL': 24 * 60 * 60,
+    'BUCKET_WIDTH': 10,
+}
+KEY = 'analytics:assignment:{}'
+QUANTILES = (10, 25, 50, 75, 90)
+# Submission time relative to the due date, in hours; the last edge is "late".
+TIMING_EDGES = (-168, -72, -24, -6, -1, 0, 1, 24, 72)
+TIMING_LABELS = (
+    'Over 7 days early', '3-7 days early', '1-3 days early', '6-24 hours early', '1-6 hours early',
+    'Last hour', 'Up to 1 hour late', '1-24 hours late', '1-3 days late', 'Over 3 days late',
+)
+
+
+class AnalyticsError(Exception):
+    pass
+
+
+def config(key):
+    return getattr(settings, 'GRADE_ANALYTICS', {}).get(key, DEFAULTS[key])
+
+
+def _key(assignment_id):
+    return KEY.format(assignment_id)
+
+
+def invalidate(assignment_ids):
+    cache.delete_many([_key(pk) for pk in assignment_ids])
+
+
+def bucket_edges():
+    width = config('BUCKET_WIDTH')
+    return list(range(0, 100, width)) + [100]
+
+
+def for_assignments(assignments):
+    """
+    Analytics of each assignment, keyed by id. Cached entries are read with
+    one get_many; the missing ones are computed together from a single
+    query over their submissions and cached until a grade, a submission or
+    the due date changes (see core/signals.py and grades.save_grades()).
+    """
+    if np is None:
+        raise AnalyticsError("Grade analytics require the numpy package.")
+    assignments = {assignment.id: assignment for assignment in assignments}
+    cached = cache.get_many([_key(pk) for pk in assignments])
+    results = {pk: cached[_key(pk)] for pk in assignments if _key(pk) in cached}
+    missing = [pk for pk in assignments if pk not in results]
+    if missing:
+        rows = list(Submission.objects.filter(assignment_id__in=missing).values_list('assignment_id', 'grade', 'submitted_at'))
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        grades = np.array([np.nan if row[1] is None else row[1] for row in rows], dtype=float)
+        times = np.array([row[2].timestamp() for row in rows], dtype=float)
+        fresh = {}
+        for pk in missing:
+            mine = ids == pk
+            fresh[pk] = summarize(grades[mine], (times[mine] - assignments[pk].due_date.timestamp()) / 3600)
+        cache.set_many({_key(pk): value for pk, value in fresh.items()}, config('TTL'))
+        results.update(fresh)
+    return results
+
+
+def summarize(grades, hours):
+    """
+    Figures for one assignment from its submissions' grades (NaN when
+    ungraded) and submission times in hours relative to the due date.
+    Plain floats and lists only, so the result can be cached and served as
+    JSON as is.
+    """
+    graded = grades[~np.isnan(grades)]
+    edges = bucket_edges()
+    # Bonus marks above 100 land in the top bucket, negative ones in the first.
+    histogram, _ = np.histogram(np.clip(graded, 0, 100), bins=edges)
+    timing = np.bincount(np.searchsorted(TIMING_EDGES, hours, side='left'), minlength=len(TIMING_LABELS))
+    submitted = len(hours)
+    late = int((hours > 0).sum())
+    return {
+        'submitted': submitted,
+        'graded': len(graded),
+        'grade_sum': float(graded.sum()),
+        'mean': float(graded.mean()) if len(graded) else None,
+        'std': float(graded.std()) if len(graded) else None,
+        'quantiles': {
+            f'p{q}': float(value) for q, value in zip(QUANTILES, np.percentile(graded, QUANTILES))
+        } if len(graded) else {},
+        'histogram': [
+            {'low': low, 'high': high, 'count': int(count)}
+            for low, high, count in zip(edges, edges[1:], histogram)
+        ],
+        'timing': [
+            {'label': label, 'count': int(count), 'cumulative': int(total)}
+            for label, count, total in zip(TIMING_LABELS, timing, np.cumsum(timing))
+        ],
+        'late': late,
+        'late_rate': late / submitted if submitted else None,
+    }
+
+
+def for_course(assignments):
+    """
+    Course-wide figures added up from the assignments' cached analytics:
+    counts, histogram and lateness are additive, so no further query is
+    needed. The course's quantiles are estimated from its histogram, so
+    they are accurate to within a bucket.
+    """
+    per_assignment = for_assignments(assignments)
+    summaries = list(per_assignment.values())
+    edges = bucket_edges()
+    counts = np.array([[bucket['count'] for bucket in summary['histogram']] for summary in summaries], dtype=float).reshape(-1, len(edges) - 1).sum(axis=0)
+    graded = sum(summary['graded'] for summary in summaries)
+    submitted = sum(summary['submitted'] for summary in summaries)
+    late = sum(summary['late'] for summary in summaries)
+    return {
+        'submitted': submitted,
+        'graded': graded,
+        'mean': sum(summary['grade_sum'] for summary in summaries) / graded if graded else None,
+        'quantiles': dict(zip(
+            (f'p{q}' for q in QUANTILES),
+            # Interpolates linearly inside the bucket each quantile falls in.
+            np.interp(np.array(QUANTILES) / 100 * graded, np.concatenate(([0], np.cumsum(counts))), edges).tolist(),
+        )) if graded else {},
+        'histogram': [
+            {'low': low, 'high': high, 'count': int(count)}
+            for low, high, count in zip(edges, edges[1:], counts)
+        ],
+        'late': late,
+        'late_rate': late / submitted if submitted else None,
+        'assignments': per_assignment,
+    }
@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import User, Schedule, Attendance
+
+DAY_OFFSETS = {code: i for i, (code, _) in enumerate(Schedule.DayOfWeek.choices)}
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def session_date(schedule, monday):
+    """Date on which `schedule` meets during the week starting on `monday`."""
+    return monday + timedelta(days=DAY_OFFSETS[schedule.day_of_week])
+
+
+def next_sessions(schedules, limit=5, moment=None):
+    """
+    The sessions under way or coming up from `moment` on, soonest first and
+    wrapping into next week, each with its `session_date` set. Every weekly
+    slot appears once, at its next occurrence, and counts as under way until
+    its end_time. Both halves of the week are read
+    in (day_number, start_time) order with a LIMIT. Within one course the
+    (course, day_number, start_time) index yields that order directly; the
+    dashboards span several courses, so the database sorts their matching
+    sessions first, which stays cheap at a few sessions per course.
+    """
+    moment = timezone.localtime(moment)
+    today, now = moment.weekday(), moment.time()
+    ordered = schedules.order_by('day_number', 'start_time')
+    this_week = list(ordered.filter(Q(day_number__gt=today) | Q(day_number=today, end_time__gt=now))[:limit])
+    next_week = []
+    if len(this_week) < limit:
+        next_week = list(ordered.filter(Q(day_number__lt=today) | Q(day_number=today, end_time__lte=now))[:limit - len(this_week)])
+    monday = week_start(moment.date())
+    for schedule in this_week:
+        schedule.session_date = session_date(schedule, monday)
+    for schedule in next_week:
+        schedule.session_date = session_date(schedule, monday + timedelta(weeks=1))
+    return this_week + next_week
+
+
+def enrolled_students(course):
+    return User.objects.filter(enrollment__course=course, is_active=True).order_by('last_name', 'first_name', 'username')
+
+
+def build_sheet(schedule, attendance_date, students=None):
+    """
+    Read-only attendance sheet for one session: every enrolled student with
+    their recorded status. Students without a row are shown as absent, but
+    nothing is written until the sheet is saved.
+    """
+    if students is None:
+        students = list(enrolled_students(schedule.course))
+    recorded = dict(
+        Attendance.objects.filter(schedule=schedule, date=attendance_date).values_list('student_id', 'is_present')
+    )
+    return [
+        {'student': student, 'is_present': recorded.get(student.id, False), 'recorded': student.id in recorded}
+        for student in students
+    ]
+
+
+def save_sessions(sessions, student_ids, present):
+    """
+    Upsert attendance for several sessions in one statement.
+
+    `sessions` is a list of (schedule, date) pairs, `student_ids` the enrolled
+    students and `present` a set of (schedule id, date, student id) triples.
+    Every student gets a row per session; existing rows are updated in place
+    through the (schedule, student, date) unique key.
+    """
+    rows = [
+        Attendance(
+            schedule=schedule, student_id=student_id, date=day,
+            is_present=(schedule.id, day, student_id) in present,
+        )
+        for schedule, day in sessions for student_id in student_ids
+    ]
+    with transaction.atomic():
+        Attendance.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['schedule', 'student', 'date'],
+            update_fields=['is_present'],
+            batch_size=1000,
+        )
+    return len(rows)
+
+
+def save_sheet(schedule, attendance_date, present_student_ids):
+    student_ids = list(enrolled_students(schedule.course).values_list('id', flat=True))
+    present = {(schedule.id, attendance_date, student_id) for student_id in present_student_ids}
+    return save_sessions([(schedule, attendance_date)], student_ids, present)
+
+
+def week_sessions(course, monday):
+    """(schedule, date) pairs for every session of `course` in the week starting on `monday`."""
+    return [
+        (schedule, session_date(schedule, monday))
+        for schedule in course.schedules.order_by('day_number', 'start_time')
+    ]
+
+
+def build_week(sessions, students):
+    schedule_ids = [schedule.id for schedule, _ in sessions]
+    dates = [day for _, day in sessions]
+    recorded = {}
+    if sessions:
+        recorded = {
+            (schedule_id, student_id): is_present
+            for schedule_id, student_id, is_present in Attendance.objects.filter(
+                schedule_id__in=schedule_ids, date__range=(min(dates), max(dates))
+            ).values_list('schedule_id', 'student_id', 'is_present')
+        }
+    return [
+        {
+            'student': student,
+            'cells': [
+                {'key': f'{schedule.id}:{student.id}', 'is_present': recorded.get((schedule.id, student.id), False)}
+                for schedule, _ in sessions
+            ],
+        }
+        for student in students
+    ]
+
+
+def parse_week_marks(values, sessions, student_ids):
+    """Turn posted 'schedule_id:student_id' checkbox values into present triples."""
+    dates = {schedule.id: day for schedule, day in sessions}
+    student_ids = set(student_ids)
+    present = set()
+    for value in values:
+        schedule_id, _, student_id = value.partition(':')
+        if not (schedule_id.isdigit() and student_id.isdigit()):
+            continue
+        schedule_id, student_id = int(schedule_id), int(student_id)
+        if schedule_id in dates and student_id in student_ids:
+            present.add((schedule_id, dates[schedule_id], student_id))
+    return present
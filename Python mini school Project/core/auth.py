@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import router
+
+from .models import User
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TTL': 5 * 60,
+}
+KEY = 'auth:user:{}'
+# Enough for role checks, navigation and the session hash check (password);
+# any other field is loaded on first access.
+FIELDS = (
+    'id', 'password', 'username', 'first_name', 'last_name', 'email', 'role',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+
+def config(key):
+    return getattr(settings, 'AUTH_USER_CACHE', {}).get(key, DEFAULTS[key])
+
+
+def _key(user_id):
+    return KEY.format(user_id)
+
+
+def _from_values(values):
+    # from_db() expects the values in model field order.
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(router.db_for_read(User), names, [values[name] for name in names])
+
+
+def _values(user):
+    return {name: getattr(user, name) for name in FIELDS}
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose per-request user lookup is served from the cache.
+
+    AuthenticationMiddleware resolves request.user through get_user() on
+    every request; with cached_db sessions as well, role_required checks run
+    without touching the database. Entries live for AUTH_USER_CACHE['TTL']
+    seconds and are dropped whenever the user is saved or deleted.
+    """
+    def get_user(self, user_id):
+        if not config('ENABLED'):
+            return super().get_user(user_id)
+        values = cache.get(_key(user_id))
+        if values is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(_key(user_id), _values(user), config('TTL'))
+            return user
+        user = _from_values(values)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        if not config('ENABLED'):
+            return await super().aget_user(user_id)
+        values = await cache.aget(_key(user_id))
+        if values is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(_key(user_id), _values(user), config('TTL'))
+            return user
+        user = _from_values(values)
+        return user if self.user_can_authenticate(user) else None
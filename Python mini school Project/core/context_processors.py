@@ -0,0 +1,11 @@
+from django.conf import settings
+
+DEFAULTS = {
+    'TTL': 60 * 60,
+    'VERSION': 1,
+}
+
+
+def template_fragments(request):
+    """Timeout and version for {% cache %} blocks, as `fragments.TTL` and `fragments.VERSION`."""
+    return {'fragments': {**DEFAULTS, **getattr(settings, 'TEMPLATE_FRAGMENTS', {})}}
@@ -0,0 +1,234 @@
+import asyncio
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections, connection
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import attendance, grades
+from .models import User, Course, CourseStats, Enrollment, Submission, Schedule
+
+SNAPSHOT_KEY = 'dashboard:employee_snapshot'
+SNAPSHOT_DEFAULTS = {
+    'TTL': 60,
+    'ESTIMATE_ABOVE': 1_000_000,
+}
+
+# Each dashboard is a set of independent queries keyed by context name. The
+# sync views run them one after another; the async views run them at the same
+# time. Every query is fully evaluated so that templates never hit the
+# database afterwards.
+
+
+def snapshot_config(key):
+    return getattr(settings, 'DASHBOARD_SNAPSHOT', {}).get(key, SNAPSHOT_DEFAULTS[key])
+
+
+def estimated_rows(model):
+    """The planner's row estimate for a model's table, or None when the backend has none."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 only exists once ANALYZE has run; its stat column starts with the row count.
+            try:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            except DatabaseError:
+                return None
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 for tables that were never analyzed.
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+def _is_large(model):
+    estimate = estimated_rows(model)
+    return estimate is not None and estimate > snapshot_config('ESTIMATE_ABOVE'), estimate
+
+
+def _estimated_roles(total):
+    """Split a user estimate by role using PostgreSQL's column statistics, or None elsewhere."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT most_common_vals::text::text[], most_common_freqs FROM pg_stats WHERE tablename = %s AND attname = 'role'",
+            [User._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if not row or not row[0]:
+        return None
+    return {role: round(total * freq) for role, freq in zip(row[0], row[1])}
+
+
+def users_by_role():
+    """(counts by role, estimated?) from a single grouped query, or from statistics on huge tables."""
+    large, estimate = _is_large(User)
+    if large:
+        counts = _estimated_roles(estimate)
+        if counts is not None:
+            return counts, True
+    return dict(User.objects.filter(is_active=True).values_list('role').annotate(n=Count('id')).order_by()), False
+
+
+def course_totals():
+    """
+    (course count, enrollment count, estimated?). The enrollment total is
+    summed from the per-course counters, so it never scans the enrollment
+    table; when even the course table is huge, planner estimates are used.
+    Courses are counted from their own table: one whose stats row is
+    missing (see stats.bump()) still counts.
+    """
+    large, estimate = _is_large(Course)
+    if large:
+        enrollments = estimated_rows(Enrollment)
+        if enrollments is not None:
+            return estimate, enrollments, True
+    enrollments = CourseStats.objects.aggregate(n=Sum('enrollment_count'))['n']
+    return Course.objects.count(), enrollments or 0, False
+
+
+def employee_queries():
+    return {
+        'users_by_role': users_by_role,
+        'course_totals': course_totals,
+        'recent_students': lambda: list(User.objects.filter(role='STUDENT', is_active=True).order_by('-date_joined')[:5]),
+    }
+
+
+def employee_snapshot_from(results):
+    roles, roles_estimated = results['users_by_role']
+    course_count, enrollment_count, totals_estimated = results['course_totals']
+    return {
+        'student_count': roles.get(User.Role.STUDENT, 0),
+        'instructor_count': roles.get(User.Role.INSTRUCTOR, 0),
+        'course_count': course_count,
+        'enrollment_count': enrollment_count,
+        'recent_students': results['recent_students'],
+        'roles_estimated': roles_estimated,
+        'totals_estimated': totals_estimated,
+        'estimated': roles_estimated or totals_estimated,
+        'as_of': timezone.now(),
+    }
+
+
+def employee_snapshot():
+    """Headline numbers for the employee dashboard, cached for DASHBOARD_SNAPSHOT['TTL'] seconds."""
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        snapshot = employee_snapshot_from(run(employee_queries()))
+        cache.set(SNAPSHOT_KEY, snapshot, snapshot_config('TTL'))
+    return snapshot
+
+
+async def employee_snapshot_async():
+    snapshot = await cache.aget(SNAPSHOT_KEY)
+    if snapshot is None:
+        snapshot = employee_snapshot_from(await gather(employee_queries()))
+        await cache.aset(SNAPSHOT_KEY, snapshot, snapshot_config('TTL'))
+    return snapshot
+
+
+def invalidate_employee_snapshot():
+    cache.delete(SNAPSHOT_KEY)
+
+
+def instructor_queries(user):
+    return {
+        'courses': lambda: list(
+            Course.objects.filter(instructor=user).select_related('stats').order_by('-created_at')
+        ),
+        'submissions_to_grade': lambda: list(
+            Submission.objects.filter(assignment__course__instructor=user, grade__isnull=True)
+            .select_related('student', 'assignment', 'assignment__course').order_by('submitted_at')
+        ),
+        'schedules': lambda: list(
+            Schedule.objects.filter(course__instructor=user).select_related('course').order_by('day_number', 'start_time')
+        ),
+        'next_sessions': lambda: attendance.next_sessions(
+            Schedule.objects.filter(course__instructor=user).select_related('course')
+        ),
+    }
+
+
+def _recent_grades(user):
+    summary = grades.get_summary(user)
+    recent = Submission.objects.select_related('assignment').in_bulk(summary.recent_submission_ids)
+    return summary, [recent[pk] for pk in summary.recent_submission_ids if pk in recent]
+
+
+def student_queries(user):
+    return {
+        'enrollments': lambda: list(
+            Enrollment.objects.filter(student=user).select_related('course', 'course__instructor')
+        ),
+        'grades': lambda: _recent_grades(user),
+        'schedules': lambda: list(
+            Schedule.objects.filter(course__enrollment__student=user).select_related('course', 'course__instructor')
+            .order_by('day_number', 'start_time')
+        ),
+        'next_sessions': lambda: attendance.next_sessions(
+            Schedule.objects.filter(course__enrollment__student=user).select_related('course')
+        ),
+    }
+
+
+def instructor_context(results):
+    monday = attendance.week_start(date.today())
+    for schedule in results['schedules']:
+        schedule.session_date = attendance.session_date(schedule, monday)
+    return dict(results, today=date.today())
+
+
+def student_context(results):
+    summary, recent_grades = results.pop('grades')
+    return dict(
+        results,
+        average_grade=summary.average_grade,
+        graded_count=summary.graded_count,
+        recent_grades=recent_grades,
+        today=date.today(),
+    )
+
+
+def run(queries):
+    return {name: query() for name, query in queries.items()}
+
+
+def _on_own_connection(query):
+    # Worker threads keep their own connection; treat each query like a
+    # request so CONN_MAX_AGE and broken connections are honoured.
+    def wrapper():
+        close_old_connections()
+        try:
+            return query()
+        finally:
+            close_old_connections()
+    return wrapper
+
+
+async def gather(queries):
+    """
+    Run independent queries concurrently.
+
+    The async ORM (acount(), alist() and friends) hands every call to the one
+    thread-sensitive executor, so awaiting several of them together still
+    runs them back to back. Each query here gets its own worker thread, and
+    with it its own database connection, so they really overlap.
+    """
+    results = await asyncio.gather(
+        *(sync_to_async(_on_own_connection(query), thread_sensitive=False)() for query in queries.values())
+    )
+    return dict(zip(queries, results))
@@ -0,0 +1,296 @@
+import csv
+import re
+import zipfile
+from datetime import date, datetime, time, timedelta
+from operator import attrgetter
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .models import User, Enrollment, Submission, Review
+
+CHUNK_SIZE = 2000
+
+
+class ExportError(Exception):
+    pass
+
+
+class Column:
+    def __init__(self, key, header, accessor=None):
+        self.key = key
+        self.header = header
+        self.accessor = accessor if callable(accessor) else attrgetter(accessor or key)
+
+    def value(self, obj):
+        try:
+            return self.accessor(obj)
+        except AttributeError:
+            return None
+
+
+class Dataset:
+    """
+    An exportable table: the base queryset with the joins its page already
+    uses, the available columns, which roles may export it, and which field
+    the course and date range filters apply to.
+    """
+    def __init__(self, name, queryset, columns, roles, course_field, date_field, instructor_field, extra_filters=None):
+        self.name = name
+        self.queryset = queryset
+        self.columns = columns
+        self.roles = roles
+        self.course_field = course_field
+        self.date_field = date_field
+        self.instructor_field = instructor_field
+        self.extra_filters = extra_filters or {}
+
+    def select_columns(self, keys):
+        if not keys:
+            return self.columns
+        by_key = {column.key: column for column in self.columns}
+        unknown = [key for key in keys if key not in by_key]
+        if unknown:
+            raise ExportError(f"Unknown column(s): {', '.join(unknown)}.")
+        return [by_key[key] for key in keys]
+
+    def rows(self, user, params):
+        queryset = self.queryset()
+        if user.role == User.Role.INSTRUCTOR:
+            queryset = queryset.filter(**{self.instructor_field: user})
+        if params.get('course'):
+            queryset = queryset.filter(**{self.course_field: _int(params['course'], 'course')})
+        for param, field in self.extra_filters.items():
+            if params.get(param):
+                queryset = queryset.filter(**{field: _int(params[param], param)})
+        if params.get('start'):
+            queryset = queryset.filter(**{f'{self.date_field}__gte': _day_start(params['start'])})
+        if params.get('end'):
+            queryset = queryset.filter(**{f'{self.date_field}__lt': _day_start(params['end']) + timedelta(days=1)})
+        return queryset.order_by(self.date_field, 'pk').iterator(chunk_size=CHUNK_SIZE)
+
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ExportError(f"'{name}' must be a number.")
+
+
+def _day_start(value):
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"Invalid date '{value}'; use YYYY-MM-DD.")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _full_name(user):
+    return user.get_full_name() if user else ''
+
+
+DATASETS = {
+    'gradebook': Dataset(
+        'gradebook',
+        lambda: Submission.objects.select_related('student', 'assignment', 'assignment__course'),
+        [
+            Column('course', 'Course', 'assignment.course.title'),
+            Column('assignment', 'Assignment', 'assignment.title'),
+            Column('username', 'Username', 'student.username'),
+            Column('student_name', 'Student', lambda s: _full_name(s.student)),
+            Column('student_id', 'Student ID', 'student.student_id'),
+            Column('submitted_at', 'Submitted At'),
+            Column('grade', 'Grade'),
+            Column('feedback', 'Feedback'),
+        ],
+        roles={User.Role.EMPLOYEE, User.Role.INSTRUCTOR},
+        course_field='assignment__course',
+        date_field='submitted_at',
+        instructor_field='assignment__course__instructor',
+        extra_filters={'assignment': 'assignment'},
+    ),
+    'roster': Dataset(
+        'roster',
+        lambda: Enrollment.objects.filter(student__is_active=True).select_related('student', 'course'),
+        [
+            Column('course', 'Course', 'course.title'),
+            Column('username', 'Username', 'student.username'),
+            Column('student_name', 'Student', lambda e: _full_name(e.student)),
+            Column('student_id', 'Student ID', 'student.student_id'),
+            Column('email', 'Email', 'student.email'),
+            Column('age', 'Age', 'student.age'),
+            Column('enrolled_on', 'Enrolled On'),
+        ],
+        roles={User.Role.EMPLOYEE, User.Role.INSTRUCTOR},
+        course_field='course',
+        date_field='enrolled_on',
+        instructor_field='course__instructor',
+    ),
+    'enrollments': Dataset(
+        'enrollments',
+        lambda: Enrollment.objects.filter(student__is_active=True).select_related('student', 'course', 'course__instructor'),
+        [
+            Column('username', 'Username', 'student.username'),
+            Column('student_name', 'Student', lambda e: _full_name(e.student)),
+            Column('course', 'Course', 'course.title'),
+            Column('instructor', 'Instructor', lambda e: _full_name(e.course.instructor)),
+            Column('enrolled_on', 'Enrolled On'),
+        ],
+        roles={User.Role.EMPLOYEE},
+        course_field='course',
+        date_field='enrolled_on',
+        instructor_field='course__instructor',
+    ),
+    'reviews': Dataset(
+        'reviews',
+        lambda: Review.objects.select_related('student', 'course', 'course__instructor'),
+        [
+            Column('course', 'Course', 'course.title'),
+            Column('instructor', 'Instructor', lambda r: _full_name(r.course.instructor)),
+            Column('username', 'Username', 'student.username'),
+            Column('student_name', 'Student', lambda r: _full_name(r.student)),
+            Column('rating', 'Rating'),
+            Column('comment', 'Comment'),
+            Column('created_at', 'Date', 'created_at'),
+        ],
+        roles={User.Role.EMPLOYEE},
+        course_field='course',
+        date_field='created_at',
+        instructor_field='course__instructor',
+    ),
+}
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if timezone.is_aware(value) else value.isoformat(' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+# Characters XML 1.0 does not allow anywhere in a document, even escaped.
+XML_ILLEGAL_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Spreadsheets run text starting with these as a formula.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _cell(value):
+    """
+    Text of a cell as typed by a user, made safe to open: control characters
+    XML forbids are dropped and text a spreadsheet would run as a formula
+    gets a leading apostrophe. Numbers are left alone.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return _text(value)
+    text = XML_ILLEGAL_RE.sub('', _text(value))
+    return f"'{text}" if text.startswith(FORMULA_PREFIXES) else text
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([column.header for column in columns])
+    for obj in rows:
+        yield writer.writerow([_cell(column.value(obj)) for column in columns])
+
+
+class _Sink:
+    """Write-only file object that hands written bytes back to the generator."""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_cell(value))}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def stream_xlsx(columns, rows, flush_every=500):
+    """
+    Stream a single-sheet XLSX workbook. Cells use inline strings, so no
+    shared-string table has to be held in memory; the zip is written with
+    data descriptors and drained after every batch of rows.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield sink.drain()
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'.encode()
+            )
+            sheet.write(_xlsx_row([column.header for column in columns]).encode())
+            for count, obj in enumerate(rows, start=1):
+                sheet.write(_xlsx_row([column.value(obj) for column in columns]).encode())
+                if count % flush_every == 0:
+                    yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
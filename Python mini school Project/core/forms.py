@@ -1,9 +1,22 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from .models import (
     User, Course, Lesson, Assignment, Submission, Category, 
-    Review, Enrollment, Schedule
+    Review, Enrollment, Schedule, UploadSession, GradeWeight
 )
+from .uploads import UploadError, check_file
+
+
+def validate_upload(upload, purpose):
+    """Apply the CHUNKED_UPLOADS size and type limits to a regular multipart upload."""
+    if isinstance(upload, UploadedFile):
+        try:
+            check_file(purpose, upload.name, upload.size)
+        except UploadError as e:
+            raise ValidationError(str(e))
+    return upload
+
 class UserCreationForm(forms.ModelForm):
     class Meta:
         model = User
@@ -19,6 +32,9 @@ class StudentCreationForm(forms.ModelForm):
             'password': forms.PasswordInput(),
             'date_of_birth': forms.DateInput(attrs={'type': 'date'}),
         }
+class StudentImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or XLSX with columns: username, first_name, last_name, email, password, student_id, date_of_birth.")
+    dry_run = forms.BooleanField(required=False, help_text="Validate the file without creating any users.")
 class UserEditForm(forms.ModelForm):
     class Meta:
         model = User
@@ -44,6 +60,12 @@ class CourseForm(forms.ModelForm):
         model = Course
         fields = ['title', 'description', 'category', 'instructor']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A plain role filter reads the (role, username) index; limit_choices_to
+        # alone becomes an EXISTS subquery that scans every user.
+        self.fields['instructor'].queryset = User.objects.filter(role=User.Role.INSTRUCTOR, is_active=True).order_by('username')
+
 class LessonForm(forms.ModelForm):
     class Meta:
         model = Lesson
@@ -56,13 +78,78 @@ class AssignmentForm(forms.ModelForm):
             'due_date': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
         }
 class SubmissionForm(forms.ModelForm):
+    submitted_file_upload = forms.UUIDField(required=False, widget=forms.HiddenInput())
     class Meta:
         model = Submission
         fields = ['submitted_file']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Large files arrive through a chunked upload session instead of the file input.
+        self.fields['submitted_file'].required = False
+        self.fields['submitted_file'].widget.attrs['data-upload-purpose'] = UploadSession.Purpose.SUBMISSION
+
+    def clean_submitted_file(self):
+        return validate_upload(self.cleaned_data.get('submitted_file'), UploadSession.Purpose.SUBMISSION)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('submitted_file') and not cleaned_data.get('submitted_file_upload'):
+            self.add_error('submitted_file', "Please choose a file to submit.")
+        return cleaned_data
 class GradeForm(forms.ModelForm):
     class Meta:
         model = Submission
         fields = ['grade', 'feedback']
+def _text(value):
+    # Browsers post line breaks as CRLF; what is stored may use LF.
+    return (value or '').replace('\r\n', '\n').strip()
+class BatchGradeForm(GradeForm):
+    """
+    A row of the batch grading view. The grade and feedback the row was
+    rendered with are posted back, so that rows the instructor did not edit
+    are left alone and an edit to a row changed elsewhere since the page was
+    opened can be refused instead of overwriting the newer values.
+    """
+    shown_grade = forms.FloatField(required=False, widget=forms.HiddenInput)
+    shown_feedback = forms.CharField(required=False, widget=forms.HiddenInput)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stored = (self.instance.grade, _text(self.instance.feedback))
+        self.initial.update(shown_grade=self.instance.grade, shown_feedback=self.instance.feedback or '')
+    def _shown(self):
+        return (self.cleaned_data.get('shown_grade'), _text(self.cleaned_data.get('shown_feedback')))
+    @property
+    def edited(self):
+        return (self.cleaned_data.get('grade'), _text(self.cleaned_data.get('feedback'))) != self._shown()
+    @property
+    def stale(self):
+        return self.stored != self._shown()
+# One row per existing submission of an assignment; no rows can be added.
+GradeFormSet = forms.modelformset_factory(
+    Submission, form=BatchGradeForm, extra=0, edit_only=True,
+    widgets={'feedback': forms.Textarea(attrs={'rows': 1})},
+)
+class GradeImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or XLSX with columns: student_id, grade and optionally feedback. The gradebook export works as is; a blank grade leaves the current grade unchanged.")
+    dry_run = forms.BooleanField(required=False, help_text="Validate the file without saving any grades.")
+class GradeWeightsForm(forms.Form):
+    """Weight and drop-lowest rule of every assignment type in a course."""
+    def __init__(self, course, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.course = course
+        saved = {rule.assignment_type: rule for rule in course.grade_weights.all()}
+        for value, label in Assignment.Type.choices:
+            rule = saved.get(value, GradeWeight())
+            self.fields[f'{value}_weight'] = forms.FloatField(min_value=0, initial=rule.weight, label=f"{label} weight")
+            self.fields[f'{value}_drop_lowest'] = forms.IntegerField(min_value=0, max_value=32767, initial=rule.drop_lowest, label=f"Drop lowest ({label.lower()})")
+
+    def save(self):
+        for value in Assignment.Type.values:
+            GradeWeight.objects.update_or_create(
+                course=self.course, assignment_type=value,
+                defaults={'weight': self.cleaned_data[f'{value}_weight'], 'drop_lowest': self.cleaned_data[f'{value}_drop_lowest']},
+            )
 class ReviewForm(forms.ModelForm):
     class Meta:
         model = Review
@@ -77,6 +164,8 @@ class EnrollmentForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fields['student'].queryset = User.objects.filter(role=User.Role.STUDENT, is_active=True).order_by('username')
+        self.fields['course'].queryset = Course.objects.order_by('title', 'id')
         self.fields['student'].label_from_instance = lambda obj: f"{obj.get_full_name()} ({obj.username})"
         self.fields['course'].label_from_instance = lambda obj: f"{obj.title}"
 
@@ -88,7 +177,28 @@ class ScheduleForm(forms.ModelForm):
             'start_time': forms.TimeInput(attrs={'type': 'time'}),
             'end_time': forms.TimeInput(attrs={'type': 'time'}),
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['course'].queryset = Course.objects.order_by('title', 'id')
 class LessonForm(forms.ModelForm):
+    UPLOAD_PURPOSES = {
+        'video_file': UploadSession.Purpose.LESSON_VIDEO,
+        'resource_file': UploadSession.Purpose.LESSON_RESOURCE,
+    }
+    video_file_upload = forms.UUIDField(required=False, widget=forms.HiddenInput())
+    resource_file_upload = forms.UUIDField(required=False, widget=forms.HiddenInput())
     class Meta:
         model = Lesson
-        fields = ['title', 'content', 'order', 'video_url', 'video_file', 'resource_file']
\ No newline at end of file
+        fields = ['title', 'content', 'order', 'video_url', 'video_file', 'resource_file']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, purpose in self.UPLOAD_PURPOSES.items():
+            self.fields[name].widget.attrs['data-upload-purpose'] = purpose
+
+    def clean_video_file(self):
+        return validate_upload(self.cleaned_data.get('video_file'), UploadSession.Purpose.LESSON_VIDEO)
+
+    def clean_resource_file(self):
+        return validate_upload(self.cleaned_data.get('resource_file'), UploadSession.Purpose.LESSON_RESOURCE)
\ No newline at end of file
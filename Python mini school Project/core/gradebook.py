@@ -0,0 +1,227 @@
+import warnings
+from dataclasses import dataclass, field
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .models import Assignment, GradeWeight, Submission, User
+
+PERCENTILES = (25, 50, 75)
+
+
+class GradebookError(Exception):
+    pass
+
+
+@dataclass
+class Category:
+    assignment_type: str
+    label: str
+    weight: float = 1.0
+    drop_lowest: int = 0
+    columns: list = field(default_factory=list)
+
+
+@dataclass
+class Stats:
+    graded: int
+    mean: float
+    std: float
+    percentiles: dict
+
+
+@dataclass
+class Gradebook:
+    """
+    A course's grades as a students x assignments matrix (NaN where
+    ungraded), with the results of compute() filled in.
+    """
+    students: list
+    assignments: list
+    categories: list
+    grades: object
+    dropped: object = None
+    category_averages: object = None
+    totals: object = None
+    percentile_ranks: object = None
+    assignment_stats: list = None
+    category_stats: list = None
+    total_stats: Stats = None
+
+    def order(self, sort='name'):
+        """Row indices sorted by name (the loaded order) or by total, best first with ungraded students last."""
+        if sort == 'total':
+            return np.argsort(np.where(np.isnan(self.totals), np.inf, -self.totals), kind='stable').tolist()
+        return list(range(len(self.students)))
+
+    def rows(self, indices):
+        """Template rows for the given students."""
+        for i in indices:
+            yield {
+                'student': self.students[i],
+                'cells': [
+                    (_value(self.grades[i, j]), bool(self.dropped[i, j])) for j in range(len(self.assignments))
+                ],
+                'category_averages': [_value(value) for value in self.category_averages[i]],
+                'total': _value(self.totals[i]),
+                'percentile_rank': _value(self.percentile_ranks[i]),
+            }
+
+
+def _value(number):
+    return None if np.isnan(number) else float(number)
+
+
+def _require_numpy():
+    if np is None:
+        raise GradebookError("The gradebook requires the numpy package.")
+
+
+def categories_for(course, assignments):
+    """One Category per assignment type in use, with the course's weights and drop rules (weight 1, no drops by default)."""
+    rules = {weight.assignment_type: weight for weight in GradeWeight.objects.filter(course=course)}
+    categories = []
+    for assignment_type, label in Assignment.Type.choices:
+        columns = [j for j, assignment in enumerate(assignments) if assignment.assignment_type == assignment_type]
+        if columns:
+            rule = rules.get(assignment_type)
+            categories.append(Category(
+                assignment_type, label,
+                weight=rule.weight if rule else 1.0,
+                drop_lowest=rule.drop_lowest if rule else 0,
+                columns=columns,
+            ))
+    return categories
+
+
+def load(course):
+    """
+    Build the grade matrix of `course`'s enrolled students from a single
+    query over its graded submissions. Students are in name order and
+    assignments in due date order.
+    """
+    _require_numpy()
+    students = list(
+        User.objects.filter(enrollment__course=course, is_active=True)
+        .order_by('last_name', 'first_name', 'username', 'id')
+        .only('id', 'username', 'first_name', 'last_name', 'student_id')
+    )
+    assignments = list(course.assignments.order_by('due_date', 'id').only('id', 'title', 'assignment_type', 'due_date', 'course_id'))
+    graded = Submission.objects.filter(assignment__course=course, grade__isnull=False)
+    entries = np.array(list(graded.values_list('student_id', 'assignment_id', 'grade')), dtype=float).reshape(-1, 3)
+    grades = np.full((len(students), len(assignments)), np.nan)
+    rows = _positions([student.id for student in students], entries[:, 0])
+    columns = _positions([assignment.id for assignment in assignments], entries[:, 1])
+    # Submissions of students who have since left the course have no row.
+    kept = (rows >= 0) & (columns >= 0)
+    grades[rows[kept], columns[kept]] = entries[kept, 2]
+    return Gradebook(students, assignments, categories_for(course, assignments), grades)
+
+
+def _positions(ids, values):
+    """Index of each value in `ids`, or -1 when it is not there."""
+    ids = np.asarray(ids, dtype=float)
+    if not len(ids):
+        return np.full(len(values), -1)
+    order = np.argsort(ids)
+    found = np.minimum(np.searchsorted(ids, values, sorter=order), len(ids) - 1)
+    return np.where(ids[order[found]] == values, order[found], -1)
+
+
+def compute(book):
+    """
+    Fill in `book`'s results, vectorised over all students at once:
+
+    - each category's average per student, after leaving out the student's
+      `drop_lowest` lowest grades in it (always keeping at least one);
+    - the weighted total, over the categories the student has grades in,
+      so ungraded work does not count as zero;
+    - each student's percentile rank among the students with a total;
+    - per assignment, per category and for the totals: how many are
+      graded, mean, standard deviation and PERCENTILES.
+    """
+    _require_numpy()
+    grades = book.grades
+    students = grades.shape[0]
+    book.dropped = np.zeros(grades.shape, dtype=bool)
+    book.category_averages = np.full((students, len(book.categories)), np.nan)
+    for c, category in enumerate(book.categories):
+        block = grades[:, category.columns]
+        graded = ~np.isnan(block)
+        limit = min(category.drop_lowest, block.shape[1])
+        if limit:
+            drop = np.minimum(limit, np.maximum(graded.sum(axis=1) - 1, 0))
+            # Columns of each row's `limit` lowest grades, lowest first; ungraded sort last.
+            values = np.where(graded, block, np.inf)
+            lowest = np.argpartition(values, limit - 1, axis=1)[:, :limit]
+            lowest = np.take_along_axis(lowest, np.take_along_axis(values, lowest, axis=1).argsort(axis=1, kind='stable'), axis=1)
+            dropped = np.zeros(block.shape, dtype=bool)
+            np.put_along_axis(dropped, lowest, np.arange(limit) < drop[:, None], axis=1)
+            book.dropped[:, category.columns] = dropped
+            graded &= ~dropped
+        counts = graded.sum(axis=1)
+        sums = np.where(graded, block, 0).sum(axis=1)
+        np.divide(sums, counts, out=book.category_averages[:, c], where=counts > 0)
+
+    weights = np.array([category.weight for category in book.categories], dtype=float)
+    present = ~np.isnan(book.category_averages)
+    weighted = np.where(present, book.category_averages, 0) @ weights
+    weight_sums = present @ weights
+    book.totals = np.full(students, np.nan)
+    np.divide(weighted, weight_sums, out=book.totals, where=weight_sums > 0)
+
+    book.percentile_ranks = np.full(students, np.nan)
+    has_total = ~np.isnan(book.totals)
+    if has_total.any():
+        ranked = np.sort(book.totals[has_total])
+        below = np.searchsorted(ranked, book.totals[has_total], side='left')
+        at_or_below = np.searchsorted(ranked, book.totals[has_total], side='right')
+        book.percentile_ranks[has_total] = 100 * (below + at_or_below) / (2 * len(ranked))
+
+    book.assignment_stats = column_stats(grades)
+    book.category_stats = column_stats(book.category_averages)
+    book.total_stats = column_stats(book.totals[:, None])[0]
+    return book
+
+
+def column_stats(matrix):
+    """Stats of every column of `matrix`, ignoring NaN; columns without values get NaN figures."""
+    graded = (~np.isnan(matrix)).sum(axis=0)
+    with warnings.catch_warnings():
+        # All-NaN columns are expected (nothing graded yet) and give NaN.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        means = np.nanmean(matrix, axis=0)
+        stds = np.nanstd(matrix, axis=0)
+    percentiles = _percentiles(matrix, graded)
+    return [
+        Stats(
+            graded=int(graded[j]), mean=_value(means[j]), std=_value(stds[j]),
+            percentiles={f'p{pct}': _value(percentiles[k, j]) for k, pct in enumerate(PERCENTILES)},
+        )
+        for j in range(matrix.shape[1])
+    ]
+
+
+def _percentiles(matrix, graded):
+    """
+    PERCENTILES of every column with linear interpolation, as np.nanpercentile
+    computes them, but from one sort of the whole matrix (NaN sorts last)
+    instead of a Python-level loop over the columns.
+    """
+    ordered = np.sort(matrix, axis=0)
+    positions = np.outer(np.array(PERCENTILES) / 100, np.maximum(graded - 1, 0))
+    low = np.floor(positions).astype(int)
+    high = np.ceil(positions).astype(int)
+    if not len(ordered):
+        return np.full(positions.shape, np.nan)
+    low_values = np.take_along_axis(ordered, low, axis=0)
+    high_values = np.take_along_axis(ordered, high, axis=0)
+    result = low_values + (high_values - low_values) * (positions - low)
+    result[:, graded == 0] = np.nan
+    return result
+
+
+def course_gradebook(course):
+    return compute(load(course))
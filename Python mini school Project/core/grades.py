@@ -0,0 +1,189 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Subquery, Sum, Window
+from django.db.models.functions import RowNumber
+
+from . import analytics
+from .models import User, Assignment, Enrollment, Submission, StudentGradeSummary
+
+RECENT_GRADES = 3
+
+
+def _delta(old, new):
+    """(count, sum) change caused by a submission's grade moving from old to new."""
+    return (new is not None) - (old is not None), (new or 0) - (old or 0)
+
+
+def record_grade_changes(changes):
+    """
+    Fold grade changes into the materialized summaries.
+
+    `changes` is an iterable of (submission, previous grade) pairs, taken
+    after the new grade was saved. Counts and sums are adjusted with F()
+    updates on the student summary and the matching enrollment; only the
+    short "latest graded" list is re-read.
+    """
+    _apply(
+        [(s.student_id, s.assignment.course_id, previous, s.grade) for s, previous in changes],
+        refresh=True,
+    )
+
+
+def save_grades(changes, batch_size=500):
+    """
+    Save the grade and feedback of many submissions with bulk_update and fold
+    the changes into the summaries, in one transaction. `changes` holds
+    (submission, previous grade) pairs as for record_grade_changes().
+    bulk_update sends no signals, so the assignments' cached analytics are
+    invalidated here.
+    """
+    assignment_ids = {submission.assignment_id for submission, _ in changes}
+    with transaction.atomic():
+        Submission.objects.bulk_update([s for s, _ in changes], ['grade', 'feedback'], batch_size=batch_size)
+        record_grade_changes(changes)
+        transaction.on_commit(lambda: analytics.invalidate(assignment_ids))
+
+
+def forget_grade(submission):
+    """
+    Remove a deleted submission's grade from the counters and the student's
+    latest grades, leaving missing rows alone. Called after the delete, so
+    the re-read latest grades no longer include it. The course is looked up
+    inside the enrollment UPDATE, so the submissions removed by deleting an
+    assignment, a course or a student do not each load their assignment first.
+    """
+    if submission.grade is None:
+        return
+    updates = {'graded_count': F('graded_count') - 1, 'grade_sum': F('grade_sum') - submission.grade}
+    course_id = Subquery(Assignment.objects.filter(id=submission.assignment_id).values('course_id'))
+    with transaction.atomic():
+        Enrollment.objects.filter(student_id=submission.student_id, course_id=course_id).update(**updates)
+        recent = _recent_by_student([submission.student_id]).get(submission.student_id, [])
+        StudentGradeSummary.objects.filter(student_id=submission.student_id).update(
+            recent_submission_ids=recent, **updates
+        )
+
+
+def _apply(entries, refresh):
+    per_student = defaultdict(lambda: [0, 0.0])
+    per_enrollment = defaultdict(lambda: [0, 0.0])
+    for student_id, course_id, previous, current in entries:
+        count, total = _delta(previous, current)
+        if not (count or total):
+            continue
+        for bucket in (per_student[student_id], per_enrollment[(student_id, course_id)]):
+            bucket[0] += count
+            bucket[1] += total
+
+    with transaction.atomic():
+        # One windowed query for every student's latest grades.
+        recent = _recent_by_student(list(per_student)) if refresh and per_student else {}
+        for (student_id, course_id), (count, total) in per_enrollment.items():
+            Enrollment.objects.filter(student_id=student_id, course_id=course_id).update(
+                graded_count=F('graded_count') + count, grade_sum=F('grade_sum') + total
+            )
+        for student_id, (count, total) in per_student.items():
+            updates = {'graded_count': F('graded_count') + count, 'grade_sum': F('grade_sum') + total}
+            if refresh:
+                updates['recent_submission_ids'] = recent.get(student_id, [])
+            updated = StudentGradeSummary.objects.filter(student_id=student_id).update(**updates)
+            if not updated and refresh:
+                rebuild_grade_summaries([student_id])
+
+
+def get_summary(student):
+    """
+    The student's stored summary. A student with no row yet has no grades
+    to show, so an empty unsaved one is returned; reads never write, and
+    check_grade_summaries() reports rows that are missing but needed.
+    """
+    return StudentGradeSummary.objects.filter(student=student).first() or StudentGradeSummary(student=student)
+
+
+def _scoped(queryset, student_ids):
+    if student_ids is not None:
+        queryset = queryset.filter(student_id__in=student_ids)
+    return queryset
+
+
+def _recent_by_student(student_ids):
+    """Latest graded submission ids for many students in one windowed query."""
+    ranked = _scoped(Submission.objects.filter(grade__isnull=False), student_ids).annotate(
+        rank=Window(RowNumber(), partition_by=F('student_id'), order_by=[F('assignment__due_date').desc(), F('id').desc()])
+    ).filter(rank__lte=RECENT_GRADES).order_by('student_id', 'rank')
+    recent = defaultdict(list)
+    for student_id, submission_id in ranked.values_list('student_id', 'id'):
+        recent[student_id].append(submission_id)
+    return recent
+
+
+def compute_grade_summaries(student_ids=None):
+    """Fresh (student summaries, enrollment totals) aggregated from graded submissions."""
+    students = User.objects.filter(role=User.Role.STUDENT)
+    if student_ids is not None:
+        students = students.filter(id__in=student_ids)
+    summaries = {pk: {'graded_count': 0, 'grade_sum': 0.0} for pk in students.values_list('id', flat=True)}
+    graded = _scoped(Submission.objects.filter(grade__isnull=False), student_ids)
+    for row in graded.values('student_id').annotate(n=Count('id'), total=Sum('grade')).order_by():
+        if row['student_id'] in summaries:
+            summaries[row['student_id']] = {'graded_count': row['n'], 'grade_sum': row['total']}
+    enrollments = {
+        (row['student_id'], row['assignment__course_id']): {'graded_count': row['n'], 'grade_sum': row['total']}
+        for row in graded.values('student_id', 'assignment__course_id')
+        .annotate(n=Count('id'), total=Sum('grade')).order_by()
+    }
+    return summaries, enrollments
+
+
+def _enrollments(student_ids):
+    return _scoped(Enrollment.objects.all(), student_ids).only('id', 'student_id', 'course_id', 'graded_count', 'grade_sum')
+
+
+def _close(a, b):
+    return a['graded_count'] == b['graded_count'] and abs(a['grade_sum'] - b['grade_sum']) < 1e-6
+
+
+EMPTY = {'graded_count': 0, 'grade_sum': 0.0}
+
+
+def check_grade_summaries(student_ids=None):
+    """Return (student ids, enrollment ids) whose stored summaries disagree with the submissions."""
+    summaries, enrollment_totals = compute_grade_summaries(student_ids)
+    stored = {
+        row['student_id']: row
+        for row in _scoped(StudentGradeSummary.objects.all(), student_ids).values('student_id', 'graded_count', 'grade_sum')
+    }
+    # A student without a row reads as having no grades (see get_summary()).
+    bad_students = [pk for pk, fresh in summaries.items() if not _close(stored.get(pk, EMPTY), fresh)]
+    bad_enrollments = [
+        enrollment.id for enrollment in _enrollments(student_ids).iterator()
+        if not _close(
+            {'graded_count': enrollment.graded_count, 'grade_sum': enrollment.grade_sum},
+            enrollment_totals.get((enrollment.student_id, enrollment.course_id), EMPTY),
+        )
+    ]
+    return bad_students, bad_enrollments
+
+
+def rebuild_grade_summaries(student_ids=None, batch_size=1000):
+    summaries, enrollment_totals = compute_grade_summaries(student_ids)
+    recent = _recent_by_student(student_ids)
+    enrollments = []
+    for enrollment in _enrollments(student_ids).iterator():
+        totals = enrollment_totals.get((enrollment.student_id, enrollment.course_id), EMPTY)
+        if not _close({'graded_count': enrollment.graded_count, 'grade_sum': enrollment.grade_sum}, totals):
+            enrollment.graded_count, enrollment.grade_sum = totals['graded_count'], totals['grade_sum']
+            enrollments.append(enrollment)
+    with transaction.atomic():
+        StudentGradeSummary.objects.bulk_create(
+            [
+                StudentGradeSummary(student_id=pk, recent_submission_ids=recent.get(pk, []), **values)
+                for pk, values in summaries.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=['graded_count', 'grade_sum', 'recent_submission_ids'],
+            batch_size=batch_size,
+        )
+        Enrollment.objects.bulk_update(enrollments, ['graded_count', 'grade_sum'], batch_size=batch_size)
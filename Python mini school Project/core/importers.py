@@ -0,0 +1,266 @@
+import csv
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from importlib import import_module
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.db import transaction
+
+from . import grades, search
+from .forms import GradeForm, StudentCreationForm
+from .models import User
+
+STUDENT_COLUMNS = StudentCreationForm.Meta.fields
+STUDENT_REQUIRED = ('username', 'password')
+GRADE_REQUIRED = ('student_id', 'grade')
+LOOKUP_CHUNK = 500
+# Tried in order; cp1252 is what Excel writes for "CSV" on Windows.
+CSV_ENCODINGS = ('utf-8-sig', 'cp1252')
+
+
+class ImportFileError(Exception):
+    """The uploaded file cannot be imported at all, as opposed to errors in single rows."""
+
+
+class StudentRowForm(StudentCreationForm):
+    # Uniqueness is checked once for the whole file instead of one query per row.
+    def validate_unique(self):
+        pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    errors: list = field(default_factory=list)
+    dry_run: bool = False
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def read_rows(upload, filename, required=STUDENT_REQUIRED):
+    """
+    Yield (line number, row dict) pairs from a CSV or XLSX upload. Column
+    names are matched case-insensitively with spaces read as underscores, so
+    the headers of our own exports ("Student ID") are accepted too.
+    """
+    if filename.lower().endswith('.xlsx'):
+        return _read_xlsx(upload, required)
+    if filename.lower().endswith('.csv'):
+        return _read_csv(upload, required)
+    raise ImportFileError("Only .csv and .xlsx files are supported.")
+
+
+def _column(name):
+    return name.strip().lower().replace(' ', '_')
+
+
+def _decode(data):
+    """Text of a CSV file saved as UTF-8 (with or without BOM) or, as Excel does on Windows, as cp1252."""
+    for encoding in CSV_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+    raise ImportFileError("The file's text encoding is not supported; save it as UTF-8 CSV.")
+
+
+def _read_csv(upload, required):
+    data = upload.read()
+    text = _decode(data) if isinstance(data, bytes) else data
+    reader = csv.DictReader(io.StringIO(text))
+    try:
+        _check_header([_column(name) for name in reader.fieldnames or []], required)
+        for row in reader:
+            yield reader.line_num, {_column(key): (value or '').strip() for key, value in row.items() if key}
+    except csv.Error as e:
+        raise ImportFileError(f"The file is not valid CSV (line {reader.line_num}: {e}).")
+
+
+def _read_xlsx(upload, required):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ImportFileError("XLSX import requires the openpyxl package.")
+    try:
+        workbook = load_workbook(upload, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_column(str(cell)) if cell is not None else '' for cell in next(rows, [])]
+        _check_header(header, required)
+        for line, values in enumerate(rows, start=2):
+            if all(value is None for value in values):
+                continue
+            yield line, {key: _cell_to_str(value) for key, value in zip(header, values) if key}
+    # A renamed or truncated file fails as a zip archive or in its XML parts,
+    # which read-only workbooks only parse as the rows are read.
+    except (InvalidFileException, zipfile.BadZipFile, KeyError, ValueError, ElementTree.ParseError) as e:
+        raise ImportFileError(f"The file is not a readable XLSX workbook ({e}).")
+
+
+def _cell_to_str(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _check_header(header, required):
+    missing = [column for column in required if column not in header]
+    if missing:
+        raise ImportFileError(f"Missing required column(s): {', '.join(missing)}.")
+
+
+def _existing(column, values):
+    values = list(values)
+    found = set()
+    for i in range(0, len(values), LOOKUP_CHUNK):
+        found.update(User.objects.filter(**{f'{column}__in': values[i:i + LOOKUP_CHUNK]}).values_list(column, flat=True))
+    return found
+
+
+def _hash_password(args):
+    hasher_path, password = args
+    module, name = hasher_path.rsplit('.', 1)
+    hasher = getattr(import_module(module), name)()
+    return hasher.encode(password, hasher.salt())
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash passwords with the default hasher, spread across a process pool."""
+    hasher = get_hasher()
+    hasher_path = f'{type(hasher).__module__}.{type(hasher).__qualname__}'
+    jobs = [(hasher_path, password) for password in passwords]
+    workers = workers or getattr(settings, 'STUDENT_IMPORT_WORKERS', None) or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2 * workers:
+        return [_hash_password(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_hash_password, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def import_students(upload, filename, workers=None, batch_size=500, dry_run=False):
+    """
+    Validate every row with the StudentCreationForm fields, check username and
+    student_id uniqueness against the file and the database in one pass, then
+    hash passwords in parallel and bulk insert the valid rows.
+    """
+    result = ImportResult(dry_run=dry_run)
+    candidates = []
+    for line, row in read_rows(upload, filename):
+        form = StudentRowForm({column: row.get(column, '') for column in STUDENT_COLUMNS})
+        if form.is_valid():
+            candidates.append((line, form.save(commit=False)))
+        else:
+            result.errors.append({'line': line, 'username': row.get('username', ''), 'errors': _flatten(form.errors)})
+
+    taken_usernames = _existing('username', {user.username for _, user in candidates})
+    taken_ids = _existing('student_id', {user.student_id for _, user in candidates if user.student_id})
+    seen_usernames, seen_ids, valid = {}, {}, []
+    for line, user in candidates:
+        problems = []
+        if user.username in taken_usernames:
+            problems.append("username: A user with that username already exists.")
+        elif user.username in seen_usernames:
+            problems.append(f"username: Duplicate of line {seen_usernames[user.username]}.")
+        if user.student_id:
+            if user.student_id in taken_ids:
+                problems.append("student_id: This Student ID is already in use by another user.")
+            elif user.student_id in seen_ids:
+                problems.append(f"student_id: Duplicate of line {seen_ids[user.student_id]}.")
+        seen_usernames.setdefault(user.username, line)
+        if user.student_id:
+            seen_ids.setdefault(user.student_id, line)
+        if problems:
+            result.errors.append({'line': line, 'username': user.username, 'errors': problems})
+        else:
+            valid.append(user)
+    result.errors.sort(key=lambda error: error['line'])
+
+    if dry_run or not valid:
+        result.created = len(valid) if dry_run else 0
+        return result
+
+    for user, hashed in zip(valid, hash_passwords([user.password for user in valid], workers)):
+        user.password = hashed
+        user.role = User.Role.STUDENT
+    with transaction.atomic():
+        User.objects.bulk_create(valid, batch_size=batch_size)
+        search.index_many(valid)
+    result.created = len(valid)
+    return result
+
+
+def _flatten(errors):
+    return [f"{name}: {message}" for name, messages in errors.items() for message in messages]
+
+
+@dataclass
+class GradeImportResult:
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)
+    dry_run: bool = False
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def import_grades(upload, filename, assignment, dry_run=False):
+    """
+    Grade `assignment`'s submissions from a file keyed by student_id; the
+    gradebook export can be edited and uploaded as is. A feedback column is
+    optional and keeps the current feedback when absent; likewise a blank
+    grade keeps the current grade. Every row is checked with GradeForm
+    against submissions loaded in one query, then the valid rows that
+    change something are saved with grades.save_grades().
+    """
+    result = GradeImportResult(dry_run=dry_run)
+    submissions = {
+        submission.student.student_id: submission
+        for submission in assignment.submissions.select_related('student').filter(student__student_id__isnull=False)
+    }
+    seen, changes = {}, []
+    for line, row in read_rows(upload, filename, required=GRADE_REQUIRED):
+        student_id = row.get('student_id', '')
+        submission = submissions.get(student_id)
+        if not student_id:
+            problems = ["student_id: This field is required."]
+        elif student_id in seen:
+            problems = [f"student_id: Duplicate of line {seen[student_id]}."]
+        elif submission is None:
+            problems = ["student_id: This student has not submitted this assignment."]
+        else:
+            seen[student_id] = line
+            previous = submission.grade
+            # A blank grade cell leaves the current grade, like a missing feedback column.
+            grade = row.get('grade', '') or ('' if submission.grade is None else submission.grade)
+            form = GradeForm(
+                {'grade': grade, 'feedback': row.get('feedback', submission.feedback or '')},
+                instance=submission,
+            )
+            if form.is_valid():
+                if form.has_changed():
+                    changes.append((form.instance, previous))
+                else:
+                    result.unchanged += 1
+                continue
+            problems = _flatten(form.errors)
+        result.errors.append({'line': line, 'student_id': student_id, 'errors': problems})
+
+    result.updated = len(changes)
+    if changes and not dry_run:
+        grades.save_grades(changes)
+    return result
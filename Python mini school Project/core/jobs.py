@@ -0,0 +1,208 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'THREADS': 4,
+    'POLL_INTERVAL': 1.0,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 10,
+    'BACKOFF_MAX': 60 * 60,
+    'LEASE': 15 * 60,
+    'KEEP_FINISHED': 7 * 24 * 60 * 60,
+}
+PURGE_EVERY = 60 * 60
+
+# task name -> callable, filled by the @task decorator (see core/tasks.py).
+_tasks = {}
+
+
+def config(key):
+    return getattr(settings, 'JOB_QUEUE', {}).get(key, DEFAULTS[key])
+
+
+def task(name):
+    """Register a function as a job task; it is called with the job's kwargs."""
+    def register(func):
+        _tasks[name] = func
+        return func
+    return register
+
+
+def enqueue(name, kwargs=None, *, priority=0, key=None, delay=0, max_attempts=None):
+    """
+    Queue `name` to run in a worker with `kwargs`, which must be JSON
+    serialisable. Inside a transaction the job only becomes visible when it
+    commits, and goes away if it rolls back.
+
+    With an idempotency `key`, a job is created only once: enqueueing the
+    same key again returns the existing job, whatever its status, until
+    finished jobs are purged.
+    """
+    if name not in _tasks:
+        raise ValueError(f"Unknown job task '{name}'.")
+    fields = {
+        'task': name,
+        'kwargs': kwargs or {},
+        'priority': priority,
+        'max_attempts': max_attempts or config('MAX_ATTEMPTS'),
+        'run_at': timezone.now() + timedelta(seconds=delay),
+    }
+    if key is None:
+        return Job.objects.create(**fields)
+    job, _ = Job.objects.get_or_create(key=key, defaults=fields)
+    return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying after the given number of failed attempts."""
+    return min(config('BACKOFF') * 2 ** (attempts - 1), config('BACKOFF_MAX'))
+
+
+def claim(worker, limit=1, now=None):
+    """
+    Lock up to `limit` due jobs for `worker`, highest priority first, and
+    return them. Jobs whose worker died without finishing get their lease
+    back here once it expires.
+
+    On SQLite the write transaction (BEGIN IMMEDIATE) keeps two workers from
+    claiming the same job; other databases use FOR UPDATE SKIP LOCKED.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = Job.objects.filter(status=Job.Status.RUNNING, locked_until__lt=now)
+        expired.filter(attempts__gte=F('max_attempts')).update(
+            status=Job.Status.FAILED, finished_at=now, last_error="The worker running this job stopped.",
+        )
+        expired.update(status=Job.Status.QUEUED, locked_by='', locked_until=None)
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.QUEUED, run_at__lte=now)
+            .order_by('-priority', 'run_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        lease = now + timedelta(seconds=config('LEASE'))
+        Job.objects.filter(id__in=ids).update(
+            status=Job.Status.RUNNING, attempts=F('attempts') + 1, locked_by=worker, locked_until=lease,
+        )
+        jobs = {job.id: job for job in Job.objects.filter(id__in=ids)}
+    return [jobs[pk] for pk in ids]
+
+
+def perform(job):
+    """Run a claimed job and record the outcome; a failure is retried after backoff() until max_attempts."""
+    func = _tasks.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f"No task is registered as '{job.task}'.")
+        func(**job.kwargs)
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc()
+        retry = func is not None and job.attempts < job.max_attempts
+        logger.warning("Job %s (%s) failed on attempt %s.", job.pk, job.task, job.attempts, exc_info=True)
+        updates = {'last_error': error, 'locked_by': '', 'locked_until': None}
+        if retry:
+            updates.update(status=Job.Status.QUEUED, run_at=now + timedelta(seconds=backoff(job.attempts)))
+        else:
+            updates.update(status=Job.Status.FAILED, finished_at=now)
+        Job.objects.filter(id=job.id, locked_by=job.locked_by).update(**updates)
+        return False
+    Job.objects.filter(id=job.id, locked_by=job.locked_by).update(
+        status=Job.Status.DONE, finished_at=timezone.now(), locked_by='', locked_until=None, last_error='',
+    )
+    return True
+
+
+def work_off(limit=None, worker=None):
+    """Run due jobs one at a time in this thread until none are left (or `limit` have run); returns how many ran."""
+    worker = worker or worker_name()
+    count = 0
+    while limit is None or count < limit:
+        jobs = claim(worker)
+        if not jobs:
+            break
+        perform(jobs[0])
+        count += 1
+    return count
+
+
+def purge_finished(now=None):
+    """Delete jobs that completed more than KEEP_FINISHED seconds ago, freeing their keys; failed jobs are kept."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=config('KEEP_FINISHED'))
+    return Job.objects.filter(status=Job.Status.DONE, finished_at__lt=cutoff).delete()[0]
+
+
+def _perform_in_thread(job):
+    close_old_connections()
+    try:
+        return perform(job)
+    finally:
+        close_old_connections()
+
+
+class Worker:
+    """
+    Polls the queue and runs jobs on a pool of `threads` threads. Threads
+    suit this work, which mostly waits on the database and the disk, and
+    keep every job in one process with the Django setup already done.
+    """
+
+    def __init__(self, threads=None, poll_interval=None):
+        self.threads = threads or config('THREADS')
+        self.poll_interval = config('POLL_INTERVAL') if poll_interval is None else poll_interval
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.performed = 0
+
+    def stop(self):
+        """Finish the running jobs and return from run() without claiming more."""
+        self.stopping.set()
+
+    def _reap(self, done):
+        for future in done:
+            self.performed += 1
+            if future.exception() is not None:
+                logger.error("Recording a job's outcome failed.", exc_info=future.exception())
+
+    def run(self, once=False):
+        """Work until stop() is called or, with `once`, until the queue has no due jobs left."""
+        running = set()
+        purged_at = None
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='job') as pool:
+            while not self.stopping.is_set():
+                close_old_connections()
+                jobs = claim(self.name, self.threads - len(running)) if len(running) < self.threads else []
+                running.update(pool.submit(_perform_in_thread, job) for job in jobs)
+                if not running and not jobs:
+                    if once:
+                        break
+                    if purged_at is None or timezone.now() - purged_at > timedelta(seconds=PURGE_EVERY):
+                        purge_finished()
+                        purged_at = timezone.now()
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                if not jobs or len(running) == self.threads:
+                    done, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    self._reap(done)
+            self._reap(wait(running).done)
+        close_old_connections()
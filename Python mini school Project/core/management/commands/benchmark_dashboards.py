@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from core.management.commands.benchmark_views import load_fixtures, percentile
+
+DASHBOARDS = {
+    'employee': 'employee_dashboard',
+    'instructor': 'instructor_dashboard',
+    'student': 'student_dashboard',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync dashboards with their async versions under concurrent load: the sync views "
+        "from a pool of threads as a threaded WSGI server would, the async views as concurrent tasks "
+        "on one event loop as under ASGI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=60, help="Requests per dashboard and mode.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--only', nargs='*', choices=sorted(DASHBOARDS), help="Restrict to these roles.")
+
+    def handle(self, *args, **options):
+        fixtures = load_fixtures()
+        roles = options['only'] or list(DASHBOARDS)
+        setup_test_environment()
+        try:
+            rows = []
+            for role in roles:
+                name = DASHBOARDS[role]
+                rows.append((name, 'sync', self._sync(reverse(name), fixtures[role], options)))
+                rows.append((f'{name}_async', 'async', asyncio.run(self._async(reverse(f'{name}_async'), fixtures[role], options))))
+        finally:
+            teardown_test_environment()
+        self._report(rows, options)
+
+    def _sync(self, url, user, options):
+        local = threading.local()
+
+        def fetch(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(user)
+            start = time.perf_counter()
+            response = local.client.get(url)
+            return (time.perf_counter() - start) * 1000, response.status_code
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(fetch, range(options['concurrency'])))  # warm up and log every client in
+            start = time.perf_counter()
+            samples = list(pool.map(fetch, range(options['requests'])))
+            elapsed = time.perf_counter() - start
+        return self._summary(samples, elapsed)
+
+    async def _async(self, url, user, options):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        limit = asyncio.Semaphore(options['concurrency'])
+
+        async def fetch():
+            async with limit:
+                start = time.perf_counter()
+                response = await client.get(url)
+                return (time.perf_counter() - start) * 1000, response.status_code
+
+        await asyncio.gather(*(fetch() for _ in range(options['concurrency'])))
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(fetch() for _ in range(options['requests'])))
+        elapsed = time.perf_counter() - start
+        return self._summary(samples, elapsed)
+
+    def _summary(self, samples, elapsed):
+        timings = [ms for ms, _ in samples]
+        return {
+            'status': sorted({status for _, status in samples}),
+            'rps': len(samples) / elapsed if elapsed else 0,
+            'p50_ms': percentile(timings, 50),
+            'p95_ms': percentile(timings, 95),
+        }
+
+    def _report(self, rows, options):
+        self.stdout.write(f"{options['requests']} requests per view at concurrency {options['concurrency']}")
+        header = f"{'view':<28} {'mode':<6} {'status':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, mode, row in rows:
+            status = ','.join(str(code) for code in row['status'])
+            self.stdout.write(
+                f"{name:<28} {mode:<6} {status:>8} {row['rps']:>9.1f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f}"
+            )
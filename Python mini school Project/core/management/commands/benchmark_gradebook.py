@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import gradebook
+from core.management.commands.benchmark_views import percentile
+from core.models import Assignment, Course
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the gradebook engine on a random students x assignments matrix, and optionally "
+        "loading and computing a real course's gradebook."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--assignments', type=int, default=60)
+        parser.add_argument('--exams', type=int, default=6, help="How many of the assignments are exams.")
+        parser.add_argument('--ungraded', type=float, default=0.1, help="Share of cells left ungraded.")
+        parser.add_argument('--drop-lowest', type=int, default=2)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--course', type=int, help="Also time load() + compute() for this course id.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if gradebook.np is None:
+            raise CommandError("The gradebook requires the numpy package.")
+        np = gradebook.np
+        rng = np.random.default_rng(options['seed'])
+        students, assignments = options['students'], options['assignments']
+        grades = np.round(rng.normal(75, 12, (students, assignments)).clip(0, 100), 1)
+        grades[rng.random(grades.shape) < options['ungraded']] = np.nan
+        columns = list(range(assignments))
+        exams = columns[assignments - options['exams']:]
+        categories = [
+            gradebook.Category(Assignment.Type.ASSIGNMENT, 'Assignment', 0.6, options['drop_lowest'], columns[:len(columns) - len(exams)]),
+            gradebook.Category(Assignment.Type.EXAM, 'Exam', 0.4, 0, exams),
+        ]
+        book = gradebook.Gradebook(list(range(students)), columns, categories, grades)
+        self._report(f"compute {students} x {assignments}", lambda: gradebook.compute(book), options['iterations'])
+
+        if options['course']:
+            course = Course.objects.filter(id=options['course']).first()
+            if course is None:
+                raise CommandError(f"No course with id {options['course']}.")
+            loaded = gradebook.load(course)
+            label = f"course {course.id} ({len(loaded.students)} x {len(loaded.assignments)})"
+            self._report(f"{label} load", lambda: gradebook.load(course), options['iterations'])
+            self._report(f"{label} compute", lambda: gradebook.compute(loaded), options['iterations'])
+
+    def _report(self, label, run, iterations):
+        run()
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(f"{label:<40} p50 {percentile(timings, 50):>8.2f} ms   p95 {percentile(timings, 95):>8.2f} ms")
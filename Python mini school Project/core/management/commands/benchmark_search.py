@@ -0,0 +1,69 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from core.management.commands.benchmark_views import load_fixtures, percentile
+from core.models import SearchEntry
+from core.search import terms
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure typeahead latency: prefixes of indexed titles are typed one character at a time "
+        "against the search endpoint as each role."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help="Requests per role.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        bounds = SearchEntry.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            raise CommandError("The search index is empty; run 'manage.py rebuild_search_index' first.")
+        fixtures = load_fixtures()
+        rng = random.Random(options['seed'])
+        queries = self._queries(rng, bounds, options['queries'])
+        url = reverse('search_typeahead')
+        self.stdout.write(f"{SearchEntry.objects.count()} indexed entries, {len(queries)} queries per role")
+        header = f"{'role':<12} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'avg hits':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        setup_test_environment()
+        try:
+            for role in ('employee', 'instructor', 'student'):
+                client = Client()
+                client.force_login(fixtures[role])
+                client.get(url, {'q': queries[0]})
+                timings, hits = [], 0
+                for query in queries:
+                    start = time.perf_counter()
+                    response = client.get(url, {'q': query})
+                    timings.append((time.perf_counter() - start) * 1000)
+                    hits += len(response.json()['results'])
+                self.stdout.write(
+                    f"{role:<12} {percentile(timings, 50):>9.2f} {percentile(timings, 95):>9.2f} "
+                    f"{max(timings):>9.2f} {hits / len(queries):>9.1f}"
+                )
+        finally:
+            teardown_test_environment()
+
+    def _queries(self, rng, bounds, count):
+        """Keystroke prefixes ("al", "alg", "algebra ba", ...) of titles picked at random."""
+        queries = []
+        while len(queries) < count:
+            entry = SearchEntry.objects.filter(id__gte=rng.randint(bounds['low'], bounds['high'])).order_by('id').first()
+            words = terms(entry.title) if entry else []
+            if not words:
+                continue
+            typed = ' '.join(words[:rng.randint(1, min(len(words), 3))])
+            for length in range(2, len(typed) + 1):
+                if typed[length - 1] != ' ':
+                    queries.append(typed[:length])
+        rng.shuffle(queries)
+        return queries[:count]
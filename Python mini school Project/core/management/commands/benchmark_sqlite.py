@@ -0,0 +1,153 @@
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import override_settings
+
+from core import dashboards, grades, sqlite
+from core.management.commands.benchmark_views import percentile
+from core.models import Enrollment, Submission, User
+
+# (pragmas, connection OPTIONS) per mode. "default" is what a bare SQLite
+# DATABASES entry gets: rollback journal, full fsync, deferred transactions.
+# "tuned" is core/sqlite.py's defaults, WAL included, whatever SQLITE_PRAGMAS
+# the settings override for the demo database; the runs use copies anyway.
+MODES = {
+    'default': (
+        {'JOURNAL_MODE': 'delete', 'SYNCHRONOUS': 'full', 'BUSY_TIMEOUT': None,
+         'CACHE_SIZE': None, 'MMAP_SIZE': None, 'TEMP_STORE': None},
+        {},
+    ),
+    'tuned': (
+        sqlite.DEFAULTS,
+        {'transaction_mode': 'IMMEDIATE'},
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent grading, enrolling and student dashboard reads against copies of the SQLite "
+        "database, once with SQLite's defaults and once with core/sqlite.py's pragmas and BEGIN IMMEDIATE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=10, help="Duration of each mode.")
+        parser.add_argument('--write-ratio', type=float, default=0.5, help="Share of operations that write.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark only applies to SQLite databases.")
+        workload = self._workload()
+        source = connection.settings_dict['NAME']
+        rows = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode, (pragmas, extra_options) in MODES.items():
+                copy = Path(tmp) / f'{mode}.sqlite3'
+                self._copy(source, copy)
+                rows[mode] = self._run(copy, pragmas, extra_options, workload, options)
+        self._report(rows, options)
+
+    def _workload(self):
+        submissions = list(Submission.objects.order_by('?').values_list('id', flat=True)[:500])
+        students = list(User.objects.filter(role=User.Role.STUDENT).order_by('?').values_list('id', flat=True)[:500])
+        courses = list(Enrollment.objects.values_list('course_id', flat=True).distinct()[:200])
+        if not (submissions and students and courses):
+            raise CommandError("Not enough data to benchmark; run 'manage.py seed_data' first.")
+        return {'submissions': submissions, 'students': students, 'courses': courses}
+
+    def _copy(self, source, target):
+        connections.close_all()
+        with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+            src.backup(dst)
+
+    def _run(self, path, pragmas, extra_options, workload, options):
+        db = connections.settings['default']
+        saved = db['NAME'], db['OPTIONS'], db['CONN_MAX_AGE']
+        base_options = {key: value for key, value in db['OPTIONS'].items() if key != 'transaction_mode'}
+        db['NAME'], db['OPTIONS'], db['CONN_MAX_AGE'] = str(path), {**base_options, **extra_options}, 0
+        samples, errors, lock = [], [], threading.Lock()
+        deadline = time.perf_counter() + options['seconds']
+
+        def worker(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            local_samples, local_errors = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    write = rng.random() < options['write_ratio']
+                    op = rng.choice((self._grade, self._enroll)) if write else self._read
+                    start = time.perf_counter()
+                    try:
+                        op(rng, workload)
+                    except OperationalError:
+                        local_errors += 1
+                        continue
+                    local_samples.append((write, (time.perf_counter() - start) * 1000))
+            finally:
+                connections.close_all()
+            with lock:
+                samples.extend(local_samples)
+                errors.append(local_errors)
+
+        try:
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+        finally:
+            connections.close_all()
+            db['NAME'], db['OPTIONS'], db['CONN_MAX_AGE'] = saved
+        writes = [ms for write, ms in samples if write]
+        reads = [ms for write, ms in samples if not write]
+        return {
+            'ops': len(samples) / elapsed,
+            'writes': len(writes) / elapsed,
+            'write_p95': percentile(writes, 95) if writes else 0,
+            'read_p95': percentile(reads, 95) if reads else 0,
+            'errors': sum(errors),
+        }
+
+    def _grade(self, rng, workload):
+        with transaction.atomic():
+            submission = Submission.objects.select_related('assignment').get(pk=rng.choice(workload['submissions']))
+            previous = submission.grade
+            submission.grade = round(rng.uniform(40, 100), 1)
+            submission.save(update_fields=['grade'])
+            grades.record_grade_changes([(submission, previous)])
+
+    def _enroll(self, rng, workload):
+        with transaction.atomic():
+            enrollment, created = Enrollment.objects.get_or_create(
+                student_id=rng.choice(workload['students']), course_id=rng.choice(workload['courses'])
+            )
+            if not created:
+                enrollment.delete()
+
+    def _read(self, rng, workload):
+        student = User(id=rng.choice(workload['students']), role=User.Role.STUDENT)
+        dashboards.student_context(dashboards.run(dashboards.student_queries(student)))
+
+    def _report(self, rows, options):
+        self.stdout.write(
+            f"{options['threads']} threads for {options['seconds']:g}s per mode, "
+            f"{options['write_ratio']:.0%} writes (grading and enrolling)"
+        )
+        header = f"{'mode':<8} {'ops/s':>9} {'writes/s':>9} {'write p95':>10} {'read p95':>9} {'locked':>7}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for mode, row in rows.items():
+            self.stdout.write(
+                f"{mode:<8} {row['ops']:>9.1f} {row['writes']:>9.1f} {row['write_p95']:>10.2f} "
+                f"{row['read_p95']:>9.2f} {row['errors']:>7}"
+            )
@@ -0,0 +1,86 @@
+import copy
+import time
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from core.management.commands.benchmark_views import load_fixtures, percentile
+from core.models import Review
+from core.pagination import KeysetPage
+
+TEMPLATE = 'employee/view_reviews.html'
+UNCACHED_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# name -> (cached template loader?, fragment cache enabled?)
+MODES = {
+    'no caching': (False, False),
+    'cached loader': (True, False),
+    'loader + fragments': (True, True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the review list with thousands of rows, first without any template caching, then with "
+        "the cached loader, then with warm fragment caches, and report the render time of each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--iterations', type=int, default=10)
+
+    def handle(self, *args, **options):
+        reviews = list(Review.objects.select_related('student', 'course', 'course__instructor').order_by('-created_at', '-id')[:options['rows']])
+        if not reviews:
+            raise CommandError("No reviews to render; run 'manage.py seed_data' first.")
+        request = RequestFactory().get('/employee/reviews/')
+        request.user = load_fixtures()['employee']
+        context = {'reviews': KeysetPage(self._rows(reviews, options['rows']))}
+
+        header = f"{'mode':<20} {'p50 ms':>9} {'p95 ms':>9} {'ms/row':>8}"
+        self.stdout.write(f"{TEMPLATE}, {options['rows']} rows, {options['iterations']} renders per mode")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for mode, (cached_loader, fragments) in MODES.items():
+            timings = self._measure(cached_loader, fragments, request, context, options['iterations'])
+            p50 = percentile(timings, 50)
+            self.stdout.write(f"{mode:<20} {p50:>9.2f} {percentile(timings, 95):>9.2f} {p50 / options['rows']:>8.4f}")
+
+    def _rows(self, reviews, count):
+        # Repeat the available reviews under distinct ids so every row has its own fragment.
+        rows = []
+        for pk, review in enumerate(islice(cycle(reviews), count), start=1):
+            row = copy.copy(review)
+            row.pk = pk
+            rows.append(row)
+        return rows
+
+    def _backend(self, cached_loader):
+        config = settings.TEMPLATES[0]
+        options = copy.deepcopy(config['OPTIONS'])
+        if not cached_loader:
+            options['loaders'] = UNCACHED_LOADERS
+        return DjangoTemplates({'NAME': 'benchmark', 'DIRS': config['DIRS'], 'APP_DIRS': False, 'OPTIONS': options})
+
+    def _measure(self, cached_loader, fragments, request, context, iterations):
+        fragment_cache = settings.CACHES['template_fragments'] if fragments else {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }
+        with override_settings(CACHES={**settings.CACHES, 'template_fragments': fragment_cache}):
+            caches['template_fragments'].clear()
+            backend = self._backend(cached_loader)
+            # Warm up: compiles the template once for the cached loader and fills the fragments.
+            backend.get_template(TEMPLATE).render(context, request)
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                backend.get_template(TEMPLATE).render(context, request)
+                timings.append((time.perf_counter() - start) * 1000)
+        return timings
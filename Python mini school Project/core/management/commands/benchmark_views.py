@@ -0,0 +1,232 @@
+import json
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from core import urls as core_urls
+from core.models import User, Course, Category, Enrollment
+
+# url name -> (role to log in as, or None for anonymous, kwargs built from the fixtures)
+ROUTES = {
+    'login': (None, lambda f: {}),
+    'logged_out_confirm': (None, lambda f: {}),
+    'dashboard': ('employee', lambda f: {}),
+    'employee_dashboard': ('employee', lambda f: {}),
+    'instructor_dashboard': ('instructor', lambda f: {}),
+    'student_dashboard': ('student', lambda f: {}),
+    'employee_dashboard_async': ('employee', lambda f: {}),
+    'instructor_dashboard_async': ('instructor', lambda f: {}),
+    'student_dashboard_async': ('student', lambda f: {}),
+    'create_user': ('employee', lambda f: {'role': 'student'}),
+    'import_students': ('employee', lambda f: {}),
+    'user_list': ('employee', lambda f: {'role': 'student'}),
+    'edit_user': ('employee', lambda f: {'user_id': f['student'].id}),
+    'remove_user': ('employee', lambda f: {'user_id': f['student'].id}),
+    'category_list_create': ('employee', lambda f: {}),
+    'edit_category': ('employee', lambda f: {'category_id': f['category'].id}),
+    'remove_category': ('employee', lambda f: {'category_id': f['category'].id}),
+    'course_list_create': ('employee', lambda f: {}),
+    'manage_enrollments': ('employee', lambda f: {}),
+    'remove_enrollment': ('employee', lambda f: {'enrollment_id': f['enrollment'].id}),
+    'manage_schedules': ('employee', lambda f: {}),
+    'remove_schedule': ('employee', lambda f: {'schedule_id': f['schedule'].id}),
+    'view_reviews': ('employee', lambda f: {}),
+    'instructor_create_course': ('instructor', lambda f: {}),
+    'instructor_course_detail': ('instructor', lambda f: {'course_id': f['course'].id}),
+    'view_student_roster': ('instructor', lambda f: {'course_id': f['course'].id}),
+    'instructor_gradebook': ('instructor', lambda f: {'course_id': f['course'].id}),
+    'create_lesson': ('instructor', lambda f: {'course_id': f['course'].id}),
+    'create_assignment': ('instructor', lambda f: {'course_id': f['course'].id}),
+    'create_exam': ('instructor', lambda f: {'course_id': f['course'].id}),
+    'take_attendance': ('instructor', lambda f: {'schedule_id': f['schedule'].id, 'date_str': date.today().isoformat()}),
+    'take_week_attendance': ('instructor', lambda f: {'course_id': f['course'].id, 'date_str': date.today().isoformat()}),
+    'view_submissions': ('instructor', lambda f: {'assignment_id': f['assignment'].id}),
+    'grade_submission': ('instructor', lambda f: {'submission_id': f['submission'].id}),
+    'grade_submissions': ('instructor', lambda f: {'assignment_id': f['assignment'].id}),
+    'course_analytics_json': ('instructor', lambda f: {'course_id': f['course'].id}),
+    'assignment_analytics_json': ('instructor', lambda f: {'assignment_id': f['assignment'].id}),
+    'student_course_list': ('student', lambda f: {}),
+    'enroll_course': ('student', lambda f: {'course_id': f['course'].id}),
+    'student_course_detail': ('student', lambda f: {'course_id': f['course'].id}),
+    'submit_assignment': ('student', lambda f: {'assignment_id': f['assignment'].id}),
+    'student_my_grades': ('student', lambda f: {}),
+    'add_review': ('student', lambda f: {'course_id': f['course'].id}),
+    'export_data': ('employee', lambda f: {'dataset': 'reviews'}),
+    'search_typeahead': ('employee', lambda f: {}),
+    'serve_media': ('instructor', lambda f: {'name': f['submission'].submitted_file.name}),
+}
+# POST/PUT-only routes that cannot be driven with a side-effect free GET, and
+# upload endpoints that need a live upload session.
+SKIPPED = {'logout', 'upload_start', 'upload_chunk', 'upload_complete'}
+
+
+class QueryCounter:
+    """
+    Count queries on every connection, not just this thread's.
+
+    The async dashboards fan their queries out to worker threads, each with
+    its own connection, which a CaptureQueriesContext on the request thread
+    never sees. The counter wraps this thread's connections and every
+    connection opened while it is attached.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _wrap(self, connection):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        self._wrap(connection)
+
+    def attach(self):
+        for connection in connections.all():
+            self._wrap(connection)
+        connection_created.connect(self._on_connection_created, weak=False)
+
+    def detach(self):
+        connection_created.disconnect(self._on_connection_created)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def load_fixtures():
+    """Users and objects the benchmarked routes are driven with, picked from the busiest course."""
+    course = (
+        Course.objects.filter(instructor__isnull=False)
+        .annotate(submission_count=Count('assignments__submissions'))
+        .order_by('-submission_count', 'id').first()
+    )
+    employee = User.objects.filter(role=User.Role.EMPLOYEE).first()
+    enrollment = Enrollment.objects.filter(course=course).select_related('student').first() if course else None
+    if not (course and employee and enrollment):
+        raise CommandError("Not enough data to benchmark; run 'manage.py seed_data' first.")
+    assignment = course.assignments.annotate(n=Count('submissions')).order_by('-n', 'id').first()
+    submission = assignment.submissions.first() if assignment else None
+    schedule = course.schedules.first()
+    if not (assignment and submission and schedule):
+        raise CommandError("The benchmark course needs an assignment, a submission and a schedule.")
+    return {
+        'employee': employee,
+        'instructor': course.instructor,
+        'student': enrollment.student,
+        'course': course,
+        'category': Category.objects.first(),
+        'enrollment': enrollment,
+        'assignment': assignment,
+        'submission': submission,
+        'schedule': schedule,
+    }
+
+
+class Command(BaseCommand):
+    help = "Drive every route in core/urls.py with the test client and report latency and query counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', nargs='*', help="Restrict the run to these url names.")
+        parser.add_argument('--output', help="Write the results as a JSON baseline to this path.")
+        parser.add_argument('--compare', help="Compare against a previously saved JSON baseline.")
+
+    def handle(self, *args, **options):
+        names = [p.name for p in core_urls.urlpatterns if p.name and p.name not in SKIPPED]
+        missing = [name for name in names if name not in ROUTES]
+        if missing:
+            self.stderr.write(self.style.WARNING(f"No benchmark definition for: {', '.join(missing)}"))
+        if options['only']:
+            names = [name for name in names if name in options['only']]
+
+        fixtures = load_fixtures()
+        counter = QueryCounter()
+        counter.attach()
+        setup_test_environment()
+        try:
+            clients = {None: Client()}
+            for role in ('employee', 'instructor', 'student'):
+                clients[role] = Client()
+                clients[role].force_login(fixtures[role])
+            results = {}
+            for name in names:
+                if name not in ROUTES:
+                    continue
+                role, build_kwargs = ROUTES[name]
+                url = reverse(name, kwargs=build_kwargs(fixtures))
+                results[name] = self._measure(clients[role], url, role, counter, options)
+        finally:
+            teardown_test_environment()
+            counter.detach()
+
+        baseline = self._load(options['compare']) if options['compare'] else {}
+        self._report(results, baseline)
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'iterations': options['iterations'],
+                'views': results,
+            }, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['output']}"))
+
+    def _measure(self, client, url, role, counter, options):
+        for _ in range(options['warmup']):
+            client.get(url)
+        timings, queries, status = [], 0, None
+        for _ in range(options['iterations']):
+            before = counter.count
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            queries, status = counter.count - before, response.status_code
+        return {
+            'url': url,
+            'role': role,
+            'status': status,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'queries': queries,
+        }
+
+    def _load(self, path):
+        try:
+            return json.loads(Path(path).read_text())['views']
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Could not read baseline '{path}': {exc}")
+
+    def _report(self, results, baseline):
+        header = f"{'view':<28} {'role':<11} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}"
+        if baseline:
+            header += f" {'Δp95':>9} {'Δqueries':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, row in results.items():
+            line = (
+                f"{name:<28} {row['role'] or 'anonymous':<11} {row['status']:>6} "
+                f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['queries']:>8}"
+            )
+            previous = baseline.get(name)
+            if previous:
+                line += f" {row['p95_ms'] - previous['p95_ms']:>+9.2f} {row['queries'] - previous['queries']:>+9}"
+            self.stdout.write(line)
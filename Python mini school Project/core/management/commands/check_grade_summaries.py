@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.grades import check_grade_summaries, rebuild_grade_summaries
+
+
+class Command(BaseCommand):
+    help = "Compare materialized grade summaries with the graded submissions, optionally repairing drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('student_ids', nargs='*', type=int, help="Only check these students (default: all).")
+        parser.add_argument('--fix', action='store_true', help="Rebuild the summaries that have drifted.")
+
+    def handle(self, *args, **options):
+        student_ids = options['student_ids'] or None
+        bad_students, bad_enrollments = check_grade_summaries(student_ids)
+        if not (bad_students or bad_enrollments):
+            self.stdout.write(self.style.SUCCESS("Grade summaries are consistent."))
+            return
+        self.stdout.write(
+            f"{len(bad_students)} student summary(ies) and {len(bad_enrollments)} enrollment(s) have drifted."
+        )
+        if not options['fix']:
+            raise CommandError("Run again with --fix to rebuild them.")
+        rebuild_grade_summaries(student_ids)
+        self.stdout.write(self.style.SUCCESS("Grade summaries rebuilt."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from core import uploads
+from core.storage import deduplicate
+
+
+class Command(BaseCommand):
+    help = "Rehash the media tree into content-addressed blobs, merge duplicates and recount references."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would change.")
+        parser.add_argument('--delete-orphans', action='store_true', help="Remove files and blobs no row refers to.")
+
+    def handle(self, *args, **options):
+        report = deduplicate(
+            dry_run=options['dry_run'],
+            delete_orphans=options['delete_orphans'],
+            skip_dirs=(uploads.config('TEMP_DIR'),),
+        )
+        self.stdout.write(
+            f"Rehashed {report.rehashed} file(s): {report.duplicates} duplicate(s), "
+            f"{report.reclaimed_bytes / (1024 * 1024):.1f} MB reclaimed."
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run; nothing was changed."))
+        else:
+            self.stdout.write(f"Updated {report.rows_updated} row(s); {report.blobs} blob(s) in the store.")
+        if report.missing:
+            self.stderr.write(self.style.WARNING(f"{len(report.missing)} referenced file(s) are missing from disk."))
+            for name in report.missing[:20]:
+                self.stderr.write(f"  {name}")
+        if report.orphans:
+            action = "Deleted" if options['delete_orphans'] else "Unreferenced (use --delete-orphans to remove)"
+            self.stdout.write(f"{action}: {len(report.orphans)} file(s).")
+            for name in report.orphans[:20]:
+                self.stdout.write(f"  {name}")
+        self.stdout.write(self.style.SUCCESS("Media deduplication finished."))
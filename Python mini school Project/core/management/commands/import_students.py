@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import ImportFileError, import_students
+
+
+class Command(BaseCommand):
+    help = "Bulk import students from a CSV or XLSX file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or XLSX file with StudentCreationForm columns.")
+        parser.add_argument('--workers', type=int, help="Processes used for password hashing (default: CPU count).")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Validate the file without creating any users.")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f"File not found: {path}")
+        try:
+            with path.open('rb') as upload:
+                result = import_students(
+                    upload, path.name, workers=options['workers'],
+                    batch_size=options['batch_size'], dry_run=options['dry_run'],
+                )
+        except ImportFileError as e:
+            raise CommandError(str(e))
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']} ({error['username'] or '-'}): {'; '.join(error['errors'])}")
+        verb = "would be created" if result.dry_run else "created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.created} student(s) {verb}, {len(result.errors)} row(s) rejected."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete abandoned chunked uploads and their partial files."
+
+    def handle(self, *args, **options):
+        purged = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired upload(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.stats import rebuild_course_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized course statistics from the source tables and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*', type=int, help="Only rebuild these courses (default: all).")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drifted = rebuild_course_stats(options['course_ids'] or None, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Course stats rebuilt; {drifted} course(s) had drifted."))
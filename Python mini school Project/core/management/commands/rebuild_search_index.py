@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.search import rebuild, refresh_term_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the full-text search index from courses, lessons, assignments, categories and users. "
+        "With --terms-only, just refresh the frequent-term statistics used to keep typeahead fast."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--terms-only', action='store_true', help="Only refresh the term statistics.")
+
+    def handle(self, *args, **options):
+        if options['terms_only']:
+            recorded = refresh_term_stats()
+            self.stdout.write(self.style.SUCCESS(f"Recorded {recorded} frequent term(s) and prefix(es)."))
+            return
+        with transaction.atomic():
+            total = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} entr{'y' if total == 1 else 'ies'}."))
@@ -0,0 +1,25 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import Worker, config
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs (see core/jobs.py) on a pool of threads. Stops cleanly on "
+        "SIGINT or SIGTERM once the running jobs finish."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=config('THREADS'))
+        parser.add_argument('--poll-interval', type=float, default=config('POLL_INTERVAL'), help="Seconds between polls of an empty queue.")
+        parser.add_argument('--once', action='store_true', help="Exit once no due jobs are left instead of polling.")
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options['threads'], poll_interval=options['poll_interval'])
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+        self.stdout.write(f"Worker {worker.name} running jobs on {worker.threads} thread(s).")
+        worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f"Ran {worker.performed} job(s)."))
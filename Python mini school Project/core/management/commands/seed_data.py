@@ -0,0 +1,166 @@
+import random
+from itertools import islice
+from datetime import date, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.grades import rebuild_grade_summaries
+from core.search import rebuild as rebuild_search_index
+from core.stats import rebuild_course_stats
+from core.models import (
+    User, Category, Course, Lesson, Enrollment, Assignment, Submission, Review, Schedule, Attendance
+)
+
+DAY_CODES = [code for code, _ in Schedule.DayOfWeek.choices]
+DAY_INDEX = {code: i for i, code in enumerate(DAY_CODES)}
+
+
+class Command(BaseCommand):
+    help = "Seed the database with synthetic school data using bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='seed', help="Prefix for generated usernames and names.")
+        parser.add_argument('--employees', type=int, default=2)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--instructors', type=int, default=50)
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--enrollments-per-student', type=int, default=4)
+        parser.add_argument('--lessons-per-course', type=int, default=10)
+        parser.add_argument('--assignments-per-course', type=int, default=5)
+        parser.add_argument('--schedules-per-course', type=int, default=2)
+        parser.add_argument('--attendance-weeks', type=int, default=2)
+        parser.add_argument('--submission-rate', type=float, default=0.6)
+        parser.add_argument('--graded-rate', type=float, default=0.7)
+        parser.add_argument('--review-rate', type=float, default=0.3)
+        parser.add_argument('--password', default='seedpass123', help="Password shared by every generated user.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for reproducible data.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Users with prefix '{prefix}_' already exist; choose another --prefix.")
+        if options['courses'] and not (options['categories'] and options['instructors']):
+            raise CommandError("Courses need at least one category and one instructor.")
+
+        with transaction.atomic():
+            password = make_password(options['password'])
+            categories = self._bulk(Category, [
+                Category(name=f'{prefix} category {i}', description=f'Synthetic category {i}')
+                for i in range(options['categories'])
+            ])
+            self._bulk(User, [
+                User(username=f'{prefix}_employee{i}', first_name='Employee', last_name=str(i),
+                     email=f'{prefix}_employee{i}@example.com', password=password, role=User.Role.EMPLOYEE)
+                for i in range(options['employees'])
+            ])
+            instructors = self._bulk(User, [
+                User(username=f'{prefix}_instructor{i}', first_name='Instructor', last_name=str(i),
+                     email=f'{prefix}_instructor{i}@example.com', password=password, role=User.Role.INSTRUCTOR)
+                for i in range(options['instructors'])
+            ])
+            students = self._bulk(User, [
+                User(username=f'{prefix}_student{i}', first_name='Student', last_name=str(i),
+                     email=f'{prefix}_student{i}@example.com', password=password, role=User.Role.STUDENT,
+                     student_id=f'{prefix[:8]}{i:08d}',
+                     date_of_birth=date(2000, 1, 1) + timedelta(days=self.rng.randrange(3650)))
+                for i in range(options['students'])
+            ])
+            courses = self._bulk(Course, [
+                Course(title=f'{prefix} course {i}', description=f'Synthetic course {i}',
+                       category=self.rng.choice(categories), instructor=self.rng.choice(instructors))
+                for i in range(options['courses'])
+            ])
+            self._bulk(Lesson, [
+                Lesson(course=course, title=f'Lesson {n}', content=f'Content for lesson {n}.', order=n)
+                for course in courses for n in range(1, options['lessons_per_course'] + 1)
+            ])
+            now = timezone.now()
+            assignments = self._bulk(Assignment, [
+                Assignment(course=course, title=f'Assignment {n}', description=f'Synthetic assignment {n}',
+                           due_date=now + timedelta(days=self.rng.randint(-60, 30)))
+                for course in courses for n in range(1, options['assignments_per_course'] + 1)
+            ])
+            schedules = self._bulk(Schedule, [
+                Schedule(course=course, day_of_week=day, start_time=time(8 + slot * 2), end_time=time(9 + slot * 2))
+                for course in courses
+                for slot, day in enumerate(self.rng.sample(DAY_CODES, min(options['schedules_per_course'], 7)))
+            ])
+
+            per_student = min(options['enrollments_per_student'], len(courses))
+            enrollments = self._bulk(Enrollment, [
+                Enrollment(student=student, course=course)
+                for student in students for course in self.rng.sample(courses, per_student)
+            ])
+            students_by_course = {}
+            for enrollment in enrollments:
+                students_by_course.setdefault(enrollment.course_id, []).append(enrollment.student)
+            assignments_by_course = {}
+            for assignment in assignments:
+                assignments_by_course.setdefault(assignment.course_id, []).append(assignment)
+            schedules_by_course = {}
+            for schedule in schedules:
+                schedules_by_course.setdefault(schedule.course_id, []).append(schedule)
+
+            self._stream(Submission, self._submissions(enrollments, assignments_by_course, options))
+            self._bulk(Review, [
+                Review(course_id=enrollment.course_id, student=enrollment.student,
+                       rating=self.rng.randint(1, 5), comment='Synthetic review.')
+                for enrollment in enrollments if self.rng.random() < options['review_rate']
+            ])
+            self._stream(Attendance, self._attendance(
+                schedules_by_course, students_by_course, options['attendance_weeks']
+            ))
+            # bulk_create skips the signals and hooks that maintain the denormalized tables.
+            rebuild_course_stats()
+            rebuild_grade_summaries()
+            rebuild_search_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(categories)} categories, {len(courses)} courses, {len(students)} students "
+            f"and {len(enrollments)} enrollments with prefix '{prefix}'."
+        ))
+
+    def _bulk(self, model, objs):
+        objs = list(objs)
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.stdout.write(f"  {str(model._meta.verbose_name_plural).capitalize()}: {len(objs)}")
+        return objs
+
+    def _stream(self, model, objs):
+        # Insert generated rows batch by batch so large tables never sit in memory.
+        objs, total = iter(objs), 0
+        while batch := list(islice(objs, self.batch_size)):
+            model.objects.bulk_create(batch)
+            total += len(batch)
+        self.stdout.write(f"  {str(model._meta.verbose_name_plural).capitalize()}: {total}")
+
+    def _submissions(self, enrollments, assignments_by_course, options):
+        for enrollment in enrollments:
+            for assignment in assignments_by_course.get(enrollment.course_id, []):
+                if self.rng.random() >= options['submission_rate']:
+                    continue
+                graded = self.rng.random() < options['graded_rate']
+                yield Submission(
+                    assignment=assignment, student=enrollment.student,
+                    submitted_file=f'submissions/seed_{assignment.pk}_{enrollment.student.pk}.txt',
+                    grade=round(self.rng.uniform(40, 100), 1) if graded else None,
+                    feedback='Synthetic feedback.' if graded else None,
+                )
+
+    def _attendance(self, schedules_by_course, students_by_course, weeks):
+        today = date.today()
+        monday = today - timedelta(days=today.weekday())
+        for course_id, schedules in schedules_by_course.items():
+            for schedule in schedules:
+                for week in range(1, weeks + 1):
+                    session_date = monday - timedelta(weeks=week) + timedelta(days=DAY_INDEX[schedule.day_of_week])
+                    for student in students_by_course.get(course_id, []):
+                        yield Attendance(schedule=schedule, student=student, date=session_date,
+                                         is_present=self.rng.random() < 0.85)
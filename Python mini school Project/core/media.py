@@ -0,0 +1,175 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from .models import Lesson, Submission
+from .storage import is_blob
+
+DEFAULTS = {
+    'MODE': 'django',
+    'ACCEL_PREFIX': '/protected-media/',
+    'MAX_AGE': 60 * 60,
+}
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def config(key):
+    return getattr(settings, 'MEDIA_SERVING', {}).get(key, DEFAULTS[key])
+
+
+def _references(name):
+    return (
+        Lesson.objects.filter(Q(video_file=name) | Q(resource_file=name)),
+        Submission.objects.filter(submitted_file=name),
+    )
+
+
+def check_access(user, name):
+    """
+    Lesson files are visible to the course instructor and enrolled students,
+    submissions to their student and the course instructor. Raises Http404
+    for names no row refers to and PermissionDenied otherwise.
+    """
+    lessons, submissions = _references(name)
+    if lessons.filter(Q(course__instructor=user) | Q(course__enrollment__student=user)).exists():
+        return
+    if submissions.filter(Q(student=user) | Q(assignment__course__instructor=user)).exists():
+        return
+    if lessons.exists() or submissions.exists():
+        raise PermissionDenied
+    raise Http404("No such file.")
+
+
+def parse_range(header, size):
+    """
+    Inclusive (start, end) for a single "bytes=" range, or None when the
+    header is absent, malformed or asks for several ranges, in which case the
+    whole file is sent. Raises ValueError for an unsatisfiable range.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        suffix = int(last)
+        if not suffix:
+            raise ValueError("Empty suffix range.")
+        start, end = max(size - suffix, 0), size - 1
+    if start >= size:
+        raise ValueError("Range starts past the end of the file.")
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+class RangeFile:
+    """
+    Read-only view of `length` bytes of an open file starting at `start`.
+
+    The underlying file is left positioned at `start` and fileno() is exposed,
+    so a WSGI server's file_wrapper can sendfile() the range using the
+    response's Content-Length; otherwise FileResponse reads it in blocks.
+    """
+    def __init__(self, handle, start, length):
+        self.handle = handle
+        self.remaining = length
+        handle.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.handle.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.handle.fileno()
+
+    def close(self):
+        self.handle.close()
+
+
+def _offloaded(name, path, content_type):
+    response = HttpResponse(content_type=content_type)
+    if config('MODE') == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = config('ACCEL_PREFIX') + quote(name)
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def _streamed(request, path, size, content_type, etag, last_modified):
+    byte_range = None
+    if request.META.get('HTTP_RANGE') and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    handle = open(path, 'rb')
+    if byte_range is None:
+        return FileResponse(handle, content_type=content_type)
+    start, end = byte_range
+    response = FileResponse(RangeFile(handle, start, end - start + 1), content_type=content_type, status=206)
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def serve(request, name):
+    """
+    Permission-checked media response with ETag/Last-Modified validation and
+    byte ranges. In 'x-accel-redirect' or 'x-sendfile' mode the front proxy
+    is told which file to send and handles the ranges itself.
+    """
+    try:
+        path = default_storage.path(name)
+    except SuspiciousFileOperation:
+        raise Http404("No such file.")
+    check_access(request.user, name)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise Http404("No such file.")
+
+    # Blob names embed the content hash, which makes a natural strong ETag.
+    etag = quote_etag(os.path.splitext(os.path.basename(name))[0] if is_blob(name) else f'{stat.st_size:x}-{stat.st_mtime_ns:x}')
+    last_modified = int(stat.st_mtime)
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if config('MODE') in ('x-accel-redirect', 'x-sendfile'):
+            response = _offloaded(name, path, content_type)
+        else:
+            response = _streamed(request, path, stat.st_size, content_type, etag, last_modified)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    if is_blob(name):
+        patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    else:
+        patch_cache_control(response, private=True, max_age=config('MAX_AGE'))
+    return response
@@ -0,0 +1,180 @@
+import heapq
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends import django as django_backend
+
+from . import routers
+
+logger = logging.getLogger('core.profiling')
+
+_active_profile = ContextVar('active_profile', default=None)
+
+
+class QueryRecorder:
+    """
+    execute_wrapper callable that counts queries, sums their time and keeps
+    the N slowest statements in a min-heap.
+    """
+    def __init__(self, keep):
+        self.keep = keep
+        self.count = 0
+        self.duration = 0.0
+        self.template_duration = 0.0
+        self.template_depth = 0
+        self._slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            entry = (elapsed, self.count, sql)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif elapsed > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    @property
+    def slowest(self):
+        return [
+            {'ms': round(elapsed * 1000, 3), 'sql': sql}
+            for elapsed, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+
+def _install_template_timer():
+    if getattr(django_backend.Template.render, 'profiled', False):
+        return
+    original_render = django_backend.Template.render
+
+    def render(self, context=None, request=None):
+        profile = _active_profile.get()
+        if profile is None:
+            return original_render(self, context, request)
+        # Form widgets render through the backend too; only time the outermost render.
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_duration += time.perf_counter() - start
+
+    render.profiled = True
+    django_backend.Template.render = render
+
+
+def _json_lines_handler(path, max_bytes, backup_count):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    return handler
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in per-request profiling, enabled through settings.REQUEST_PROFILING.
+
+    A sampled share of requests records the resolved URL name, query count,
+    DB time, template render time and slowest SQL. The timings are returned
+    as a Server-Timing header and each record is appended to a rotating
+    JSON-lines log.
+    """
+    def __init__(self, get_response):
+        config = getattr(settings, 'REQUEST_PROFILING', {})
+        if not config.get('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config.get('SAMPLE_RATE', 1.0)
+        self.slow_query_count = config.get('SLOW_QUERY_COUNT', 5)
+        log_file = config.get('LOG_FILE')
+        if log_file and not any(getattr(h, 'baseFilename', None) == str(Path(log_file).resolve()) for h in logger.handlers):
+            logger.addHandler(_json_lines_handler(
+                log_file, config.get('LOG_MAX_BYTES', 10 * 1024 * 1024), config.get('LOG_BACKUP_COUNT', 5)
+            ))
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        _install_template_timer()
+
+    def __call__(self, request):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(self.slow_query_count)
+        token = _active_profile.set(recorder)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries"',
+            f'tpl;dur={recorder.template_duration * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        logger.info(json.dumps({
+            'ts': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'url_name': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration * 1000, 3),
+            'template_ms': round(recorder.template_duration * 1000, 3),
+            'slowest': recorder.slowest,
+        }))
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes for core.routers.PrimaryReplicaRouter.
+
+    Unsafe requests (POST and friends) read from the primary throughout. A
+    request that wrote anything sets a short-lived signed cookie, and while
+    it is valid that browser's requests read from the primary too, so
+    replication lag never hides a user's own grade, submission or enrollment.
+    Not used when no replicas are configured.
+    """
+    SALT = 'core.routers.pin'
+
+    def __init__(self, get_response):
+        if not routers.config('REPLICAS'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        name, seconds = routers.config('COOKIE_NAME'), routers.config('STICKY_SECONDS')
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') or bool(
+            request.get_signed_cookie(name, default=None, salt=self.SALT, max_age=seconds)
+        )
+        with routers.routing_state(pinned=pinned) as state:
+            response = self.get_response(request)
+        if state.wrote:
+            response.set_signed_cookie(
+                name, '1', salt=self.SALT, max_age=seconds, httponly=True, samesite='Lax',
+                secure=request.is_secure(),
+            )
+        return response
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_course_stats(apps, schema_editor):
+    Course = apps.get_model('core', 'Course')
+    CourseStats = apps.get_model('core', 'CourseStats')
+    stats = {pk: {} for pk in Course.objects.values_list('id', flat=True)}
+    for model_name, field in (('Enrollment', 'enrollment_count'), ('Lesson', 'lesson_count'), ('Assignment', 'assignment_count')):
+        model = apps.get_model('core', model_name)
+        for row in model.objects.values('course_id').annotate(n=Count('id')).order_by():
+            stats[row['course_id']][field] = row['n']
+    Review = apps.get_model('core', 'Review')
+    for row in Review.objects.values('course_id', 'rating').annotate(n=Count('id'), total=Sum('rating')).order_by():
+        entry = stats[row['course_id']]
+        entry['review_count'] = entry.get('review_count', 0) + row['n']
+        entry['rating_sum'] = entry.get('rating_sum', 0) + row['total']
+        if 1 <= row['rating'] <= 5:
+            entry[f"rating_{row['rating']}_count"] = row['n']
+    CourseStats.objects.bulk_create(
+        [CourseStats(course_id=pk, **values) for pk, values in stats.items()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.course')),
+                ('enrollment_count', models.PositiveIntegerField(default=0)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_1_count', models.PositiveIntegerField(default=0)),
+                ('rating_2_count', models.PositiveIntegerField(default=0)),
+                ('rating_3_count', models.PositiveIntegerField(default=0)),
+                ('rating_4_count', models.PositiveIntegerField(default=0)),
+                ('rating_5_count', models.PositiveIntegerField(default=0)),
+                ('lesson_count', models.PositiveIntegerField(default=0)),
+                ('assignment_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Course stats',
+            },
+        ),
+        migrations.RunPython(backfill_course_stats, migrations.RunPython.noop),
+    ]
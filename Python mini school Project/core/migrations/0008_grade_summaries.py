@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Window
+from django.db.models.functions import RowNumber
+
+
+def backfill_grade_summaries(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    Enrollment = apps.get_model('core', 'Enrollment')
+    Submission = apps.get_model('core', 'Submission')
+    StudentGradeSummary = apps.get_model('core', 'StudentGradeSummary')
+    graded = Submission.objects.filter(grade__isnull=False)
+
+    summaries = {pk: {} for pk in User.objects.filter(role='STUDENT').values_list('id', flat=True)}
+    for row in graded.values('student_id').annotate(n=Count('id'), total=Sum('grade')).order_by():
+        if row['student_id'] in summaries:
+            summaries[row['student_id']] = {'graded_count': row['n'], 'grade_sum': row['total']}
+    ranked = graded.annotate(
+        rank=Window(RowNumber(), partition_by=F('student_id'), order_by=[F('assignment__due_date').desc(), F('id').desc()])
+    ).filter(rank__lte=3).order_by('student_id', 'rank')
+    for student_id, submission_id in ranked.values_list('student_id', 'id'):
+        if student_id in summaries:
+            summaries[student_id].setdefault('recent_submission_ids', []).append(submission_id)
+    StudentGradeSummary.objects.bulk_create(
+        [StudentGradeSummary(student_id=pk, **values) for pk, values in summaries.items()], batch_size=1000
+    )
+
+    totals = {
+        (row['student_id'], row['assignment__course_id']): (row['n'], row['total'])
+        for row in graded.values('student_id', 'assignment__course_id').annotate(n=Count('id'), total=Sum('grade')).order_by()
+    }
+    enrollments = []
+    for enrollment in Enrollment.objects.only('id', 'student_id', 'course_id').iterator():
+        if (enrollment.student_id, enrollment.course_id) in totals:
+            enrollment.graded_count, enrollment.grade_sum = totals[(enrollment.student_id, enrollment.course_id)]
+            enrollments.append(enrollment)
+    Enrollment.objects.bulk_update(enrollments, ['graded_count', 'grade_sum'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_coursestats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentGradeSummary',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='grade_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('graded_count', models.PositiveIntegerField(default=0)),
+                ('grade_sum', models.FloatField(default=0)),
+                ('recent_submission_ids', models.JSONField(default=list, help_text='Latest graded submissions, newest due date first.')),
+            ],
+            options={
+                'verbose_name_plural': 'Student grade summaries',
+            },
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='grade_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='graded_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_grade_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_media_blobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lesson',
+            name='resource_file',
+            field=models.FileField(blank=True, db_index=True, help_text='Optional: Upload a PDF or other document.', null=True, upload_to='lesson_resources/'),
+        ),
+        migrations.AlterField(
+            model_name='lesson',
+            name='video_file',
+            field=models.FileField(blank=True, db_index=True, help_text='Optional: Upload a video file directly.', null=True, upload_to='lesson_videos/'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='submitted_file',
+            field=models.FileField(db_index=True, upload_to='submissions/'),
+        ),
+    ]
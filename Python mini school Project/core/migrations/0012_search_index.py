@@ -0,0 +1,105 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:55
+
+from django.db import migrations, models
+
+FTS_TABLE = 'core_searchentry_fts'
+# Lessons and assignments are numbered by course so that scoped searches can
+# seek to a rowid range; see core/search.py.
+ROWID = (
+    "(CASE {row}.kind WHEN 'category' THEN 0 WHEN 'user' THEN 1 WHEN 'course' THEN 2 "
+    "WHEN 'lesson' THEN 4 + 2 * {row}.course_id ELSE 5 + 2 * {row}.course_id END << 32) | {row}.object_id"
+)
+VECTOR = (
+    "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', body), 'B')"
+)
+
+
+def create_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        # Contentless FTS5 table: the text lives in core_searchentry, the
+        # triggers keep the index in step with it.
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, body, content='', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6')"
+        )
+        insert = f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES ({ROWID.format(row='new')}, new.title, new.body);"
+        delete = (
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) "
+            f"VALUES ('delete', {ROWID.format(row='old')}, old.title, old.body);"
+        )
+        schema_editor.execute(f"CREATE TRIGGER core_searchentry_ai AFTER INSERT ON core_searchentry BEGIN {insert} END")
+        schema_editor.execute(f"CREATE TRIGGER core_searchentry_ad AFTER DELETE ON core_searchentry BEGIN {delete} END")
+        schema_editor.execute(f"CREATE TRIGGER core_searchentry_au AFTER UPDATE ON core_searchentry BEGIN {delete} {insert} END")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f"CREATE INDEX core_searchentry_fts_idx ON core_searchentry USING gin (({VECTOR}))")
+
+
+def drop_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for trigger in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS core_searchentry_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS core_searchentry_fts_idx")
+
+
+def backfill_search_entries(apps, schema_editor):
+    SearchEntry = apps.get_model('core', 'SearchEntry')
+
+    def documents():
+        for c in apps.get_model('core', 'Course').objects.select_related('category').iterator():
+            yield 'course', c.pk, c.pk, c.title, f'{c.description} {c.category.name}'
+        for l in apps.get_model('core', 'Lesson').objects.iterator():
+            yield 'lesson', l.pk, l.course_id, l.title, l.content
+        for a in apps.get_model('core', 'Assignment').objects.iterator():
+            yield 'assignment', a.pk, a.course_id, a.title, a.description
+        for c in apps.get_model('core', 'Category').objects.iterator():
+            yield 'category', c.pk, None, c.name, c.description or ''
+        for u in apps.get_model('core', 'User').objects.iterator():
+            names = ' '.join(filter(None, [u.first_name, u.last_name]))
+            yield 'user', u.pk, None, names or u.username, ' '.join(filter(None, [u.username, names, u.student_id]))
+
+    SearchEntry.objects.bulk_create(
+        (
+            SearchEntry(kind=kind, object_id=pk, course_id=course_id, title=title[:255], body=body)
+            for kind, pk, course_id, title, body in documents()
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_media_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('key', models.CharField(help_text="An indexed word, or a prefix followed by '*'.", max_length=100, primary_key=True, serialize=False)),
+                ('documents', models.PositiveIntegerField(help_text='Entries containing the word, or an upper bound for a prefix.')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Course'), ('lesson', 'Lesson'), ('assignment', 'Assignment'), ('category', 'Category'), ('user', 'User')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('course_id', models.PositiveIntegerField(blank=True, help_text='Course the entry belongs to, used to scope results.', null=True)),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Search entries',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='core_search_entry_unique')],
+            },
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+        migrations.RunPython(backfill_search_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='schedule',
+            options={'ordering': ['course', 'day_number', 'start_time']},
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='day_number',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(day_of_week='MON', then=models.Value(0)), models.When(day_of_week='TUE', then=models.Value(1)), models.When(day_of_week='WED', then=models.Value(2)), models.When(day_of_week='THU', then=models.Value(3)), models.When(day_of_week='FRI', then=models.Value(4)), models.When(day_of_week='SAT', then=models.Value(5)), models.When(day_of_week='SUN', then=models.Value(6))), output_field=models.PositiveSmallIntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['course', 'day_number', 'start_time'], name='core_schedule_slot_idx'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:13
+
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import migrations, models, transaction
+from django.db.models import Case, Count, F, Sum, Value, When, Window
+from django.db.models.functions import RowNumber
+
+RECENT_GRADES = 3
+MEDIA_FIELDS = {'Submission': ('submitted_file',), 'Lesson': ('video_file', 'resource_file')}
+
+
+def drop_duplicate_submissions(apps, schema_editor):
+    """
+    Keep one submission per student and assignment, as submit_assignment's
+    update_or_create intends; concurrent submits could create more. A
+    graded submission wins over ungraded ones, then the latest. Receivers
+    do not run here, so the grade counters of the students concerned and
+    the references to the dropped files are brought up to date by hand.
+    """
+    Submission = apps.get_model('core', 'Submission')
+    grade_first = Case(When(grade__isnull=True, then=Value(1)), default=Value(0))
+    ranked = Submission.objects.annotate(
+        rank=Window(RowNumber(), partition_by=[F('assignment_id'), F('student_id')], order_by=[grade_first.asc(), F('submitted_at').desc(), F('id').desc()])
+    )
+    duplicates = list(ranked.filter(rank__gt=1).values_list('id', 'student_id', 'submitted_file'))
+    if not duplicates:
+        return
+    Submission.objects.filter(id__in=[pk for pk, _, _ in duplicates]).delete()
+    rebuild_grade_counters(apps, {student_id for _, student_id, _ in duplicates})
+    release_files(apps, schema_editor, {name for _, _, name in duplicates if name})
+
+
+def rebuild_grade_counters(apps, student_ids):
+    """Recompute Enrollment and StudentGradeSummary counters, as grades.rebuild_grade_summaries() does, for some students."""
+    Submission = apps.get_model('core', 'Submission')
+    Enrollment = apps.get_model('core', 'Enrollment')
+    StudentGradeSummary = apps.get_model('core', 'StudentGradeSummary')
+    graded = Submission.objects.filter(student_id__in=student_ids, grade__isnull=False)
+
+    per_course = {
+        (row['student_id'], row['assignment__course_id']): (row['n'], row['total'])
+        for row in graded.values('student_id', 'assignment__course_id').annotate(n=Count('id'), total=Sum('grade')).order_by()
+    }
+    enrollments = list(Enrollment.objects.filter(student_id__in=student_ids))
+    for enrollment in enrollments:
+        enrollment.graded_count, enrollment.grade_sum = per_course.get((enrollment.student_id, enrollment.course_id), (0, 0.0))
+    Enrollment.objects.bulk_update(enrollments, ['graded_count', 'grade_sum'])
+
+    per_student = {
+        row['student_id']: (row['n'], row['total'])
+        for row in graded.values('student_id').annotate(n=Count('id'), total=Sum('grade')).order_by()
+    }
+    recent = defaultdict(list)
+    for student_id, submission_id in graded.order_by('student_id', '-assignment__due_date', '-id').values_list('student_id', 'id'):
+        if len(recent[student_id]) < RECENT_GRADES:
+            recent[student_id].append(submission_id)
+    summaries = list(StudentGradeSummary.objects.filter(student_id__in=student_ids))
+    for summary in summaries:
+        summary.graded_count, summary.grade_sum = per_student.get(summary.student_id, (0, 0.0))
+        summary.recent_submission_ids = recent[summary.student_id]
+    StudentGradeSummary.objects.bulk_update(summaries, ['graded_count', 'grade_sum', 'recent_submission_ids'])
+
+
+def release_files(apps, schema_editor, names):
+    """
+    Recount the references to the dropped rows' files, as storage.release()
+    would have. Files no remaining row uses are deleted once the migration
+    has committed.
+    """
+    MediaBlob = apps.get_model('core', 'MediaBlob')
+    references = Counter()
+    for model_name, fields in MEDIA_FIELDS.items():
+        model = apps.get_model('core', model_name)
+        for field_name in fields:
+            references.update(model.objects.filter(**{f'{field_name}__in': names}).values_list(field_name, flat=True))
+    for name, count in references.items():
+        MediaBlob.objects.filter(name=name).update(refcount=count)
+    unused = names - set(references)
+    MediaBlob.objects.filter(name__in=unused).delete()
+
+    def delete_files():
+        storage = FileSystemStorage(location=settings.MEDIA_ROOT)
+        for name in unused:
+            storage.delete(name)
+
+    transaction.on_commit(delete_files, using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_schedule_day_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['schedule', 'date'], name='core_attendance_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['instructor', '-created_at'], name='core_course_instructor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', 'enrolled_on'], name='core_enrollment_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['student', 'grade'], name='core_submission_student_idx'),
+        ),
+        migrations.RunPython(drop_duplicate_submissions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='submission',
+            constraint=models.UniqueConstraint(fields=('assignment', 'student'), name='core_submission_unique'),
+        ),
+    ]
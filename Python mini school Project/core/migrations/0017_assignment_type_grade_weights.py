@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:29
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='assignment_type',
+            field=models.CharField(choices=[('ASSIGNMENT', 'Assignment'), ('EXAM', 'Exam')], default='ASSIGNMENT', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='GradeWeight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assignment_type', models.CharField(choices=[('ASSIGNMENT', 'Assignment'), ('EXAM', 'Exam')], max_length=20)),
+                ('weight', models.FloatField(default=1, help_text='Share of the course total, relative to the other categories.', validators=[django.core.validators.MinValueValidator(0)])),
+                ('drop_lowest', models.PositiveSmallIntegerField(default=0, help_text="Lowest grades left out of each student's category average.")),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_weights', to='core.course')),
+            ],
+            options={
+                'unique_together': {('course', 'assignment_type')},
+            },
+        ),
+    ]
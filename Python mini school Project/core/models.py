@@ -1,6 +1,8 @@
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from datetime import date
+import uuid
 class User(AbstractUser):
     class Role(models.TextChoices):
         EMPLOYEE = "EMPLOYEE", "Employee"
@@ -18,6 +20,8 @@ class User(AbstractUser):
         blank=True, 
         null=True
     )
+    class Meta(AbstractUser.Meta):
+        indexes = [models.Index(fields=['role', 'username'], name='core_user_role_username_idx')]
     @property
     def age(self):
         if self.date_of_birth:
@@ -44,6 +48,11 @@ class Course(models.Model):
         limit_choices_to={'role': User.Role.INSTRUCTOR}
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['title', 'id'], name='core_course_title_idx'),
+            models.Index(fields=['instructor', '-created_at'], name='core_course_instructor_idx'),
+        ]
     def __str__(self):
         return self.title
 
@@ -61,28 +70,56 @@ class Enrollment(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': User.Role.STUDENT})
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     enrolled_on = models.DateTimeField(auto_now_add=True)
+    graded_count = models.PositiveIntegerField(default=0)
+    grade_sum = models.FloatField(default=0)
     class Meta:
         unique_together = ('student', 'course')
+        indexes = [
+            models.Index(fields=['-enrolled_on', '-id'], name='core_enrollment_recent_idx'),
+            models.Index(fields=['course', 'enrolled_on'], name='core_enrollment_course_idx'),
+        ]
     def __str__(self):
         return f"{self.student.username} enrolled in {self.course.title}"
+    @property
+    def average_grade(self):
+        if self.graded_count:
+            return self.grade_sum / self.graded_count
+        return None
 
 class Assignment(models.Model):
+    class Type(models.TextChoices):
+        ASSIGNMENT = "ASSIGNMENT", "Assignment"
+        EXAM = "EXAM", "Exam"
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='assignments')
     title = models.CharField(max_length=200)
     description = models.TextField()
     due_date = models.DateTimeField()
+    assignment_type = models.CharField(max_length=20, choices=Type.choices, default=Type.ASSIGNMENT)
     def __str__(self):
         return self.title
     def get_submission_for_student(self, student):
         return self.submissions.filter(student=student).first()
 
+class GradeWeight(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='grade_weights')
+    assignment_type = models.CharField(max_length=20, choices=Assignment.Type.choices)
+    weight = models.FloatField(default=1, validators=[MinValueValidator(0)], help_text="Share of the course total, relative to the other categories.")
+    drop_lowest = models.PositiveSmallIntegerField(default=0, help_text="Lowest grades left out of each student's category average.")
+    class Meta:
+        unique_together = ('course', 'assignment_type')
+    def __str__(self):
+        return f"{self.course.title}: {self.get_assignment_type_display()} weighs {self.weight:g}"
+
 class Submission(models.Model):
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='submissions')
     student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': User.Role.STUDENT})
-    submitted_file = models.FileField(upload_to='submissions/')
+    submitted_file = models.FileField(upload_to='submissions/', db_index=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
     grade = models.FloatField(null=True, blank=True, help_text="Grade in percentage, e.g., 85.5")
     feedback = models.TextField(blank=True, null=True)
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['assignment', 'student'], name='core_submission_unique')]
+        indexes = [models.Index(fields=['student', 'grade'], name='core_submission_student_idx')]
     def __str__(self):
         return f"Submission by {self.student.username} for {self.assignment.title}"
 
@@ -92,6 +129,9 @@ class Review(models.Model):
     rating = models.PositiveIntegerField(help_text="Rating from 1 to 5.")
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        indexes = [models.Index(fields=['-created_at', '-id'], name='core_review_recent_idx')]
     def __str__(self):
         return f"Review for {self.course.title} by {self.student.username}"
     
@@ -107,12 +147,22 @@ class Schedule(models.Model):
 
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='schedules')
     day_of_week = models.CharField(max_length=3, choices=DayOfWeek.choices)
+    # 0 for Monday to 6 for Sunday, computed by the database so that it is
+    # right for bulk inserts and updates too; the day codes sort alphabetically.
+    day_number = models.GeneratedField(
+        expression=models.Case(
+            *(models.When(day_of_week=code, then=models.Value(n)) for n, code in enumerate(DayOfWeek.values))
+        ),
+        output_field=models.PositiveSmallIntegerField(),
+        db_persist=True,
+    )
     start_time = models.TimeField()
     end_time = models.TimeField()
 
     class Meta:
         unique_together = ('course', 'day_of_week', 'start_time')
-        ordering = ['course', 'day_of_week']
+        ordering = ['course', 'day_number', 'start_time']
+        indexes = [models.Index(fields=['course', 'day_number', 'start_time'], name='core_schedule_slot_idx')]
 
     def __str__(self):
         return f"{self.course.title} on {self.get_day_of_week_display()} at {self.start_time.strftime('%I:%M %p')}"
@@ -124,6 +174,7 @@ class Attendance(models.Model):
     is_present = models.BooleanField(default=False)
     class Meta:
         unique_together = ('schedule', 'student', 'date')
+        indexes = [models.Index(fields=['schedule', 'date'], name='core_attendance_session_idx')]
     def __str__(self):
         status = "Present" if self.is_present else "Absent"
         return f"{self.student.username} on {self.date} for {self.schedule.course.title} - {status}"
@@ -140,12 +191,14 @@ class Lesson(models.Model):
     )
     video_file = models.FileField(
         upload_to='lesson_videos/', 
+        db_index=True,
         blank=True, 
         null=True, 
         help_text="Optional: Upload a video file directly."
     )
     resource_file = models.FileField(
         upload_to='lesson_resources/', 
+        db_index=True,
         blank=True, 
         null=True, 
         help_text="Optional: Upload a PDF or other document."
@@ -154,3 +207,141 @@ class Lesson(models.Model):
         ordering = ['order']
     def __str__(self):
         return f"{self.course.title} - Lesson {self.order}: {self.title}"
+
+
+class CourseStats(models.Model):
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    enrollment_count = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    lesson_count = models.PositiveIntegerField(default=0)
+    assignment_count = models.PositiveIntegerField(default=0)
+    class Meta:
+        verbose_name_plural = "Course stats"
+    def __str__(self):
+        return f"Stats for {self.course.title}"
+    @property
+    def avg_rating(self):
+        if self.review_count:
+            return self.rating_sum / self.review_count
+        return None
+    @property
+    def rating_histogram(self):
+        return [(rating, getattr(self, f'rating_{rating}_count')) for rating in range(1, 6)]
+
+
+class StudentGradeSummary(models.Model):
+    student = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='grade_summary')
+    graded_count = models.PositiveIntegerField(default=0)
+    grade_sum = models.FloatField(default=0)
+    recent_submission_ids = models.JSONField(default=list, help_text="Latest graded submissions, newest due date first.")
+    class Meta:
+        verbose_name_plural = "Student grade summaries"
+    def __str__(self):
+        return f"Grade summary for {self.student.username}"
+    @property
+    def average_grade(self):
+        if self.graded_count:
+            return self.grade_sum / self.graded_count
+        return None
+
+
+class UploadSession(models.Model):
+    class Purpose(models.TextChoices):
+        SUBMISSION = "SUBMISSION", "Assignment Submission"
+        LESSON_VIDEO = "LESSON_VIDEO", "Lesson Video"
+        LESSON_RESOURCE = "LESSON_RESOURCE", "Lesson Resource"
+    class Status(models.TextChoices):
+        ACTIVE = "ACTIVE", "Active"
+        COMPLETE = "COMPLETE", "Complete"
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    purpose = models.CharField(max_length=20, choices=Purpose.choices)
+    target_id = models.PositiveIntegerField(help_text="Assignment id for submissions, course id for lesson files.")
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.ACTIVE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        indexes = [models.Index(fields=['updated_at'], name='core_upload_updated_idx')]
+    def __str__(self):
+        return f"{self.get_purpose_display()} upload '{self.filename}' by {self.owner.username}"
+    @property
+    def is_complete(self):
+        return self.status == self.Status.COMPLETE
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, primary_key=True, help_text="Storage path, derived from the content hash.")
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    def __str__(self):
+        return f"{self.name} ({self.refcount} reference(s))"
+
+
+class SearchEntry(models.Model):
+    class Kind(models.TextChoices):
+        COURSE = "course", "Course"
+        LESSON = "lesson", "Lesson"
+        ASSIGNMENT = "assignment", "Assignment"
+        CATEGORY = "category", "Category"
+        USER = "user", "User"
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.PositiveIntegerField()
+    course_id = models.PositiveIntegerField(null=True, blank=True, help_text="Course the entry belongs to, used to scope results.")
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    class Meta:
+        verbose_name_plural = "Search entries"
+        constraints = [models.UniqueConstraint(fields=['kind', 'object_id'], name='core_search_entry_unique')]
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
+
+
+class SearchTerm(models.Model):
+    key = models.CharField(max_length=100, primary_key=True, help_text="An indexed word, or a prefix followed by '*'.")
+    documents = models.PositiveIntegerField(help_text="Entries containing the word, or an upper bound for a prefix.")
+    def __str__(self):
+        return f"{self.key} ({self.documents} entries)"
+
+
+class Job(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = "QUEUED", "Queued"
+        RUNNING = "RUNNING", "Running"
+        DONE = "DONE", "Done"
+        FAILED = "FAILED", "Failed"
+    task = models.CharField(max_length=100, help_text="Name the task was registered under in core.jobs.")
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0, help_text="Higher runs first.")
+    key = models.CharField(
+        max_length=200, unique=True, null=True, blank=True,
+        help_text="Idempotency key: a job is enqueued only once per key.",
+    )
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(help_text="Not run before this time; pushed back after each failure.")
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at', 'id'], name='core_job_claim_idx'),
+            models.Index(fields=['status', 'finished_at'], name='core_job_finished_idx'),
+        ]
+    def __str__(self):
+        return f"{self.task} job #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,111 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over an indexed ordering key.
+
+    Instead of OFFSET, each page filters on the ordering values of the last
+    row seen, so page 1000 costs the same index range scan as page 1. The
+    primary key is appended to the ordering as a tie-breaker when missing.
+    """
+    def __init__(self, queryset, ordering, per_page=None):
+        self.queryset = queryset
+        self.per_page = per_page or getattr(settings, 'KEYSET_PAGE_SIZE', 50)
+        opts = queryset.model._meta
+        keys = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        if not any(name in ('pk', opts.pk.name) for name, _ in keys):
+            keys.append((opts.pk.name, keys[-1][1] if keys else False))
+        self.keys = [(opts.pk.name if name == 'pk' else name, desc) for name, desc in keys]
+        self.fields = [opts.get_field(name) for name, _ in self.keys]
+
+    def _ordering(self, backwards):
+        return [('-' if desc != backwards else '') + name for name, desc in self.keys]
+
+    def _after(self, values, backwards):
+        condition = Q()
+        for i, (name, desc) in enumerate(self.keys):
+            lookup = 'lt' if desc != backwards else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[i]})
+            for j in range(i):
+                clause &= Q(**{self.keys[j][0]: values[j]})
+            condition |= clause
+        return condition
+
+    def encode(self, direction, obj):
+        payload = [direction] + [field.value_to_string(obj) for field in self.fields]
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, *values = json.loads(raw)
+            if direction not in ('n', 'p') or len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            return direction, [field.to_python(value) for field, value in zip(self.fields, values)]
+        # ValidationError: values that do not fit the field, e.g. a word for an id.
+        except (ValueError, TypeError, binascii.Error, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+
+    def page(self, cursor=None):
+        direction, values = self.decode(cursor) if cursor else ('n', None)
+        backwards = direction == 'p'
+        queryset = self.queryset.order_by(*self._ordering(backwards))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, backwards))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode('n', rows[-1]) if rows and has_next else None,
+            previous_cursor=self.encode('p', rows[0]) if rows and has_previous else None,
+        )
+
+
+def paginate(request, queryset, ordering, per_page=None):
+    paginator = KeysetPaginator(queryset, ordering, per_page)
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return paginator.page()
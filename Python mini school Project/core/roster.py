@@ -0,0 +1,67 @@
+from django.db.models import Avg, Case, Count, Exists, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Assignment, Attendance, Enrollment, Submission
+
+# Roster columns that can be sorted on, with the fields they sort by. Names
+# break ties; figures a student has none of yet (no grade, no attendance
+# taken) sort last either way.
+SORTS = {
+    'name': ('student__last_name', 'student__first_name', 'student__username'),
+    'student_id': ('student__student_id',),
+    'enrolled_on': ('enrolled_on',),
+    'submitted': ('submitted',),
+    'average': ('average',),
+    'missing': ('missing',),
+    'attendance': ('attendance_rate',),
+}
+NAME_ORDER = SORTS['name'] + ('id',)
+
+
+def _per_row(queryset, group_by, aggregate, default=None):
+    """`aggregate` over `queryset` as a correlated subquery, one value per roster row."""
+    subquery = Subquery(queryset.order_by().values(group_by).annotate(value=aggregate).values('value'))
+    return subquery if default is None else Coalesce(subquery, default)
+
+
+def course_roster(course, sort='name', descending=False, now=None):
+    """
+    `course`'s enrollments with the student and each student's figures, in
+    a single query however many students are enrolled:
+
+    - `submitted`: submissions to the course's assignments;
+    - `average`: average grade, from the counters kept on the enrollment
+      (see grades.record_grade_changes());
+    - `missing`: assignments past their due date without a submission;
+    - `attendance_rate`: percentage of the attendance records marked present.
+    """
+    now = now or timezone.now()
+    student = OuterRef('student_id')
+    past_due = Assignment.objects.filter(course=course, due_date__lte=now).exclude(
+        Exists(Submission.objects.filter(assignment=OuterRef('pk'), student=OuterRef(student)))
+    )
+    roster = (
+        Enrollment.objects.filter(course=course, student__is_active=True)
+        .select_related('student')
+        .annotate(
+            submitted=_per_row(
+                Submission.objects.filter(student=student, assignment__course=course),
+                'student', Count('pk'), Value(0),
+            ),
+            average=Case(
+                When(graded_count__gt=0, then=F('grade_sum') / F('graded_count')),
+                output_field=FloatField(),
+            ),
+            missing=_per_row(past_due, 'course', Count('pk'), Value(0)),
+            attendance_rate=_per_row(
+                Attendance.objects.filter(student=student, schedule__course=course),
+                'student', Avg(Case(When(is_present=True, then=Value(100.0)), default=Value(0.0), output_field=FloatField())),
+            ),
+        )
+    )
+    columns = SORTS.get(sort, SORTS['name'])
+    ordering = [
+        getattr(F(column), 'desc' if descending else 'asc')(nulls_last=True) for column in columns
+    ]
+    return roster.order_by(*ordering, *[name for name in NAME_ORDER if name not in columns])
@@ -0,0 +1,86 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections
+
+DEFAULTS = {
+    'PRIMARY': 'default',
+    'REPLICAS': [],
+    'STICKY_SECONDS': 15,
+    'COOKIE_NAME': 'db_primary',
+}
+
+
+def config(key):
+    return getattr(settings, 'DATABASE_REPLICAS', {}).get(key, DEFAULTS[key])
+
+
+@dataclass
+class RoutingState:
+    """Per-request routing: pinned requests read from the primary; `wrote` is set by any write."""
+    pinned: bool = False
+    wrote: bool = False
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+@contextmanager
+def routing_state(pinned=False):
+    state = RoutingState(pinned=pinned)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def primary():
+    """Send every read inside the block to the primary, e.g. right after a write outside a request."""
+    current = _state.get()
+    with routing_state(pinned=True) as state:
+        yield state
+    if current is not None and state.wrote:
+        current.wrote = True
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to DATABASE_REPLICAS['PRIMARY'] and reads to a random replica,
+    except inside a transaction on the primary or while the current request
+    is pinned (see core.middleware.ReplicaPinningMiddleware), so a user
+    reads their own writes. With no replicas configured every method
+    returns None and Django's default routing applies.
+    """
+    def db_for_read(self, model, **hints):
+        replicas = config('REPLICAS')
+        if not replicas:
+            return None
+        state = _state.get()
+        if (state is not None and state.pinned) or connections[config('PRIMARY')].in_atomic_block:
+            return config('PRIMARY')
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if not config('REPLICAS'):
+            return None
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return config('PRIMARY')
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {config('PRIMARY'), *config('REPLICAS')}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema from the primary through replication.
+        if db in config('REPLICAS'):
+            return False
+        return None
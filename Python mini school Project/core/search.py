@@ -0,0 +1,395 @@
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .models import User, Category, Course, Lesson, Assignment, Enrollment, SearchEntry, SearchTerm
+
+DEFAULTS = {
+    'MIN_LENGTH': 2,
+    'LIMIT': 10,
+    'LIST_LIMIT': 1000,
+    'FREQUENT_ABOVE': 20_000,
+    'TERMS_TTL': 5 * 60,
+}
+FTS_TABLE = 'core_searchentry_fts'
+# Must match the prefix='...' option the FTS5 table was created with.
+PREFIX_LENGTHS = (2, 3, 4, 5, 6)
+# Title matches count ten times as much as body matches.
+TITLE_WEIGHT, BODY_WEIGHT = 10.0, 1.0
+MAX_TERMS = 8
+# Letters and digits only: FTS5's unicode61 tokenizer splits on everything else.
+TERM_RE = re.compile(r'[^\W_]+')
+TERMS_KEY = 'search:frequent_terms'
+
+Kind = SearchEntry.Kind
+
+# Rows of the SQLite index are numbered (bucket << 32) | object_id, so all
+# entries one user may see sit in a few contiguous rowid ranges that FTS5 can
+# seek to instead of filtering every match. Lessons and assignments are
+# bucketed by course, everything else by kind.
+BUCKET_BITS = 32
+KIND_BUCKETS = {Kind.CATEGORY: 0, Kind.USER: 1, Kind.COURSE: 2}
+COURSE_BUCKETS = 4
+FTS_ROWID_SQL = (
+    "(CASE {row}.kind WHEN 'category' THEN 0 WHEN 'user' THEN 1 WHEN 'course' THEN 2 "
+    "WHEN 'lesson' THEN 4 + 2 * {row}.course_id ELSE 5 + 2 * {row}.course_id END << 32) | {row}.object_id"
+)
+
+VISIBLE_KINDS = {
+    User.Role.EMPLOYEE: (Kind.COURSE, Kind.CATEGORY, Kind.USER),
+    User.Role.INSTRUCTOR: (Kind.COURSE, Kind.LESSON, Kind.ASSIGNMENT),
+    User.Role.STUDENT: (Kind.COURSE, Kind.CATEGORY, Kind.LESSON, Kind.ASSIGNMENT),
+}
+
+
+def config(key):
+    return getattr(settings, 'SEARCH', {}).get(key, DEFAULTS[key])
+
+
+@dataclass
+class Source:
+    kind: str
+    model: type
+    fields: tuple
+    document: object
+    related: tuple = ()
+    # Field values an instance must have to be searchable at all.
+    where: dict = field(default_factory=dict)
+
+    def queryset(self):
+        return self.model.objects.filter(**self.where).select_related(*self.related).order_by('pk')
+
+    def includes(self, instance):
+        return all(getattr(instance, name) == value for name, value in self.where.items())
+
+
+def _user_document(user):
+    names = ' '.join(filter(None, [user.first_name, user.last_name]))
+    return names or user.username, ' '.join(filter(None, [user.username, names, user.student_id])), None
+
+
+# Every searchable model: the fields that feed its entry, and a function
+# returning (title, body, course_id) for an instance. Courses carry their
+# category name so that browsing a category finds its courses.
+SOURCES = [
+    Source(
+        Kind.COURSE, Course, ('title', 'description', 'category'),
+        lambda c: (c.title, f'{c.description} {c.category.name}', c.pk), related=('category',),
+    ),
+    Source(Kind.LESSON, Lesson, ('title', 'content', 'course'), lambda l: (l.title, l.content, l.course_id)),
+    Source(Kind.ASSIGNMENT, Assignment, ('title', 'description', 'course'), lambda a: (a.title, a.description, a.course_id)),
+    Source(Kind.CATEGORY, Category, ('name', 'description'), lambda c: (c.name, c.description or '', None)),
+    # Deactivated users are on their way out (see core/tasks.py) and drop out of search at once.
+    Source(Kind.USER, User, ('username', 'first_name', 'last_name', 'student_id', 'is_active'), _user_document, where={'is_active': True}),
+]
+SOURCES_BY_MODEL = {source.model: source for source in SOURCES}
+
+
+def _entry(source, instance):
+    title, body, course_id = source.document(instance)
+    return SearchEntry(kind=source.kind, object_id=instance.pk, course_id=course_id, title=title[:255], body=body)
+
+
+def _upsert(entries):
+    SearchEntry.objects.bulk_create(
+        entries,
+        update_conflicts=True,
+        unique_fields=['kind', 'object_id'],
+        update_fields=['course_id', 'title', 'body'],
+    )
+
+
+def index(instance, update_fields=None):
+    source = SOURCES_BY_MODEL[type(instance)]
+    if update_fields is not None and not set(update_fields) & set(source.fields):
+        return
+    if not source.includes(instance):
+        return unindex(instance)
+    entries = [_entry(source, instance)]
+    if source.model is Category:
+        entries += [_entry(SOURCES_BY_MODEL[Course], course) for course in instance.courses.select_related('category')]
+    _upsert(entries)
+
+
+def index_many(instances):
+    """Index objects of one model saved with bulk_create(), which sends no signals."""
+    instances = list(instances)
+    if instances:
+        source = SOURCES_BY_MODEL[type(instances[0])]
+        _upsert([_entry(source, instance) for instance in instances if source.includes(instance)])
+
+
+def unindex(instance):
+    source = SOURCES_BY_MODEL[type(instance)]
+    SearchEntry.objects.filter(kind=source.kind, object_id=instance.pk).delete()
+
+
+def rebuild(batch_size=2000):
+    """
+    Bring every entry in line with the source tables, drop entries whose
+    object is gone, then rewrite the SQLite full-text index from the entries
+    and refresh the term statistics. Returns the number of entries.
+    """
+    total = 0
+    for source in SOURCES:
+        batch = []
+        for instance in source.queryset().iterator(chunk_size=batch_size):
+            batch.append(_entry(source, instance))
+            if len(batch) >= batch_size:
+                _upsert(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            _upsert(batch)
+            total += len(batch)
+        SearchEntry.objects.filter(kind=source.kind).exclude(object_id__in=source.queryset().values('pk')).delete()
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, title, body) "
+                f"SELECT {FTS_ROWID_SQL.format(row='e')}, e.title, e.body FROM {SearchEntry._meta.db_table} e"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        refresh_term_stats()
+    return total
+
+
+def refresh_term_stats():
+    """
+    Record the words and prefixes found in more than FREQUENT_ABOVE entries.
+
+    BM25 weighs each query term by scanning every entry that contains it,
+    so a prefix like "le" against a million lessons costs far more than the
+    matches it returns. Frequent terms are still required to match, but they
+    are left out of the ranking. Only SQLite needs this; returns the number
+    of terms recorded.
+    """
+    if connection.vendor != 'sqlite':
+        return 0
+    threshold = config('FREQUENT_ABOVE')
+    words, prefixes = {}, Counter()
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS temp.search_vocab USING fts5vocab(main, {FTS_TABLE}, 'row')")
+        cursor.execute("SELECT term, doc FROM temp.search_vocab")
+        for term, documents in cursor.fetchall():
+            if documents > threshold:
+                words[term] = documents
+            for length in PREFIX_LENGTHS:
+                if len(term) >= length:
+                    prefixes[term[:length]] += documents
+    words.update({f'{prefix}*': documents for prefix, documents in prefixes.items() if documents > threshold})
+    with transaction.atomic():
+        SearchTerm.objects.all().delete()
+        SearchTerm.objects.bulk_create([SearchTerm(key=key[:100], documents=n) for key, n in words.items()])
+    cache.delete(TERMS_KEY)
+    return len(words)
+
+
+def frequent_terms():
+    return cache.get_or_set(
+        TERMS_KEY,
+        lambda: frozenset(SearchTerm.objects.filter(documents__gt=config('FREQUENT_ABOVE')).values_list('key', flat=True)),
+        config('TERMS_TTL'),
+    )
+
+
+def terms(text):
+    return TERM_RE.findall((text or '').lower())[:MAX_TERMS]
+
+
+@dataclass
+class Scope:
+    """What a user may find: whole kinds, plus lessons and assignments of some courses."""
+    kinds: list
+    courses: list = None  # Course entries an instructor may see; None means all.
+    content_courses: tuple = ()
+
+
+def scope_for(user, kinds=None):
+    visible = VISIBLE_KINDS.get(user.role, ())
+    scope = Scope([kind for kind in (kinds or visible) if kind in visible])
+    if user.role == User.Role.INSTRUCTOR:
+        scope.courses = list(Course.objects.filter(instructor=user).values_list('id', flat=True))
+        scope.content_courses = scope.courses
+    elif user.role == User.Role.STUDENT:
+        scope.content_courses = list(Enrollment.objects.filter(student=user).values_list('course_id', flat=True))
+    return scope
+
+
+def _bucket_range(first, last=None):
+    return first << BUCKET_BITS, ((last if last is not None else first) + 1 << BUCKET_BITS) - 1
+
+
+def _ranges(scope):
+    ranges = [_bucket_range(KIND_BUCKETS[kind]) for kind in (Kind.CATEGORY, Kind.USER) if kind in scope.kinds]
+    if Kind.COURSE in scope.kinds:
+        if scope.courses is None:
+            ranges.append(_bucket_range(KIND_BUCKETS[Kind.COURSE]))
+        else:
+            ranges += [(KIND_BUCKETS[Kind.COURSE] << BUCKET_BITS | pk,) * 2 for pk in scope.courses]
+    # A course's lessons and assignments sit in two adjacent buckets.
+    content = [offset for offset, kind in enumerate((Kind.LESSON, Kind.ASSIGNMENT)) if kind in scope.kinds]
+    if content:
+        ranges += [
+            _bucket_range(COURSE_BUCKETS + 2 * pk + content[0], COURSE_BUCKETS + 2 * pk + content[-1])
+            for pk in scope.content_courses
+        ]
+    # Adjacent ranges (consecutive course ids) are merged into one seek.
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(high, merged[-1][1]))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def _decode(rowid):
+    bucket, object_id = rowid >> BUCKET_BITS, rowid & ((1 << BUCKET_BITS) - 1)
+    for kind, kind_bucket in KIND_BUCKETS.items():
+        if bucket == kind_bucket:
+            return kind, object_id
+    return (Kind.LESSON if (bucket - COURSE_BUCKETS) % 2 == 0 else Kind.ASSIGNMENT), object_id
+
+
+def _phrase(word, prefix, frequent):
+    """The FTS5 expression for one word and whether it matches too many entries to rank by."""
+    if not prefix:
+        return f'"{word}"', word in frequent
+    if len(word) <= PREFIX_LENGTHS[-1]:
+        return f'"{word}"*', f'{word}*' in frequent
+    # Beyond the longest prefix index SQLite merges every term with this
+    # prefix; when the word is completing a frequent term, match that exactly.
+    completions = sorted(term for term in frequent if not term.endswith('*') and term.startswith(word))
+    if completions:
+        return '(' + ' OR '.join(f'"{term}"' for term in completions) + ')', True
+    return f'"{word}"*', False
+
+
+def _search_sqlite(words, scope, limit):
+    frequent = frequent_terms()
+    phrases = [_phrase(word, i == len(words) - 1, frequent) for i, word in enumerate(words)]
+    ranked = ' AND '.join(expression for expression, common in phrases if not common)
+    common = ' AND '.join(expression for expression, common in phrases if common)
+    parts, params = [], []
+    for low, high in _ranges(scope):
+        if ranked:
+            sql = (
+                f"SELECT rowid, bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid BETWEEN %s AND %s"
+            )
+            params += [ranked, low, high]
+            if common:
+                # The unary + keeps SQLite from probing the index once per rowid.
+                sql += f" AND +rowid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid BETWEEN %s AND %s)"
+                params += [common, low, high]
+        else:
+            # Nothing selective to rank by: take the newest matches.
+            sql = (
+                f"SELECT * FROM (SELECT rowid, 0 AS score FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid BETWEEN %s AND %s ORDER BY rowid DESC LIMIT %s)"
+            )
+            params += [common, low, high, limit]
+        parts.append(sql)
+    if not parts:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT rowid FROM ({' UNION ALL '.join(parts)}) ORDER BY score, rowid DESC LIMIT %s", params + [limit])
+        keys = [_decode(rowid) for rowid, in cursor.fetchall()]
+    if not keys:
+        return []
+    by_kind = defaultdict(list)
+    for kind, object_id in keys:
+        by_kind[kind].append(object_id)
+    entries = SearchEntry.objects.filter(reduce(or_, (Q(kind=kind, object_id__in=ids) for kind, ids in by_kind.items())))
+    found = {(entry.kind, entry.object_id): entry for entry in entries}
+    return [found[key] for key in keys if key in found]
+
+
+def _scope_q(scope):
+    condition = Q(kind__in=[kind for kind in scope.kinds if kind in (Kind.CATEGORY, Kind.USER)])
+    if Kind.COURSE in scope.kinds:
+        condition |= Q(kind=Kind.COURSE) if scope.courses is None else Q(kind=Kind.COURSE, object_id__in=scope.courses)
+    content_kinds = [kind for kind in scope.kinds if kind in (Kind.LESSON, Kind.ASSIGNMENT)]
+    if content_kinds:
+        condition |= Q(kind__in=content_kinds, course_id__in=scope.content_courses)
+    return condition
+
+
+def _search_postgresql(words, scope, limit):
+    query = ' & '.join(f"{word}:*" if i == len(words) - 1 else word for i, word in enumerate(words))
+    vector = "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')"
+    return list(
+        SearchEntry.objects.filter(_scope_q(scope)).extra(
+            select={'score': f"ts_rank_cd({vector}, to_tsquery('simple', %s))"},
+            select_params=[query],
+            where=[f"({vector}) @@ to_tsquery('simple', %s)"],
+            params=[query],
+            order_by=['-score'],
+        )[:limit]
+    )
+
+
+def search(user, text, kinds=None, limit=None):
+    """
+    Entries matching every word of `text` (the last one as a prefix) that
+    `user` may see, best first.
+
+    SQLite uses the FTS5 index ranked with BM25, PostgreSQL the GIN index on
+    the entries' tsvector ranked with ts_rank_cd. Other backends fall back to
+    an unranked substring match.
+    """
+    words = terms(text)
+    if len(words) > 1 and len(words[-1]) < PREFIX_LENGTHS[0]:
+        # A single letter just typed after a space would match nearly every
+        # entry; wait for the next keystroke before using it.
+        words.pop()
+    if not words or len(''.join(words)) < config('MIN_LENGTH'):
+        return []
+    limit = limit or config('LIMIT')
+    scope = scope_for(user, kinds)
+    if not scope.kinds:
+        return []
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(words, scope, limit)
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(words, scope, limit)
+    condition = _scope_q(scope)
+    for word in words:
+        condition &= Q(title__icontains=word) | Q(body__icontains=word)
+    return list(SearchEntry.objects.filter(condition)[:limit])
+
+
+def matching_ids(user, kind, text):
+    """Object ids of `kind` matching `text`, for narrowing a list page."""
+    return [entry.object_id for entry in search(user, text, kinds=[kind], limit=config('LIST_LIMIT'))]
+
+
+def url_for(user, entry):
+    if entry.kind == Kind.USER:
+        return reverse('edit_user', args=[entry.object_id])
+    if entry.kind == Kind.CATEGORY:
+        if user.role == User.Role.EMPLOYEE:
+            return reverse('edit_category', args=[entry.object_id])
+        return f"{reverse('student_course_list')}?{urlencode({'q': entry.title})}"
+    if user.role == User.Role.EMPLOYEE:
+        return reverse('course_list_create')
+    if user.role == User.Role.INSTRUCTOR:
+        if entry.kind == Kind.ASSIGNMENT:
+            return reverse('view_submissions', args=[entry.object_id])
+        return reverse('instructor_course_detail', args=[entry.course_id])
+    if entry.kind == Kind.ASSIGNMENT:
+        return reverse('submit_assignment', args=[entry.object_id])
+    if entry.kind == Kind.LESSON:
+        return reverse('student_course_detail', args=[entry.course_id])
+    return f"{reverse('student_course_list')}?{urlencode({'q': entry.title})}"
@@ -0,0 +1,194 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from . import analytics, auth, dashboards, grades, search, sqlite, stats, storage
+from .models import User, Course, CourseStats, Enrollment, Review, Lesson, Assignment, Submission
+
+COUNTED = {Enrollment: 'enrollment_count', Lesson: 'lesson_count', Assignment: 'assignment_count'}
+
+
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CourseStats.objects.get_or_create(course=instance)
+
+
+def count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(instance.course_id, **{COUNTED[sender]: 1})
+
+
+def count_deleted(sender, instance, **kwargs):
+    stats.bump(instance.course_id, **{COUNTED[sender]: -1})
+
+
+for model in COUNTED:
+    post_save.connect(count_created, sender=model, dispatch_uid=f'stats_created_{model.__name__}')
+    post_delete.connect(count_deleted, sender=model, dispatch_uid=f'stats_deleted_{model.__name__}')
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    instance._stats_previous = None
+    if instance.pk and not raw:
+        instance._stats_previous = Review.objects.filter(pk=instance.pk).values_list('course_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def count_review_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    if previous == (instance.course_id, instance.rating):
+        return
+    if previous:
+        stats.bump(previous[0], **stats.rating_deltas(previous[1], -1))
+    stats.bump(instance.course_id, **stats.rating_deltas(instance.rating, 1))
+
+
+@receiver(post_delete, sender=Review)
+def count_review_deleted(sender, instance, **kwargs):
+    stats.bump(instance.course_id, **stats.rating_deltas(instance.rating, -1))
+
+
+@receiver(post_delete, sender=Submission)
+def forget_deleted_grade(sender, instance, **kwargs):
+    grades.forget_grade(instance)
+
+
+def _media_names(sender, instance, field_names=None):
+    # Read from __dict__ so that deferred fields are not loaded just for this;
+    # a file assigned but not stored yet has no name (None).
+    names = {}
+    for field_name in storage.MEDIA_FIELDS[sender] if field_names is None else field_names:
+        if field_name in instance.__dict__:
+            value = instance.__dict__[field_name]
+            if isinstance(value, str) or value is None:
+                names[field_name] = value or ''
+            elif isinstance(value, FieldFile) and value._committed:
+                names[field_name] = value.name or ''
+            else:
+                names[field_name] = None
+    return names
+
+
+def _saved_media_fields(sender, update_fields):
+    return [name for name in storage.MEDIA_FIELDS[sender] if update_fields is None or name in update_fields]
+
+
+def remember_loaded_media(sender, instance, **kwargs):
+    instance._media_loaded = _media_names(sender, instance)
+
+
+def remember_media(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    The file names the row had before this save. Only fields that are saved
+    and differ from what was loaded are read back from the database, so
+    saves that leave the files alone cost no extra query.
+    """
+    instance._media_previous = {}
+    if not instance.pk or raw:
+        return
+    loaded, current = getattr(instance, '_media_loaded', {}), _media_names(sender, instance)
+    changed = []
+    for field_name in _saved_media_fields(sender, update_fields):
+        if loaded.get(field_name) is not None and current.get(field_name) == loaded[field_name]:
+            instance._media_previous[field_name] = loaded[field_name]
+        else:
+            changed.append(field_name)
+    if changed:
+        instance._media_previous.update(sender.objects.filter(pk=instance.pk).values(*changed).first() or {})
+
+
+def _release_on_commit(field_file, name):
+    # Only once the row change is committed; a rollback keeps the reference.
+    file_storage = field_file.storage
+    transaction.on_commit(lambda: storage.release(name, file_storage))
+
+
+def track_media_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_media_previous', {})
+    saved = _saved_media_fields(sender, update_fields)
+    for field_name in saved:
+        field_file = getattr(instance, field_name)
+        old, new = previous.get(field_name) or '', field_file.name or ''
+        if old == new:
+            continue
+        if new:
+            storage.acquire(new, field_file.storage)
+        if old:
+            _release_on_commit(field_file, old)
+    instance._media_loaded = {**getattr(instance, '_media_loaded', {}), **_media_names(sender, instance, saved)}
+
+
+def track_media_deleted(sender, instance, **kwargs):
+    for field_name in storage.MEDIA_FIELDS[sender]:
+        field_file = getattr(instance, field_name)
+        if field_file.name:
+            _release_on_commit(field_file, field_file.name)
+
+
+for model in storage.MEDIA_FIELDS:
+    post_init.connect(remember_loaded_media, sender=model, dispatch_uid=f'media_loaded_{model.__name__}')
+    pre_save.connect(remember_media, sender=model, dispatch_uid=f'media_previous_{model.__name__}')
+    post_save.connect(track_media_saved, sender=model, dispatch_uid=f'media_saved_{model.__name__}')
+    post_delete.connect(track_media_deleted, sender=model, dispatch_uid=f'media_deleted_{model.__name__}')
+
+
+def invalidate_snapshot(sender, instance=None, created=False, update_fields=None, raw=False, **kwargs):
+    # Logins save User with update_fields=['last_login']; those leave the counts alone.
+    if raw or (sender is User and not created and update_fields and not {'role', 'is_active'} & set(update_fields)):
+        return
+    transaction.on_commit(dashboards.invalidate_employee_snapshot)
+
+
+for model in (User, Course, Enrollment):
+    post_save.connect(invalidate_snapshot, sender=model, dispatch_uid=f'snapshot_saved_{model.__name__}')
+    post_delete.connect(invalidate_snapshot, sender=model, dispatch_uid=f'snapshot_deleted_{model.__name__}')
+
+
+def forget_cached_user(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login, which is not cached.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: auth.invalidate(user_id))
+
+
+post_save.connect(forget_cached_user, sender=User, dispatch_uid='auth_user_saved')
+post_delete.connect(forget_cached_user, sender=User, dispatch_uid='auth_user_deleted')
+
+
+def index_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        search.index(instance, update_fields)
+
+
+def index_deleted(sender, instance, **kwargs):
+    search.unindex(instance)
+
+
+for model in search.SOURCES_BY_MODEL:
+    post_save.connect(index_saved, sender=model, dispatch_uid=f'search_saved_{model.__name__}')
+    post_delete.connect(index_deleted, sender=model, dispatch_uid=f'search_deleted_{model.__name__}')
+
+
+def invalidate_analytics(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Grades and submission times feed the analytics, and the due date decides what is late.
+    assignment_id = instance.pk if sender is Assignment else instance.assignment_id
+    transaction.on_commit(lambda: analytics.invalidate([assignment_id]))
+
+
+for model in (Assignment, Submission):
+    post_save.connect(invalidate_analytics, sender=model, dispatch_uid=f'analytics_saved_{model.__name__}')
+    post_delete.connect(invalidate_analytics, sender=model, dispatch_uid=f'analytics_deleted_{model.__name__}')
+
+
+connection_created.connect(sqlite.configure, dispatch_uid='sqlite_pragmas')
@@ -0,0 +1,39 @@
+from django.conf import settings
+
+DEFAULTS = {
+    'JOURNAL_MODE': 'wal',
+    'SYNCHRONOUS': 'normal',
+    'BUSY_TIMEOUT': 5000,
+    'CACHE_SIZE': -64 * 1024,
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    'TEMP_STORE': 'memory',
+}
+
+
+def config(key):
+    return getattr(settings, 'SQLITE_PRAGMAS', {}).get(key, DEFAULTS[key])
+
+
+def pragmas():
+    """(name, value) for every configured pragma; a value of None leaves SQLite's default."""
+    return [(key.lower(), config(key)) for key in DEFAULTS if config(key) is not None]
+
+
+def configure(sender, connection, **kwargs):
+    """
+    connection_created hook applying SQLITE_PRAGMAS to every new SQLite
+    connection.
+
+    WAL lets readers carry on while one writer commits, and with
+    synchronous=NORMAL a commit no longer waits for an fsync (the database
+    stays consistent; only the last commits can be lost on power failure).
+    busy_timeout makes a writer wait for the lock instead of failing with
+    "database is locked". Write transactions should also start with BEGIN
+    IMMEDIATE (DATABASES OPTIONS 'transaction_mode'), or a transaction that
+    read first fails outright when it tries to upgrade its lock.
+    """
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import Course, CourseStats, Enrollment, Review, Lesson, Assignment
+
+STAT_FIELDS = [
+    'enrollment_count', 'review_count', 'rating_sum',
+    'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    'lesson_count', 'assignment_count',
+]
+
+
+def bump(course_id, **deltas):
+    """
+    Apply counter deltas to a course's stats row with a single UPDATE.
+
+    Called from the signals in core/signals.py, so it joins whatever
+    transaction the save or delete runs in. Model.delete() always opens one;
+    save() does not, so views wrap saves of counted rows in
+    transaction.atomic() and the counters commit or roll back together with
+    the row. A missing stats row is left for rebuild_course_stats to repair.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        CourseStats.objects.filter(course_id=course_id).update(
+            **{name: F(name) + delta for name, delta in deltas.items()}
+        )
+
+
+def rating_deltas(rating, sign):
+    deltas = {'review_count': sign, 'rating_sum': sign * rating}
+    if 1 <= rating <= 5:
+        deltas[f'rating_{rating}_count'] = sign
+    return deltas
+
+
+def _courses(course_ids):
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(id__in=course_ids)
+    return courses
+
+
+def compute_course_stats(course_ids=None):
+    """Aggregate fresh stats for the given courses (all when None) with one grouped query per table."""
+    courses = _courses(course_ids)
+    stats = {pk: dict.fromkeys(STAT_FIELDS, 0) for pk in courses.values_list('id', flat=True)}
+    course_filter = {'course_id__in': courses.values('id')}
+
+    for model, field in ((Enrollment, 'enrollment_count'), (Lesson, 'lesson_count'), (Assignment, 'assignment_count')):
+        for row in model.objects.filter(**course_filter).values('course_id').annotate(n=Count('id')).order_by():
+            stats[row['course_id']][field] = row['n']
+    reviews = Review.objects.filter(**course_filter).values('course_id', 'rating')
+    for row in reviews.annotate(n=Count('id'), total=Sum('rating')).order_by():
+        entry = stats[row['course_id']]
+        entry['review_count'] += row['n']
+        entry['rating_sum'] += row['total']
+        if 1 <= row['rating'] <= 5:
+            entry[f"rating_{row['rating']}_count"] = row['n']
+    return stats
+
+
+def rebuild_course_stats(course_ids=None, batch_size=1000):
+    """
+    Recompute stats from the source tables and upsert them. Returns the number
+    of courses whose stored stats had drifted, counting missing rows.
+    """
+    fresh = compute_course_stats(course_ids)
+    stored = {
+        row.pop('course_id'): row
+        for row in CourseStats.objects.filter(course_id__in=_courses(course_ids).values('id')).values('course_id', *STAT_FIELDS)
+    }
+    drifted = sum(1 for pk, values in fresh.items() if stored.get(pk) != values)
+    with transaction.atomic():
+        CourseStats.objects.bulk_create(
+            [CourseStats(course_id=pk, **values) for pk, values in fresh.items()],
+            update_conflicts=True,
+            unique_fields=['course'],
+            update_fields=STAT_FIELDS,
+            batch_size=batch_size,
+        )
+    return drifted
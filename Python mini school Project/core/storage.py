@@ -0,0 +1,262 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import F
+
+from .models import Lesson, MediaBlob, Submission
+
+BLOB_DIR = 'blobs'
+READ_SIZE = 64 * 1024
+# Every FileField whose references are counted.
+MEDIA_FIELDS = {Submission: ('submitted_file',), Lesson: ('video_file', 'resource_file')}
+
+
+def hash_path(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for data in iter(lambda: handle.read(READ_SIZE), b''):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+def blob_name(digest, filename):
+    """Storage path for content with this hash; the extension is kept so the served content type stays right."""
+    extension = os.path.splitext(filename)[1].lower()[:16]
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_DIR}/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that keys files by the SHA-256 of their content.
+
+    Saving content that is already stored returns the existing name instead of
+    writing a second copy. Reference counts on MediaBlob follow the model rows
+    that point at a blob (see core/signals.py), and a blob's file is removed
+    only once nothing refers to it. Names are ordinary relative paths, so
+    FieldFile.url, .path, .size and .open() behave exactly as with
+    FileSystemStorage.
+
+    Saving a file locks its MediaBlob row until the surrounding transaction
+    ends, so views save the file and the row that refers to it in one
+    transaction: a release of the same content by another request then waits
+    for the new reference instead of deleting the blob underneath it.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content hash, not the upload name.
+        return name
+
+    def _save(self, name, content):
+        if hasattr(content, 'temporary_file_path'):
+            source, owned = content.temporary_file_path(), False
+            # Chunked uploads arrive with the hash computed while they streamed in.
+            digest, size = getattr(content, 'sha256', None) or hash_path(source), os.path.getsize(source)
+        else:
+            source, digest, size = self._spool(content)
+            owned = True
+        final = blob_name(digest, name)
+        full_path = self.path(final)
+        try:
+            with transaction.atomic():
+                # Writing to the row first locks it (the whole database on
+                # SQLite) before the file is looked at, so delete() cannot
+                # remove a blob that is being stored again.
+                if not MediaBlob.objects.filter(name=final).update(size=size):
+                    MediaBlob.objects.get_or_create(name=final, defaults={'sha256': digest, 'size': size})
+                if not os.path.exists(full_path):
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    if owned:
+                        os.replace(source, full_path)
+                    else:
+                        file_move_safe(source, full_path, allow_overwrite=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(full_path, self.file_permissions_mode)
+        finally:
+            if owned and os.path.exists(source):
+                os.unlink(source)
+        return final
+
+    def _spool(self, content):
+        """Copy in-memory content to a temp file next to the blobs while hashing it."""
+        directory = self.path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        hasher, size = hashlib.sha256(), 0
+        fd, source = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as spool:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                spool.write(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
+        return source, hasher.hexdigest(), size
+
+    def delete(self, name):
+        """Remove a blob only when no row refers to it any more; other files are deleted as usual."""
+        if not is_blob(name):
+            return super().delete(name)
+        with transaction.atomic():
+            if MediaBlob.objects.filter(name=name, refcount=0).delete()[0]:
+                super().delete(name)
+
+
+def acquire(name, storage):
+    """Count one more reference to a blob kept in `storage`."""
+    if is_blob(name) and not MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+        size = storage.size(name) if storage.exists(name) else 0
+        MediaBlob.objects.create(name=name, sha256=os.path.basename(name)[:64], size=size, refcount=1)
+
+
+def release(name, storage):
+    """
+    Drop one reference to `name`. A blob goes away with its last reference;
+    a file outside the blob store (stored before the switch to content
+    addressing) is deleted straight away, since only one row ever used it.
+    """
+    if is_blob(name):
+        MediaBlob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+    storage.delete(name)
+
+
+@dataclass
+class DedupReport:
+    rehashed: int = 0
+    duplicates: int = 0
+    reclaimed_bytes: int = 0
+    rows_updated: int = 0
+    blobs: int = 0
+    missing: list = field(default_factory=list)
+    orphans: list = field(default_factory=list)
+
+
+def _link(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _legacy_names(model, field_name):
+    return (
+        model.objects.exclude(**{f'{field_name}__startswith': f'{BLOB_DIR}/'})
+        .exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        .values_list(field_name, flat=True).distinct().iterator()
+    )
+
+
+def _referenced_names():
+    counts = Counter()
+    for model, field_names in MEDIA_FIELDS.items():
+        for field_name in field_names:
+            counts.update(
+                name for name in model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True).iterator()
+            )
+    return counts
+
+
+def deduplicate(storage=None, dry_run=False, delete_orphans=False, skip_dirs=()):
+    """
+    Move every file referenced by MEDIA_FIELDS into the content-addressed
+    layout, point the rows at the blobs, then recount references from the
+    rows. Legacy files are hard-linked into place and only unlinked once the
+    rows have been updated, so an interrupted run can simply be repeated.
+    With delete_orphans, blobs nobody refers to and files under the media
+    root that no row names are removed.
+    """
+    storage = storage or default_storage
+    report = DedupReport()
+    converted, targets, remove = {}, set(), []
+    for model, field_names in MEDIA_FIELDS.items():
+        for field_name in field_names:
+            for name in _legacy_names(model, field_name):
+                if name in converted:
+                    continue
+                path = storage.path(name)
+                if not os.path.isfile(path):
+                    report.missing.append(name)
+                    continue
+                digest = hash_path(path)
+                report.rehashed += 1
+                final = blob_name(digest, name)
+                if os.path.exists(storage.path(final)) or final in targets:
+                    report.duplicates += 1
+                    report.reclaimed_bytes += os.path.getsize(path)
+                elif not dry_run:
+                    _link(path, storage.path(final))
+                converted[name] = final
+                targets.add(final)
+                remove.append(path)
+
+    if dry_run:
+        return report
+
+    with transaction.atomic():
+        for model, field_names in MEDIA_FIELDS.items():
+            for field_name in field_names:
+                for name, final in converted.items():
+                    report.rows_updated += model.objects.filter(**{field_name: name}).update(**{field_name: final})
+    for path in remove:
+        if os.path.exists(path):
+            os.unlink(path)
+
+    counts = _referenced_names()
+    blob_root = storage.path(BLOB_DIR)
+    on_disk = set()
+    if os.path.isdir(blob_root):
+        for directory, _, files in os.walk(blob_root):
+            on_disk.update(
+                os.path.relpath(os.path.join(directory, filename), storage.location).replace(os.sep, '/')
+                for filename in files if not filename.endswith('.tmp')
+            )
+    names = on_disk | {name for name in counts if is_blob(name)}
+    with transaction.atomic():
+        stale = set(MediaBlob.objects.values_list('name', flat=True)) - names
+        MediaBlob.objects.filter(name__in=stale).delete()
+        MediaBlob.objects.bulk_create(
+            [
+                MediaBlob(
+                    name=name, sha256=os.path.splitext(os.path.basename(name))[0],
+                    size=os.path.getsize(storage.path(name)) if name in on_disk else 0,
+                    refcount=counts.get(name, 0),
+                )
+                for name in sorted(names)
+            ],
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['refcount', 'size'],
+            batch_size=500,
+        )
+    report.blobs = len(names)
+    report.missing.extend(name for name in counts if is_blob(name) and name not in on_disk)
+
+    skip = {os.path.join(storage.location, directory) for directory in (BLOB_DIR, *skip_dirs)}
+    for directory, subdirs, files in os.walk(storage.location):
+        if directory in skip:
+            subdirs[:] = []
+            continue
+        subdirs[:] = [d for d in subdirs if os.path.join(directory, d) not in skip]
+        for filename in files:
+            name = os.path.relpath(os.path.join(directory, filename), storage.location).replace(os.sep, '/')
+            if name not in counts:
+                report.orphans.append(name)
+    report.orphans.extend(name for name in sorted(on_disk) if not counts.get(name))
+    if delete_orphans:
+        for name in report.orphans:
+            FileSystemStorage.delete(storage, name)
+        MediaBlob.objects.filter(refcount=0).delete()
+    return report
@@ -0,0 +1,18 @@
+from django.db import transaction
+
+from .jobs import task
+from .models import User
+
+
+@task('delete_user')
+def delete_user(user_id):
+    """
+    Delete a user removed by an employee, with everything that cascades from
+    them: enrollments, submissions and their files, reviews, attendance and
+    grade summaries, each firing the signals that keep counters and the
+    search index right.
+    """
+    with transaction.atomic():
+        user = User.objects.filter(id=user_id).first()
+        if user is not None:
+            user.delete()
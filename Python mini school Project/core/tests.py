@@ -1 +1,1373 @@
-from django.test import TestCase
\ No newline at end of file
+import base64
+import csv
+import hashlib
+import json
+import re
+import sqlite3
+import tempfile
+import time
+import zipfile
+from io import BytesIO, StringIO
+from pathlib import Path
+from datetime import date, datetime, time as dt_time, timedelta
+from unittest import mock, skipIf
+from xml.etree import ElementTree
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection, connections, router, transaction
+from django.http import HttpResponse
+from django.template import engines
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import analytics, attendance, dashboards, gradebook, grades, importers, jobs, media, roster, routers, search, stats, storage, uploads
+from core.management.commands.benchmark_views import ROUTES, QueryCounter, load_fixtures
+from core.forms import GradeForm
+from core.middleware import ReplicaPinningMiddleware, RequestProfilingMiddleware
+from core.pagination import InvalidCursor, KeysetPaginator, paginate
+from core.models import Assignment, Attendance, Category, Course, CourseStats, Enrollment, GradeWeight, Job, Lesson, MediaBlob, Review, Schedule, SearchEntry, StudentGradeSummary, Submission, User
+
+# "SCAN core_course" reads every row; "SCAN core_course USING INDEX ..." walks
+# an index in order (keyset pages stop early) and virtual tables have their
+# own index, so only the bare form counts as a full table scan.
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+
+# Tables whose every row a page legitimately reads: the category list, and
+# the per-course counters summed for the cached employee dashboard.
+SCANNABLE = {
+    'core_category',
+    'core_coursestats',
+}
+# The async dashboards run the sync dashboards' queries on worker threads,
+# whose connections cannot see the test transaction.
+UNCHECKED_ROUTES = {'employee_dashboard_async', 'instructor_dashboard_async', 'student_dashboard_async'}
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class QueryPlanTests(TestCase):
+    """
+    Drive every benchmarked route on seeded data and EXPLAIN each SELECT it
+    runs. No ANALYZE is done, so SQLite plans as it would for large tables.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_data', employees=1, categories=3, instructors=3, courses=6, students=30,
+            enrollments_per_student=2, lessons_per_course=2, assignments_per_course=2,
+            attendance_weeks=1, stdout=StringIO(),
+        )
+        cls.fixtures = load_fixtures()
+
+    def test_seeded_data_is_searchable(self):
+        expected = sum(source.queryset().count() for source in search.SOURCES)
+        self.assertEqual(SearchEntry.objects.count(), expected)
+        course = Course.objects.first()
+        self.assertIn(course.id, search.matching_ids(User.objects.filter(role=User.Role.EMPLOYEE).first(), 'course', course.title))
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            details = [row[-1] for row in cursor.fetchall()]
+        return [
+            match.group(1) for match in map(FULL_SCAN_RE.match, details)
+            if match and match.group(1) not in SCANNABLE
+        ]
+
+    def test_views_do_not_scan_whole_tables(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plans are checked against SQLite's EXPLAIN QUERY PLAN output.")
+        for name, (role, build_kwargs) in ROUTES.items():
+            if name in UNCHECKED_ROUTES:
+                continue
+            with self.subTest(view=name):
+                client = Client()
+                if role:
+                    client.force_login(self.fixtures[role])
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(reverse(name, kwargs=build_kwargs(self.fixtures)))
+                for query in queries:
+                    # Catalog lookups such as sqlite_stat1 row estimates are not plans worth checking.
+                    if query['sql'].lstrip().upper().startswith('SELECT') and 'sqlite_' not in query['sql']:
+                        scans = self.full_scans(query['sql'])
+                        self.assertFalse(scans, f"{name} scans {', '.join(scans)}:\n{query['sql']}")
+
+
+class CourseStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = User.objects.create_user('clerk', role=User.Role.EMPLOYEE)
+        cls.teacher = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        cls.ann = User.objects.create_user('ann', role=User.Role.STUDENT)
+        cls.course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'), instructor=cls.teacher)
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, *fields):
+        return CourseStats.objects.values_list(*fields).get(course=self.course)
+
+    def test_counters_follow_creates_deletes_and_rating_changes(self):
+        self.client.force_login(self.employee)
+        self.client.post(reverse('manage_enrollments'), {'student': self.ann.id, 'course': self.course.id})
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('create_assignment', args=[self.course.id]), {
+            'title': 'Essay', 'description': 'Write', 'due_date': '2030-01-01T09:00',
+        })
+        lesson = Lesson.objects.create(course=self.course, title='Intro', content='', order=1)
+        self.assertEqual(self.stats('enrollment_count', 'assignment_count', 'lesson_count'), (1, 1, 1))
+
+        self.client.force_login(self.ann)
+        url = reverse('add_review', args=[self.course.id])
+        self.client.post(url, {'rating': 4, 'comment': 'Good'})
+        self.assertEqual(self.stats('review_count', 'rating_sum', 'rating_4_count', 'rating_2_count'), (1, 4, 1, 0))
+        self.client.post(url, {'rating': 2, 'comment': 'Worse'})
+        self.assertEqual(self.stats('review_count', 'rating_sum', 'rating_4_count', 'rating_2_count'), (1, 2, 0, 1))
+
+        lesson.delete()
+        Review.objects.get().delete()
+        Enrollment.objects.get().delete()
+        self.assertEqual(self.stats('enrollment_count', 'lesson_count', 'review_count', 'rating_sum', 'rating_2_count'), (0, 0, 0, 0, 0))
+        self.assertEqual(stats.rebuild_course_stats(), 0)
+
+    def test_a_failed_counter_update_keeps_the_row_out(self):
+        self.client.force_login(self.teacher)
+        with mock.patch.object(stats, 'bump', side_effect=RuntimeError("boom")), self.assertRaises(RuntimeError):
+            self.client.post(reverse('create_assignment', args=[self.course.id]), {
+                'title': 'Essay', 'description': 'Write', 'due_date': '2030-01-01T09:00',
+            })
+        self.assertFalse(Assignment.objects.exists())
+
+    def test_rebuild_repairs_drift(self):
+        Enrollment.objects.create(student=self.ann, course=self.course)
+        Review.objects.create(course=self.course, student=self.ann, rating=5, comment='Great')
+        CourseStats.objects.filter(course=self.course).update(enrollment_count=7, rating_5_count=0)
+        self.assertEqual(stats.rebuild_course_stats(), 1)
+        self.assertEqual(self.stats('enrollment_count', 'review_count', 'rating_5_count'), (1, 1, 1))
+        CourseStats.objects.filter(course=self.course).delete()
+        self.assertEqual(stats.rebuild_course_stats([self.course.id]), 1)
+        self.assertEqual(self.stats('enrollment_count', 'rating_sum'), (1, 5))
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = User.objects.create_user('clerk', role=User.Role.EMPLOYEE)
+        cls.teacher = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        other = User.objects.create_user('other', role=User.Role.INSTRUCTOR)
+        maths = Category.objects.create(name='Maths')
+        cls.algebra = Course.objects.create(title='Algebra', description='', category=maths, instructor=cls.teacher)
+        biology = Course.objects.create(title='Biology', description='', category=maths, instructor=other)
+        cls.ann = User.objects.create_user('ann', role=User.Role.STUDENT)
+        for course, feedback in ((cls.algebra, '=cmd|calc'), (biology, 'Fine')):
+            assignment = Assignment.objects.create(course=course, title=f'{course.title} essay', description='', due_date=timezone.now())
+            Submission.objects.create(assignment=assignment, student=cls.ann, submitted_file='x.pdf', grade=-5, feedback=feedback)
+        Review.objects.create(course=cls.algebra, student=cls.ann, rating=5, comment='Great\x01 course')
+        Review.objects.create(course=biology, student=cls.ann, rating=3, comment='@everyone')
+
+    def setUp(self):
+        cache.clear()
+
+    def export(self, user, dataset, **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse('export_data', args=[dataset]), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def csv_rows(self, user, dataset, **params):
+        return list(csv.reader(StringIO(self.export(user, dataset, format='csv', **params).decode())))
+
+    def xlsx_rows(self, user, dataset, **params):
+        with zipfile.ZipFile(BytesIO(self.export(user, dataset, format='xlsx', **params))) as archive:
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        return [
+            [''.join(cell.itertext()) for cell in row.iter(f'{ns}c')]
+            for row in sheet.iter(f'{ns}row')
+        ]
+
+    def test_both_formats_scope_and_filter_rows(self):
+        for rows in (self.csv_rows, self.xlsx_rows):
+            with self.subTest(rows.__name__):
+                header, *data = rows(self.employee, 'gradebook', columns='course,grade,feedback')
+                self.assertEqual(header, ['Course', 'Grade', 'Feedback'])
+                self.assertEqual(sorted(row[0] for row in data), ['Algebra', 'Biology'])
+                self.assertEqual(rows(self.teacher, 'gradebook', columns='course,grade,feedback')[1:], [['Algebra', '-5.0', "'=cmd|calc"]])
+                self.assertEqual(len(rows(self.employee, 'gradebook', course=self.algebra.id)), 2)
+                tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+                self.assertEqual(len(rows(self.employee, 'gradebook', start=tomorrow)), 1)
+
+    def test_unsafe_text_is_neutralised(self):
+        for rows in (self.csv_rows, self.xlsx_rows):
+            with self.subTest(rows.__name__):
+                comments = sorted(row[0] for row in rows(self.employee, 'reviews', columns='comment')[1:])
+                self.assertEqual(comments, ["'@everyone", 'Great course'])
+
+    def test_roles_and_bad_parameters(self):
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(reverse('export_data', args=['reviews'])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('export_data', args=['gradebook']), {'columns': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_data', args=['gradebook']), {'start': 'soon'}).status_code, 400)
+
+
+class CachedUserTests(TestCase):
+    """Authenticated requests resolve the session and the user's role from the cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('clerk', password='secret-pass-1', role=User.Role.EMPLOYEE)
+        self.client.login(username='clerk', password='secret-pass-1')
+
+    def test_role_check_needs_no_queries_once_cached(self):
+        url = reverse('employee_dashboard')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_saving_the_user_drops_the_cached_copy(self):
+        url = reverse('employee_dashboard')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = User.Role.STUDENT
+            self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class EmployeeDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('clerk', role=User.Role.EMPLOYEE))
+
+    def test_courses_without_a_stats_row_are_counted(self):
+        course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'))
+        CourseStats.objects.filter(course=course).delete()
+        self.assertEqual(dashboards.course_totals(), (1, 0, False))
+
+    def test_only_estimated_figures_are_marked(self):
+        with mock.patch.object(dashboards, 'course_totals', return_value=(4000, 90000, True)):
+            response = self.client.get(reverse('employee_dashboard'))
+        self.assertContains(response, '&asymp; 4000')
+        self.assertContains(response, '&asymp; 90000')
+        self.assertContains(response, '&asymp;', count=3)  # the two totals and the footnote
+
+
+class AsyncDashboardTests(TransactionTestCase):
+    """
+    The async dashboards read on worker threads with their own connections,
+    so the data has to be committed for them to see it.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.employee = User.objects.create_user('clerk', role=User.Role.EMPLOYEE)
+        self.instructor = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        self.student = User.objects.create_user('pupil', role=User.Role.STUDENT)
+        self.course = Course.objects.create(
+            title='Algebra', description='', category=Category.objects.create(name='Maths'), instructor=self.instructor,
+        )
+        self.schedule = Schedule.objects.create(course=self.course, day_of_week='MON', start_time=dt_time(9), end_time=dt_time(10))
+        Enrollment.objects.create(student=self.student, course=self.course)
+
+    def get(self, user, name):
+        self.client.force_login(user)
+        response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_employee_dashboard(self):
+        context = self.get(self.employee, 'employee_dashboard_async')
+        self.assertEqual(
+            (context['student_count'], context['instructor_count'], context['course_count'], context['enrollment_count']),
+            (1, 1, 1, 1),
+        )
+        self.assertEqual(list(context['recent_students']), [self.student])
+
+    def test_instructor_dashboard(self):
+        context = self.get(self.instructor, 'instructor_dashboard_async')
+        self.assertEqual(context['courses'], [self.course])
+        self.assertEqual(context['schedules'], [self.schedule])
+        self.assertEqual(context['submissions_to_grade'], [])
+        self.assertEqual(context['schedules'][0].session_date, attendance.session_date(self.schedule, attendance.week_start(date.today())))
+
+    def test_student_dashboard(self):
+        context = self.get(self.student, 'student_dashboard_async')
+        self.assertEqual([enrollment.course for enrollment in context['enrollments']], [self.course])
+        self.assertEqual(context['schedules'], [self.schedule])
+        self.assertEqual((context['graded_count'], list(context['recent_grades'])), (0, []))
+
+    def test_benchmark_counts_worker_thread_queries(self):
+        self.client.force_login(self.instructor)
+        counter = QueryCounter()
+        counter.attach()
+        try:
+            self.client.get(reverse('instructor_dashboard_async'))
+        finally:
+            counter.detach()
+        # courses, submissions to grade, schedules and next sessions all run on workers.
+        self.assertGreaterEqual(counter.count, len(dashboards.instructor_queries(self.instructor)))
+
+
+class ChunkedUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        instructor = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'), instructor=instructor)
+        cls.assignment = Assignment.objects.create(course=course, title='Essay', description='', due_date=timezone.now())
+        cls.student = User.objects.create_user('ann', role=User.Role.STUDENT)
+        Enrollment.objects.create(student=cls.student, course=course)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name, CHUNKED_UPLOADS={'CHUNK_SIZE': 4}))
+        self.client.force_login(self.student)
+        self.data = b'0123456789'
+        response = self.client.post(reverse('upload_start'), {
+            'purpose': 'SUBMISSION', 'target': self.assignment.id, 'filename': 'essay.txt', 'size': len(self.data),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.url = reverse('upload_chunk', args=[response.json()['id']])
+        self.upload_id = response.json()['id']
+
+    def put(self, offset, data):
+        return self.client.put(self.url, data, content_type='application/octet-stream', headers={'Upload-Offset': str(offset)})
+
+    def test_resume_after_a_refused_chunk(self):
+        self.assertEqual(self.put(0, self.data[:4]).json()['offset'], 4)
+        # A retried chunk is refused and the client resumes from the offset the server reports.
+        response = self.put(0, self.data[:4])
+        self.assertEqual(response.status_code, 409)
+        offset = self.client.get(self.url).json()['offset']
+        self.put(offset, self.data[4:8])
+        self.put(8, self.data[8:])
+        response = self.client.post(reverse('upload_complete', args=[self.upload_id]), {'sha256': hashlib.sha256(self.data).hexdigest()})
+        self.assertTrue(response.json()['complete'])
+        session = uploads.get_session(self.student, self.upload_id)
+        self.assertEqual(uploads.temp_path(session).read_bytes(), self.data)
+
+    def test_oversized_chunks_are_refused(self):
+        self.assertEqual(self.put(0, b'01234').status_code, 413)
+        self.put(0, self.data[:4])
+        self.put(4, self.data[4:8])
+        self.assertEqual(self.put(8, b'8901').status_code, 413)
+        self.assertEqual(self.client.get(self.url).json()['offset'], 8)
+
+    def test_chunk_cut_short_leaves_the_offset(self):
+        with self.assertRaises(uploads.UploadError):
+            uploads.write_chunk(self.student, self.upload_id, 0, BytesIO(b'01'), 4)
+        session = uploads.get_session(self.student, self.upload_id)
+        self.assertEqual(session.offset, 0)
+        self.assertEqual(list(uploads.temp_path(session).parent.glob('*.chunk')), [])
+        self.assertEqual(self.put(0, self.data[:4]).json()['offset'], 4)
+
+    def test_losing_the_offset_swap_is_a_conflict(self):
+        stale = uploads.get_session(self.student, self.upload_id)
+        self.put(0, self.data[:4])
+        # As if a concurrent request had read the session before this one committed.
+        with mock.patch.object(uploads, 'get_session', return_value=stale):
+            with self.assertRaises(uploads.UploadError) as raised:
+                uploads.write_chunk(self.student, self.upload_id, 0, BytesIO(b'abcd'), 4)
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(uploads.temp_path(stale).read_bytes(), self.data[:4])
+
+    def test_failed_append_leaves_the_offset(self):
+        with mock.patch.object(uploads.shutil, 'copyfileobj', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                uploads.write_chunk(self.student, self.upload_id, 0, BytesIO(self.data[:4]), 4)
+        self.assertEqual(uploads.get_session(self.student, self.upload_id).offset, 0)
+        self.assertEqual(self.put(0, self.data[:4]).json()['offset'], 4)
+
+    def test_lost_bytes_are_not_hashed(self):
+        self.put(0, self.data[:4])
+        session = uploads.get_session(self.student, self.upload_id)
+        uploads._hashers.clear()
+        uploads.temp_path(session).write_bytes(self.data[:2])
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.write_chunk(self.student, self.upload_id, 4, BytesIO(self.data[4:8]), 4)
+        self.assertEqual(raised.exception.status, 410)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class MediaStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        instructor = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'), instructor=instructor)
+        cls.assignment = Assignment.objects.create(course=course, title='Essay', description='', due_date=timezone.now())
+        cls.ann = User.objects.create_user('ann', role=User.Role.STUDENT)
+        cls.bob = User.objects.create_user('bob', role=User.Role.STUDENT)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name))
+
+    def submit(self, student, filename, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Submission.objects.create(
+                assignment=self.assignment, student=student, submitted_file=SimpleUploadedFile(filename, data),
+            )
+
+    def test_identical_files_share_a_blob_until_the_last_reference_goes(self):
+        first = self.submit(self.ann, 'a.txt', b'same')
+        second = self.submit(self.bob, 'b.txt', b'same')
+        name = first.submitted_file.name
+        self.assertEqual(second.submitted_file.name, name)
+        self.assertTrue(name.startswith('blobs/'))
+        self.assertEqual(MediaBlob.objects.values_list('refcount', 'size').get(name=name), (2, 4))
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+        self.assertTrue((self.root / name).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            second.submitted_file = SimpleUploadedFile('c.txt', b'other')
+            second.save()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse((self.root / name).exists())
+        self.assertEqual(MediaBlob.objects.get(name=second.submitted_file.name).refcount, 1)
+
+    def test_saves_that_leave_the_files_alone_do_not_read_them_back(self):
+        submission = Submission.objects.get(id=self.submit(self.ann, 'a.txt', b'essay').id)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            submission.grade = 90
+            submission.save(update_fields=['grade'])
+            submission.feedback = 'Good'
+            submission.save()
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT "core_submission"."submitted_file" FROM')])
+        self.assertEqual(MediaBlob.objects.get(name=submission.submitted_file.name).refcount, 1)
+
+    def test_acquire_sizes_the_blob_from_the_fields_storage(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        other = FileSystemStorage(location=directory.name)
+        name = other.save('blobs/ab/cd/abcd.txt', ContentFile(b'12345'))
+        storage.acquire(name, other)
+        self.assertEqual(MediaBlob.objects.values_list('refcount', 'size').get(name=name), (1, 5))
+
+    def test_dedup_media_merges_legacy_copies(self):
+        for student, filename in ((self.ann, 'a.txt'), (self.bob, 'b.txt')):
+            (self.root / 'submissions').mkdir(exist_ok=True)
+            (self.root / 'submissions' / filename).write_bytes(b'same')
+            Submission.objects.create(assignment=self.assignment, student=student, submitted_file=f'submissions/{filename}')
+        call_command('dedup_media', '--dry-run', stdout=StringIO())
+        self.assertFalse(MediaBlob.objects.exists())
+        out = StringIO()
+        call_command('dedup_media', stdout=out)
+        self.assertIn('1 duplicate(s)', out.getvalue())
+        names = set(Submission.objects.values_list('submitted_file', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+        self.assertEqual([path.name for path in (self.root / 'submissions').iterdir()], [])
+        self.assertEqual((self.root / name).read_bytes(), b'same')
+
+
+class MediaServingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        cls.other_teacher = User.objects.create_user('other', role=User.Role.INSTRUCTOR)
+        cls.course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'), instructor=cls.teacher)
+        cls.assignment = Assignment.objects.create(course=cls.course, title='Essay', description='', due_date=timezone.now())
+        cls.ann = User.objects.create_user('ann', role=User.Role.STUDENT)
+        cls.bob = User.objects.create_user('bob', role=User.Role.STUDENT)
+        cls.carol = User.objects.create_user('carol', role=User.Role.STUDENT)
+        for student in (cls.ann, cls.bob):
+            Enrollment.objects.create(student=student, course=cls.course)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name))
+        submission = Submission.objects.create(
+            assignment=self.assignment, student=self.ann, submitted_file=SimpleUploadedFile('essay.txt', b'0123456789'),
+        )
+        lesson = Lesson.objects.create(
+            course=self.course, title='Intro', content='', order=1, resource_file=SimpleUploadedFile('notes.txt', b'notes'),
+        )
+        self.essay_name = submission.submitted_file.name
+        self.essay = reverse('serve_media', args=[self.essay_name])
+        self.notes = reverse('serve_media', args=[lesson.resource_file.name])
+
+    def get(self, url, user=None, **extra):
+        self.client.force_login(user or self.ann)
+        response = self.client.get(url, **extra)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_access_follows_the_referring_rows(self):
+        self.assertEqual(self.get(self.essay).status_code, 200)
+        self.assertEqual(self.get(self.essay, self.teacher).status_code, 200)
+        self.assertEqual(self.get(self.essay, self.bob).status_code, 403)
+        self.assertEqual(self.get(self.essay, self.other_teacher).status_code, 403)
+        self.assertEqual(self.get(self.notes, self.bob).status_code, 200)
+        self.assertEqual(self.get(self.notes, self.carol).status_code, 403)
+        self.assertEqual(self.get(reverse('serve_media', args=['blobs/unknown.txt'])).status_code, 404)
+        self.assertEqual(self.get(reverse('serve_media', args=['../settings.py'])).status_code, 404)
+
+    def test_parse_range(self):
+        cases = {
+            'bytes=2-5': (2, 5), 'bytes=8-': (8, 9), 'bytes=-3': (7, 9), 'bytes=5-100': (5, 9), 'bytes=-20': (0, 9),
+            'bytes=5-2': None, 'bytes=0-1,4-5': None, 'items=0-1': None, 'bytes=-': None, '': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(media.parse_range(header, 10), expected)
+        for header in ('bytes=10-', 'bytes=-0'):
+            with self.subTest(header=header), self.assertRaises(ValueError):
+                media.parse_range(header, 10)
+
+    def test_ranges(self):
+        response = self.get(self.essay, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(self.body(response), b'2345')
+        response = self.get(self.essay, HTTP_RANGE='bytes=10-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+        for extra in ({'HTTP_RANGE': 'bytes=0-1,4-5'}, {'HTTP_RANGE': 'bytes=2-5', 'HTTP_IF_RANGE': '"stale"'}):
+            with self.subTest(**extra):
+                response = self.get(self.essay, **extra)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.body(response), b'0123456789')
+
+    def test_etag_revalidation(self):
+        response = self.get(self.essay)
+        self.assertEqual(response['ETag'], '"%s"' % hashlib.sha256(b'0123456789').hexdigest())
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.get(self.essay, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(self.essay, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_offloaded_to_the_front_proxy(self):
+        with override_settings(MEDIA_SERVING={'MODE': 'x-accel-redirect', 'ACCEL_PREFIX': '/protected-media/'}):
+            response = self.get(self.essay, HTTP_RANGE='bytes=2-5')
+            self.assertEqual((response.status_code, response.content), (200, b''))
+            self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.essay_name}')
+            self.assertEqual(self.get(self.essay, self.bob).status_code, 403)
+        with override_settings(MEDIA_SERVING={'MODE': 'x-sendfile'}):
+            self.assertEqual(self.get(self.essay)['X-Sendfile'], default_storage.path(self.essay_name))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = User.objects.create_user('clerk', role=User.Role.EMPLOYEE)
+        cls.teacher = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        cls.ann = User.objects.create_user('ann', role=User.Role.STUDENT, first_name='Annabel', last_name='Quarry')
+        cls.maths = Category.objects.create(name='Maths')
+        cls.algebra = Course.objects.create(title='Algebra', description='', category=cls.maths, instructor=cls.teacher)
+        cls.biology = Course.objects.create(title='Biology', description='Cells', category=Category.objects.create(name='Science'))
+        cls.lesson = Lesson.objects.create(course=cls.algebra, title='Quadratic equations', content='Roots', order=1)
+        cls.quadrats = Assignment.objects.create(course=cls.biology, title='Quadrat survey', description='', due_date=timezone.now())
+        Enrollment.objects.create(student=cls.ann, course=cls.algebra)
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, user, text, **kwargs):
+        return {(entry.kind, entry.title) for entry in search.search(user, text, **kwargs)}
+
+    def test_each_role_sees_its_own_entries(self):
+        self.assertEqual(self.found(self.ann, 'quad'), {('lesson', 'Quadratic equations')})
+        self.assertEqual(self.found(self.teacher, 'quad'), {('lesson', 'Quadratic equations')})
+        self.assertEqual(self.found(self.employee, 'qua'), {('user', 'Annabel Quarry')})
+        self.assertEqual(self.found(self.teacher, 'biology'), set())
+        self.assertEqual(self.found(self.ann, 'biology'), {('course', 'Biology')})
+        self.assertEqual(self.found(self.ann, 'quad', kinds=['assignment']), set())
+        Enrollment.objects.create(student=self.ann, course=self.biology)
+        self.assertEqual(self.found(self.ann, 'quad', kinds=['assignment']), {('assignment', 'Quadrat survey')})
+
+    def test_typeahead_matches_the_last_word_as_a_prefix(self):
+        self.assertEqual(self.found(self.ann, 'alg'), {('course', 'Algebra')})
+        self.assertEqual(self.found(self.ann, 'quadratic equ'), {('lesson', 'Quadratic equations')})
+        self.assertEqual(self.found(self.ann, 'quad equations'), set(), "only the last word is a prefix")
+        self.assertEqual(self.found(self.ann, 'algebra m'), {('course', 'Algebra')}, "a lone trailing letter waits")
+        self.assertEqual(self.found(self.ann, 'q'), set())
+        self.assertEqual(self.found(self.ann, 'maths'), {('course', 'Algebra'), ('category', 'Maths')})
+
+    def test_index_follows_saves_deletes_and_bulk_changes(self):
+        self.lesson.title = 'Linear equations'
+        self.lesson.save()
+        self.assertEqual(self.found(self.ann, 'quadratic'), set())
+        self.assertEqual(self.found(self.ann, 'linear'), {('lesson', 'Linear equations')})
+        self.maths.name = 'Mathematics'
+        self.maths.save()
+        self.assertIn(('course', 'Algebra'), self.found(self.ann, 'mathematics'))
+        self.lesson.delete()
+        self.assertEqual(self.found(self.ann, 'linear'), set())
+
+        importers.import_students(BytesIO(b"Username,Password,First Name\nzed,pw-zed-123,Zelda\n"), 'students.csv', workers=1)
+        self.assertEqual(self.found(self.employee, 'zelda'), {('user', 'Zelda')})
+        Course.objects.filter(id=self.biology.id).update(title='Botany')
+        self.assertEqual(self.found(self.ann, 'botany'), set(), "queryset updates send no signals")
+        search.rebuild()
+        self.assertEqual(self.found(self.ann, 'botany'), {('course', 'Botany')})
+        self.assertEqual(self.found(self.ann, 'biology'), set())
+
+    @skipIf(connection.vendor != 'sqlite', "FTS5 index")
+    def test_fts_rows_are_numbered_by_bucket(self):
+        def rowids(term):
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT rowid FROM {search.FTS_TABLE} WHERE {search.FTS_TABLE} MATCH %s", [term])
+                return [rowid for rowid, in cursor.fetchall()]
+
+        lesson_rowid = (search.COURSE_BUCKETS + 2 * self.algebra.id) << 32 | self.lesson.id
+        assignment_rowid = (search.COURSE_BUCKETS + 2 * self.biology.id + 1) << 32 | self.quadrats.id
+        self.assertEqual(rowids('quadratic'), [lesson_rowid])
+        self.assertEqual(search._decode(lesson_rowid), ('lesson', self.lesson.id))
+        self.assertEqual(search._decode(assignment_rowid), ('assignment', self.quadrats.id))
+        self.assertEqual(search._decode(1 << 32 | self.ann.id), ('user', self.ann.id))
+        self.assertEqual(rowids('biology'), [2 << 32 | self.biology.id])
+        # The update trigger removes the old text before adding the new.
+        SearchEntry.objects.filter(kind='lesson', object_id=self.lesson.id).update(title='Cubic equations')
+        self.assertEqual(rowids('quadratic'), [])
+        self.assertEqual(rowids('cubic'), [lesson_rowid])
+        SearchEntry.objects.filter(kind='lesson').delete()
+        self.assertEqual(rowids('cubic'), [])
+        # Consecutive courses merge into one range; a single kind keeps to its own buckets.
+        scope = search.Scope(['lesson', 'assignment'], content_courses=[1, 2, 4])
+        self.assertEqual(search._ranges(scope), [((4 + 2) << 32, ((4 + 6) << 32) - 1), ((4 + 8) << 32, ((4 + 10) << 32) - 1)])
+        scope = search.Scope(['assignment'], content_courses=[1])
+        self.assertEqual(search._ranges(scope), [((4 + 3) << 32, ((4 + 4) << 32) - 1)])
+
+
+class StudentImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('taken', role=User.Role.STUDENT, student_id='S-1')
+        self.employee = User.objects.create_user('clerk', role=User.Role.EMPLOYEE)
+
+    def upload(self, text, encoding='utf-8', name='students.csv'):
+        return SimpleUploadedFile(name, text.encode(encoding), content_type='text/csv')
+
+    def test_rows_are_checked_against_the_file_and_the_database(self):
+        rows = (
+            "Username,Password,Student ID,First Name\n"
+            "ann,pw-ann-123,S-2,Ann\n"
+            "taken,pw-123456,,Old\n"
+            "ann,pw-again-1,S-3,Twin\n"
+            "bob,pw-bob-123,S-1,Bob\n"
+            ",pw-none-12,,\n"
+        )
+        result = importers.import_students(self.upload(rows), 'students.csv', workers=1, dry_run=True)
+        self.assertEqual(result.created, 1)
+        self.assertEqual([error['line'] for error in result.errors], [3, 4, 5, 6])
+        self.assertIn("username: Duplicate of line 2.", result.errors[1]['errors'])
+        self.assertFalse(User.objects.filter(username='ann').exists())
+
+        result = importers.import_students(self.upload(rows), 'students.csv', workers=1)
+        ann = User.objects.get(username='ann')
+        self.assertEqual((result.created, ann.role, ann.student_id), (1, User.Role.STUDENT, 'S-2'))
+        self.assertTrue(ann.check_password('pw-ann-123'))
+
+    def test_excel_csv_in_cp1252(self):
+        result = importers.import_students(self.upload("username,password,first_name\njose,pw-jose-12,José\n", 'cp1252'), 'students.csv', workers=1)
+        self.assertEqual(result.created, 1)
+        self.assertEqual(User.objects.get(username='jose').first_name, 'José')
+
+    def test_unreadable_files_are_form_errors(self):
+        self.client.force_login(self.employee)
+        for name, content, message in [
+            ('students.csv', b'username,password\n\x81\x8d\x90,pw\n', "encoding is not supported"),
+            ('students.csv', b'first_name,last_name\nAnn,Lee\n', "Missing required column(s): username, password."),
+            ('students.xlsx', b'not a zip archive', "XLSX"),
+            ('students.txt', b'username,password\n', "Only .csv and .xlsx"),
+        ]:
+            with self.subTest(message=message):
+                response = self.client.post(reverse('import_students'), {'file': SimpleUploadedFile(name, content)})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(message, response.context['form'].errors['file'][0])
+
+
+class TemplateFragmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = User.objects.create_user('clerk', role=User.Role.EMPLOYEE)
+        cls.student = User.objects.create_user('ann', role=User.Role.STUDENT)
+        cls.course = Course.objects.create(
+            title='Algebra', description='', category=Category.objects.create(name='Maths'),
+            instructor=User.objects.create_user('teacher', role=User.Role.INSTRUCTOR),
+        )
+        Enrollment.objects.create(student=cls.student, course=cls.course)
+        cls.review = Review.objects.create(course=cls.course, student=cls.student, rating=4, comment='Clear lectures')
+
+    def setUp(self):
+        cache.clear()
+        caches['template_fragments'].clear()
+
+    def navbar(self, role, version):
+        return caches['template_fragments'].get(make_template_fragment_key('navbar', [role, version]))
+
+    def test_navbar_is_cached_per_role_and_version(self):
+        self.client.force_login(self.employee)
+        self.client.get(reverse('view_reviews'))
+        self.assertIn(reverse('user_list', args=['STUDENT']), self.navbar(User.Role.EMPLOYEE, 1))
+        self.assertIsNone(self.navbar(User.Role.STUDENT, 1))
+        with override_settings(TEMPLATE_FRAGMENTS={'VERSION': 2}):
+            self.client.get(reverse('view_reviews'))
+        self.assertIsNotNone(self.navbar(User.Role.EMPLOYEE, 2))
+
+    def test_review_row_is_keyed_by_its_last_edit(self):
+        self.client.force_login(self.employee)
+        self.assertContains(self.client.get(reverse('view_reviews')), 'Clear lectures')
+        key = make_template_fragment_key('review_row', [self.review.pk, self.review.updated_at, 1])
+        self.assertIn('Clear lectures', caches['template_fragments'].get(key))
+
+        self.client.force_login(self.student)
+        self.client.post(reverse('add_review', args=[self.course.id]), {'rating': 2, 'comment': 'Too fast'})
+        self.client.force_login(self.employee)
+        response = self.client.get(reverse('view_reviews'))
+        self.assertContains(response, 'Too fast')
+        self.assertNotContains(response, 'Clear lectures')
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Maths')
+        # Two courses per title, so the id tie-breaker decides page boundaries.
+        for title in 'abcde':
+            for _ in range(2):
+                Course.objects.create(title=title, description='', category=category)
+        cls.courses = Course.objects.all()
+
+    def walk(self, ordering):
+        paginator = KeysetPaginator(self.courses, ordering, per_page=3)
+        pages, page = [], paginator.page()
+        while True:
+            pages.append([course.id for course in page])
+            if not page.has_next:
+                break
+            page = paginator.page(page.next_cursor)
+        # And back again from the last page.
+        back = [pages[-1]]
+        while page.has_previous:
+            page = paginator.page(page.previous_cursor)
+            back.append([course.id for course in page])
+        return pages, back
+
+    def test_forward_and_backward_in_both_directions(self):
+        for ordering in [('title', 'id'), ('-title', '-id'), ('-title',)]:
+            with self.subTest(ordering=ordering):
+                pages, back = self.walk(ordering)
+                expected = list(self.courses.order_by(*ordering, '-id' if ordering[0].startswith('-') else 'id').values_list('id', flat=True))
+                self.assertEqual(sum(pages, []), expected)
+                self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+                self.assertEqual(back, pages[::-1])
+
+    def test_tampered_cursors_fall_back_to_the_first_page(self):
+        paginator = KeysetPaginator(self.courses, ('title', 'id'), per_page=3)
+        raw = lambda payload: base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        for cursor in ['!!!', raw(['n', 'x', 'abc']), raw(['x', 'a', 1]), raw(['n', 'a']), raw(7), raw({'n': 1})]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    paginator.page(cursor)
+                request = RequestFactory().get('/', {'cursor': cursor})
+                first = paginate(request, self.courses, ('title', 'id'), per_page=3)
+                self.assertEqual([course.title for course in first], ['a', 'a', 'b'])
+                self.assertFalse(first.has_previous)
+
+
+class JobQueueTests(TestCase):
+    """Jobs are run in the test thread with work_off(); runworker does the same on a thread pool."""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+        patcher = mock.patch.dict(jobs._tasks, {'record': self.record, 'explode': self.explode})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, **kwargs):
+        self.calls.append(kwargs)
+
+    def explode(self):
+        raise RuntimeError("boom")
+
+    def test_idempotency_key_enqueues_once(self):
+        first = jobs.enqueue('record', {'n': 1}, key='once')
+        self.assertEqual(jobs.enqueue('record', {'n': 2}, key='once'), first)
+        self.assertEqual(jobs.work_off(), 1)
+        jobs.enqueue('record', {'n': 3}, key='once')
+        self.assertEqual(jobs.work_off(), 0)
+        self.assertEqual(self.calls, [{'n': 1}])
+
+    def test_higher_priority_runs_first(self):
+        jobs.enqueue('record', {'n': 'low'})
+        jobs.enqueue('record', {'n': 'high'}, priority=10)
+        jobs.work_off()
+        self.assertEqual(self.calls, [{'n': 'high'}, {'n': 'low'}])
+
+    def test_failures_back_off_then_fail(self):
+        job = jobs.enqueue('explode', max_attempts=2)
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertEqual(jobs.work_off(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertEqual(jobs.work_off(), 0, "a retry waits for its backoff")
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'WARNING'):
+            jobs.work_off()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+
+    def test_jobs_of_a_dead_worker_run_again(self):
+        job = jobs.enqueue('record', {'n': 1})
+        self.assertEqual(jobs.claim('dead'), [job])
+        self.assertEqual(jobs.work_off(), 0)
+        Job.objects.filter(id=job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.work_off(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.DONE, 2))
+
+    def test_removing_a_user_defers_the_delete(self):
+        employee = User.objects.create_user('clerk', role=User.Role.EMPLOYEE)
+        student = User.objects.create_user('pupil', role=User.Role.STUDENT)
+        self.client.force_login(employee)
+        response = self.client.post(reverse('remove_user', args=[student.id]))
+        self.assertRedirects(response, reverse('user_list', args=['student']))
+        student.refresh_from_db()
+        self.assertFalse(student.is_active)
+        self.assertNotContains(self.client.get(reverse('user_list', args=['student'])), 'pupil')
+        jobs.work_off()
+        self.assertFalse(User.objects.filter(id=student.id).exists())
+
+    def test_removed_users_are_hidden_until_deleted(self):
+        employee = User.objects.create_user('clerk', role=User.Role.EMPLOYEE)
+        student = User.objects.create_user('pupil', role=User.Role.STUDENT)
+        course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'))
+        Enrollment.objects.create(student=student, course=course)
+        self.client.force_login(employee)
+        self.client.post(reverse('remove_user', args=[student.id]))
+        self.assertEqual(list(roster.course_roster(course)), [])
+        self.assertEqual(gradebook.load(course).students, [])
+        self.assertNotIn(User.Role.STUDENT, dashboards.users_by_role()[0])
+        self.assertEqual(search.search(employee, 'pupil'), [])
+        search.rebuild()
+        self.assertEqual(search.search(employee, 'pupil'), [])
+
+
+class GradeSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'))
+        cls.assignments = [
+            Assignment.objects.create(course=course, title=f'Homework {n}', description='', due_date=timezone.now()) for n in (1, 2)
+        ]
+        cls.student = User.objects.create_user('ann', role=User.Role.STUDENT)
+        Enrollment.objects.create(student=cls.student, course=course)
+        for assignment, grade in zip(cls.assignments, (80, 60)):
+            Submission.objects.create(assignment=assignment, student=cls.student, submitted_file='submissions/a.pdf', grade=grade)
+        grades.rebuild_grade_summaries()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cascaded_deletes_do_not_load_each_assignment(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assignments[0].delete()
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT') and 'FROM "core_assignment"' in q['sql']])
+        self.assertEqual(Enrollment.objects.values_list('graded_count', 'grade_sum').get(student=self.student), (1, 60))
+        self.assertEqual(grades.check_grade_summaries(), ([], []))
+
+    def test_deleted_submission_leaves_the_latest_grades(self):
+        deleted, kept = Submission.objects.filter(student=self.student).order_by('id')
+        deleted.delete()
+        summary = grades.get_summary(self.student)
+        self.assertEqual((summary.graded_count, summary.recent_submission_ids), (1, [kept.id]))
+        self.assertEqual(grades.check_grade_summaries(), ([], []))
+
+    def test_regrading_folds_in_the_stored_grade(self):
+        submission = Submission.objects.select_related('assignment__course').get(assignment=self.assignments[0])
+        submission.assignment.course.instructor = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        submission.assignment.course.save()
+        self.client.force_login(submission.assignment.course.instructor)
+        is_valid = GradeForm.is_valid
+
+        def regraded_meanwhile(form):
+            # Another instructor's grade of 70 lands after the view loaded the submission.
+            Submission.objects.filter(id=submission.id).update(grade=70)
+            grades.rebuild_grade_summaries()
+            return is_valid(form)
+
+        with mock.patch.object(GradeForm, 'is_valid', regraded_meanwhile):
+            self.client.post(reverse('grade_submission', args=[submission.id]), {'grade': 90, 'feedback': ''})
+        self.assertEqual(grades.check_grade_summaries(), ([], []))
+        self.assertEqual(grades.get_summary(self.student).grade_sum, 150)
+
+    def test_reading_a_missing_summary_writes_nothing(self):
+        newcomer = User.objects.create_user('bob', role=User.Role.STUDENT)
+        with self.assertNumQueries(1):
+            summary = grades.get_summary(newcomer)
+        self.assertEqual((summary.graded_count, summary.recent_submission_ids), (0, []))
+        self.assertFalse(StudentGradeSummary.objects.filter(student=newcomer).exists())
+        self.assertEqual(grades.check_grade_summaries(), ([], []), "no row is right for a student without grades")
+        StudentGradeSummary.objects.filter(student=self.student).delete()
+        self.assertEqual(grades.check_grade_summaries(), ([self.student.id], []))
+
+
+class BatchGradingTests(TestCase):
+    """Grading a whole assignment from the spreadsheet view or a CSV keeps the grade summaries exact."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'), instructor=cls.instructor)
+        cls.assignment = Assignment.objects.create(course=course, title='Homework 1', description='', due_date=timezone.now())
+        for n in range(1, 4):
+            student = User.objects.create_user(f'pupil{n}', role=User.Role.STUDENT, student_id=f'S{n}')
+            Enrollment.objects.create(student=student, course=course)
+            Submission.objects.create(assignment=cls.assignment, student=student, submitted_file=f'submissions/{n}.pdf')
+        grades.rebuild_grade_summaries()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.instructor)
+        self.url = reverse('grade_submissions', args=[self.assignment.id])
+
+    def post_rows(self, rows, shown=None):
+        """Post the grading form; `shown` is what the page was rendered with, the current values by default."""
+        submissions = list(self.assignment.submissions.order_by('student__username', 'id'))
+        shown = shown or [(s.grade, s.feedback) for s in submissions]
+        data = {'form-TOTAL_FORMS': len(submissions), 'form-INITIAL_FORMS': len(submissions)}
+        for i, (submission, (grade, feedback), (shown_grade, shown_feedback)) in enumerate(zip(submissions, rows, shown)):
+            data.update({
+                f'form-{i}-id': submission.id, f'form-{i}-grade': grade, f'form-{i}-feedback': feedback,
+                f'form-{i}-shown_grade': '' if shown_grade is None else shown_grade, f'form-{i}-shown_feedback': shown_feedback or '',
+            })
+        return self.client.post(self.url, data)
+
+    def grades(self):
+        return list(self.assignment.submissions.order_by('student__username').values_list('grade', flat=True))
+
+    def test_saves_every_row_and_keeps_summaries_exact(self):
+        response = self.post_rows([('90', 'Great'), ('75.5', ''), ('', '')])
+        self.assertRedirects(response, self.url)
+        self.assertEqual(self.grades(), [90, 75.5, None])
+        self.assertEqual(grades.check_grade_summaries(), ([], []))
+
+    def test_one_invalid_row_saves_nothing(self):
+        response = self.post_rows([('90', ''), ('lots', ''), ('60', '')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.grades(), [None, None, None])
+
+    def test_rows_changed_elsewhere_are_not_reverted(self):
+        shown = [(None, None)] * 3
+        # Graded in another tab after the batch page was opened.
+        for username, grade in [('pupil1', 40), ('pupil2', 50)]:
+            submission = self.assignment.submissions.get(student__username=username)
+            self.client.post(reverse('grade_submission', args=[submission.id]), {'grade': grade, 'feedback': 'Seen'})
+        # pupil1's row was left as shown, pupil2's was edited on the stale page.
+        response = self.post_rows([('', ''), ('95', ''), ('70', '')], shown=shown)
+        self.assertEqual(self.grades(), [40, 50, 70])
+        warning = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn('pupil2', warning[-1])
+        self.assertNotIn('pupil1', warning[-1])
+        self.assertEqual(grades.check_grade_summaries(), ([], []))
+
+    def test_rows_are_paged(self):
+        with mock.patch('core.views.GRADING_PAGE_SIZE', 2):
+            second = self.client.get(self.url, {'page': 2})
+            self.assertEqual(len(second.context['formset'].forms), 1)
+            data = {'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 1, 'form-0-id': second.context['formset'].forms[0].instance.id,
+                    'form-0-grade': '65', 'form-0-feedback': '', 'form-0-shown_grade': '', 'form-0-shown_feedback': ''}
+            self.assertRedirects(self.client.post(self.url + '?page=2', data), self.url + '?page=2')
+        self.assertEqual(self.grades(), [None, None, 65])
+
+    def test_csv_import_blank_grade_keeps_the_current_one(self):
+        self.post_rows([('90', ''), ('', ''), ('', '')])
+        self.client.post(self.url, {'import': '1', 'file': SimpleUploadedFile('grades.csv', b'Student ID,Grade\nS1,\nS2,60\n')})
+        self.assertEqual(self.grades(), [90, 60, None])
+
+    def test_csv_import_reports_bad_rows_and_saves_the_rest(self):
+        upload = SimpleUploadedFile('grades.csv', b'Student ID,Grade\nS1,88\nS2,abc\nS9,70\nS1,50\nS3,\n')
+        response = self.client.post(self.url, {'import': '1', 'file': upload})
+        result = response.context['result']
+        self.assertEqual((result.updated, result.unchanged), (1, 1))
+        self.assertEqual([error['line'] for error in result.errors], [3, 4, 5])
+        self.assertEqual(self.grades(), [88, None, None])
+        self.assertEqual(grades.check_grade_summaries(), ([], []))
+
+
+@skipIf(gradebook.np is None, "The gradebook requires numpy.")
+class GradebookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        cls.course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'), instructor=cls.instructor)
+        # Two students; the third assignment is an exam. None is ungraded.
+        table = {'ann': [50, 90, 80], 'bob': [70, None, 60]}
+        types = ['ASSIGNMENT', 'ASSIGNMENT', 'EXAM']
+        assignments = [
+            Assignment.objects.create(course=cls.course, title=f'Work {j}', description='', due_date=timezone.now() + timedelta(days=j), assignment_type=kind)
+            for j, kind in enumerate(types)
+        ]
+        for username, row in table.items():
+            student = User.objects.create_user(username, role=User.Role.STUDENT, last_name=username)
+            Enrollment.objects.create(student=student, course=cls.course)
+            for assignment, grade in zip(assignments, row):
+                if grade is not None:
+                    Submission.objects.create(assignment=assignment, student=student, submitted_file='x.pdf', grade=grade)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_weighted_totals_with_drop_lowest(self):
+        GradeWeight.objects.create(course=self.course, assignment_type='ASSIGNMENT', weight=3, drop_lowest=1)
+        book = gradebook.course_gradebook(self.course)
+        # ann: assignments 90 (50 dropped), exam 80 -> (3 * 90 + 80) / 4. bob keeps his only assignment.
+        self.assertEqual(book.totals.tolist(), [87.5, 67.5])
+        self.assertEqual(book.dropped.tolist(), [[True, False, False], [False, False, False]])
+        self.assertEqual(book.percentile_ranks.tolist(), [75, 25])
+        self.assertEqual(book.assignment_stats[1].graded, 1)
+        self.assertEqual(book.total_stats.mean, 77.5)
+        self.assertEqual(book.total_stats.percentiles['p50'], 77.5)
+
+    def test_instructor_page_and_exam_type(self):
+        self.client.force_login(self.instructor)
+        response = self.client.get(reverse('instructor_gradebook', args=[self.course.id]), {'sort': 'total'})
+        self.assertEqual([row['student'].username for row in response.context['rows']], ['ann', 'bob'])
+        self.client.post(reverse('create_exam', args=[self.course.id]), {'title': 'Final', 'description': 'Everything', 'due_date': '2030-01-01T10:00'})
+        self.assertEqual(Assignment.objects.get(title='Final').assignment_type, Assignment.Type.EXAM)
+
+
+@skipIf(analytics.np is None, "Grade analytics require numpy.")
+class GradeAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        cls.course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'), instructor=cls.instructor)
+        cls.due = timezone.now()
+        cls.assignment = Assignment.objects.create(course=cls.course, title='Homework', description='', due_date=cls.due)
+        # Submitted two days early, half an hour early, two hours late and (ungraded) four days late.
+        for name, grade, hours in [('ann', 95, -48), ('bob', 72, -0.5), ('cy', 105, 2), ('dee', None, 96)]:
+            student = User.objects.create_user(name, role=User.Role.STUDENT)
+            submission = Submission.objects.create(assignment=cls.assignment, student=student, submitted_file='x.pdf', grade=grade)
+            Submission.objects.filter(pk=submission.pk).update(submitted_at=cls.due + timedelta(hours=hours))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_assignment_figures_and_json(self):
+        self.client.force_login(self.instructor)
+        data = self.client.get(reverse('assignment_analytics_json', args=[self.assignment.id])).json()
+        self.assertEqual((data['submitted'], data['graded'], data['late']), (4, 3, 2))
+        self.assertEqual(data['late_rate'], 0.5)
+        self.assertEqual(data['quantiles']['p50'], 95)
+        # 105 is counted in the top bucket.
+        self.assertEqual([bucket['count'] for bucket in data['histogram']], [0] * 7 + [1, 0, 2])
+        timing = {entry['label']: entry['count'] for entry in data['timing']}
+        self.assertEqual([timing['1-3 days early'], timing['Last hour'], timing['1-24 hours late'], timing['Over 3 days late']], [1, 1, 1, 1])
+        self.assertEqual(data['timing'][-1]['cumulative'], 4)
+
+        response = self.client.get(reverse('instructor_course_detail', args=[self.course.id]))
+        self.assertEqual(response.context['analytics']['graded'], 3)
+        self.assertEqual(self.client.get(reverse('course_analytics_json', args=[self.course.id])).json()['assignments'][0]['late'], 2)
+
+    def test_cached_until_a_grade_changes(self):
+        analytics.for_assignments([self.assignment])
+        with self.assertNumQueries(0):
+            self.assertEqual(analytics.for_assignments([self.assignment])[self.assignment.id]['graded'], 3)
+        submission = Submission.objects.get(student__username='dee')
+        submission.grade = 40
+        with self.captureOnCommitCallbacks(execute=True):
+            grades.save_grades([(submission, None)])
+        self.assertEqual(analytics.for_assignments([self.assignment])[self.assignment.id]['graded'], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            Submission.objects.get(student__username='ann').delete()
+        self.assertEqual(analytics.for_assignments([self.assignment])[self.assignment.id]['submitted'], 3)
+
+
+class AttendanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        cls.course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'), instructor=cls.instructor)
+        cls.monday_class = Schedule.objects.create(course=cls.course, day_of_week='MON', start_time='09:00', end_time='10:00')
+        cls.wednesday_class = Schedule.objects.create(course=cls.course, day_of_week='WED', start_time='09:00', end_time='10:00')
+        cls.ann = User.objects.create_user('ann', role=User.Role.STUDENT, last_name='Adams')
+        cls.bob = User.objects.create_user('bob', role=User.Role.STUDENT, last_name='Brown')
+        for student in (cls.ann, cls.bob):
+            Enrollment.objects.create(student=student, course=cls.course)
+        cls.monday = date(2026, 3, 2)
+        cls.wednesday = cls.monday + timedelta(days=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def marks(self):
+        return dict(
+            ((schedule_id, day, student_id), present)
+            for schedule_id, day, student_id, present in Attendance.objects.values_list('schedule_id', 'date', 'student_id', 'is_present')
+        )
+
+    def test_build_sheet_reads_without_writing(self):
+        sheet = attendance.build_sheet(self.monday_class, self.monday)
+        self.assertEqual([(row['student'], row['is_present'], row['recorded']) for row in sheet], [(self.ann, False, False), (self.bob, False, False)])
+        self.assertFalse(Attendance.objects.exists())
+        attendance.save_sheet(self.monday_class, self.monday, [self.bob.id])
+        sheet = attendance.build_sheet(self.monday_class, self.monday)
+        self.assertEqual([(row['is_present'], row['recorded']) for row in sheet], [(False, True), (True, True)])
+
+    def test_save_sessions_upserts_and_unmarks(self):
+        sessions = [(self.monday_class, self.monday), (self.wednesday_class, self.wednesday)]
+        students = [self.ann.id, self.bob.id]
+        self.assertEqual(attendance.save_sessions(sessions, students, {(self.monday_class.id, self.monday, self.ann.id)}), 4)
+        ids = set(Attendance.objects.values_list('id', flat=True))
+        attendance.save_sessions(sessions, students, {(self.wednesday_class.id, self.wednesday, self.bob.id)})
+        self.assertEqual(set(Attendance.objects.values_list('id', flat=True)), ids, "rows are updated in place")
+        self.assertEqual(self.marks(), {
+            (self.monday_class.id, self.monday, self.ann.id): False,
+            (self.monday_class.id, self.monday, self.bob.id): False,
+            (self.wednesday_class.id, self.wednesday, self.ann.id): False,
+            (self.wednesday_class.id, self.wednesday, self.bob.id): True,
+        })
+
+    def next_sessions(self, moment, limit=5):
+        with mock.patch('django.utils.timezone.now', return_value=moment):
+            sessions = attendance.next_sessions(Schedule.objects.filter(course=self.course), limit=limit)
+        return [(schedule.day_of_week, schedule.session_date) for schedule in sessions]
+
+    def test_next_sessions_cut_off_at_the_end_time(self):
+        Schedule.objects.filter(id=self.wednesday_class.id).update(start_time='14:00', end_time='15:00')
+        wednesday = lambda hour, minute=0: timezone.make_aware(datetime.combine(self.wednesday, dt_time(hour, minute)))
+        self.assertEqual(self.next_sessions(wednesday(14, 59)), [
+            ('WED', self.wednesday), ('MON', self.monday + timedelta(weeks=1)),
+        ])
+        self.assertEqual(self.next_sessions(wednesday(15)), [
+            ('MON', self.monday + timedelta(weeks=1)), ('WED', self.wednesday + timedelta(weeks=1)),
+        ])
+
+    def test_next_sessions_wrap_into_next_week(self):
+        sunday_night = timezone.make_aware(datetime.combine(self.monday + timedelta(days=6), dt_time(23, 0)))
+        next_monday = self.monday + timedelta(weeks=1)
+        self.assertEqual(self.next_sessions(sunday_night), [('MON', next_monday), ('WED', next_monday + timedelta(days=2))])
+        self.assertEqual(self.next_sessions(sunday_night, limit=1), [('MON', next_monday)])
+        monday_morning = timezone.make_aware(datetime.combine(self.monday, dt_time(8, 0)))
+        self.assertEqual(self.next_sessions(monday_morning), [('MON', self.monday), ('WED', self.wednesday)], "each slot once")
+
+    def test_take_week_attendance(self):
+        self.client.force_login(self.instructor)
+        url = reverse('take_week_attendance', args=[self.course.id, self.monday.isoformat()])
+        response = self.client.get(reverse('take_week_attendance', args=[self.course.id, self.wednesday.isoformat()]))
+        self.assertEqual(response.context['week_start'], self.monday)
+        self.assertEqual(len(response.context['rows']), 2)
+        self.assertFalse(Attendance.objects.exists())
+
+        marks = [f'{self.monday_class.id}:{self.ann.id}', f'{self.wednesday_class.id}:{self.bob.id}', 'junk', f'{self.monday_class.id}:999999']
+        self.assertRedirects(self.client.post(url, {'present': marks}), url)
+        self.assertEqual(sorted(key for key, present in self.marks().items() if present), sorted([
+            (self.monday_class.id, self.monday, self.ann.id), (self.wednesday_class.id, self.wednesday, self.bob.id),
+        ]))
+        self.assertEqual(len(self.marks()), 4)
+        self.client.post(url, {})
+        self.assertEqual(set(self.marks().values()), {False}, "unticked boxes unmark the rows")
+        self.assertEqual(len(self.marks()), 4)
+
+        self.assertRedirects(
+            self.client.get(reverse('take_week_attendance', args=[self.course.id, 'not-a-date'])),
+            reverse('instructor_dashboard'), fetch_redirect_response=False,
+        )
+        self.client.force_login(User.objects.create_user('other', role=User.Role.INSTRUCTOR))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class RosterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.instructor = User.objects.create_user('teacher', role=User.Role.INSTRUCTOR)
+        cls.course = Course.objects.create(title='Algebra', description='', category=Category.objects.create(name='Maths'), instructor=cls.instructor)
+        past = Assignment.objects.create(course=cls.course, title='Past', description='', due_date=timezone.now() - timedelta(days=1))
+        Assignment.objects.create(course=cls.course, title='Future', description='', due_date=timezone.now() + timedelta(days=1))
+        schedule = Schedule.objects.create(course=cls.course, day_of_week='MON', start_time='09:00', end_time='10:00')
+        cls.ann = User.objects.create_user('ann', role=User.Role.STUDENT, last_name='Adams')
+        cls.bob = User.objects.create_user('bob', role=User.Role.STUDENT, last_name='Brown')
+        for student in (cls.ann, cls.bob):
+            Enrollment.objects.create(student=student, course=cls.course)
+        grades.record_grade_changes([(Submission.objects.create(assignment=past, student=cls.ann, submitted_file='x.pdf', grade=80), None)])
+        for day, present in [(1, True), (8, True), (15, False), (22, True)]:
+            Attendance.objects.create(schedule=schedule, student=cls.ann, date=timezone.localdate() - timedelta(days=day), is_present=present)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_figures_and_sorting(self):
+        ann, bob = roster.course_roster(self.course)
+        self.assertEqual((ann.submitted, ann.average, ann.missing, ann.attendance_rate), (1, 80, 0, 75))
+        self.assertEqual((bob.submitted, bob.average, bob.missing, bob.attendance_rate), (0, None, 1, None))
+        self.assertEqual([e.student for e in roster.course_roster(self.course, 'missing', descending=True)], [self.bob, self.ann])
+        # Students without a grade come last in either direction.
+        self.assertEqual([e.student for e in roster.course_roster(self.course, 'average', descending=True)], [self.ann, self.bob])
+        self.assertEqual([e.student for e in roster.course_roster(self.course, 'average')], [self.ann, self.bob])
+
+    def test_query_count_does_not_grow_with_students(self):
+        self.client.force_login(self.instructor)
+        url = reverse('view_student_roster', args=[self.course.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url, {'sort': '-attendance'})
+        for i in range(30):
+            Enrollment.objects.create(student=User.objects.create_user(f'student{i}', role=User.Role.STUDENT), course=self.course)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url, {'sort': '-attendance'})
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len(response.context['enrollments']), 32)
+        self.assertEqual(response.context['sort_links']['attendance'], 'attendance')
+
+
+@override_settings(REQUEST_PROFILING={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SLOW_QUERY_COUNT': 1})
+class RequestProfilingTests(TestCase):
+    def _middleware(self):
+        def view(request):
+            Category.objects.count()
+            Course.objects.count()
+            return HttpResponse(engines['django'].from_string('{{ n }} categories').render({'n': 0}))
+        return RequestProfilingMiddleware(view)
+
+    def test_disabled_middleware_is_not_used(self):
+        with override_settings(REQUEST_PROFILING={'ENABLED': False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                RequestProfilingMiddleware(lambda request: HttpResponse())
+
+    def test_sampled_request_gets_server_timing(self):
+        with self.assertLogs('core.profiling', 'INFO'):
+            response = self._middleware()(RequestFactory().get('/'))
+        metrics = {part.split(';')[0] for part in response['Server-Timing'].split(', ')}
+        self.assertEqual(metrics, {'db', 'tpl', 'total'})
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    def test_log_line_is_json(self):
+        request = RequestFactory().get('/')
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            self._middleware()(request)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['method'], record['path'], record['status'], record['queries']), ('GET', '/', 200, 2))
+        self.assertEqual(len(record['slowest']), 1)
+        self.assertIn('SELECT COUNT(*)', record['slowest'][0]['sql'])
+        self.assertGreater(record['template_ms'], 0)
+
+    def test_unsampled_request_is_passed_through(self):
+        with override_settings(REQUEST_PROFILING={'ENABLED': True, 'SAMPLE_RATE': 0.5}):
+            middleware = self._middleware()
+        with mock.patch('core.middleware.random.random', return_value=0.7), self.assertNoLogs('core.profiling'):
+            response = middleware(RequestFactory().get('/'))
+        self.assertNotIn('Server-Timing', response)
+        with mock.patch('core.middleware.random.random', return_value=0.2), self.assertLogs('core.profiling', 'INFO'):
+            self.assertIn('Server-Timing', middleware(RequestFactory().get('/')))
+
+
+@override_settings(DATABASE_REPLICAS={'PRIMARY': 'primary', 'REPLICAS': ['replica'], 'STICKY_SECONDS': 15})
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    Two SQLite files stand in for a primary and its replica. Replication is
+    never run during a test, so a row written through the router is only
+    visible to reads that were sent to the primary.
+    """
+    # Added only for this class, once the test runner has set up its own
+    # databases, so they are allowed to connect from then on.
+    aliases = ('primary', 'replica')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.databases = frozenset(cls.aliases)
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        cls.path = Path(directory.name)
+        for alias in cls.aliases:
+            connections.settings[alias] = connections.configure_settings({
+                'default': connections.settings['default'],
+                alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(cls.path / f'{alias}.sqlite3')},
+            })[alias]
+        # Data migrations read inside the migration's transaction, so the
+        # router keeps them on the primary.
+        call_command('migrate', database='primary', verbosity=0)
+        cls._copy(cls.path / 'primary.sqlite3', cls.path / 'schema.sqlite3')
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in cls.aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        super().tearDownClass()
+
+    @classmethod
+    def _copy(cls, source, target):
+        with sqlite3.connect(source) as original, sqlite3.connect(target) as copy:
+            original.backup(copy)
+
+    def setUp(self):
+        # Start every test from an empty primary and a replica in sync with it.
+        for alias in self.aliases:
+            connections[alias].close()
+            self._copy(self.path / 'schema.sqlite3', self.path / f'{alias}.sqlite3')
+
+    def visible(self, name):
+        return Category.objects.filter(name=name).exists()
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        Category.objects.create(name='Physics')
+        self.assertEqual(router.db_for_read(Category), 'replica')
+        self.assertEqual(router.db_for_write(Category), 'primary')
+        self.assertFalse(self.visible('Physics'))
+        self.assertTrue(Category.objects.using('primary').filter(name='Physics').exists())
+
+    def test_transactions_on_primary_read_primary(self):
+        with transaction.atomic(using='primary'):
+            Category.objects.create(name='Chemistry')
+            self.assertTrue(self.visible('Chemistry'))
+
+    def test_pinned_block_reads_primary(self):
+        Category.objects.create(name='Biology')
+        with routers.primary():
+            self.assertTrue(self.visible('Biology'))
+        self.assertFalse(self.visible('Biology'))
+
+    def _middleware(self):
+        def view(request):
+            if request.method == 'POST':
+                Category.objects.create(name=request.POST['name'])
+            return HttpResponse(str(self.visible('History')))
+        return ReplicaPinningMiddleware(view)
+
+    def test_writer_reads_own_writes_until_pin_expires(self):
+        middleware, factory = self._middleware(), RequestFactory()
+        response = middleware(factory.post('/', {'name': 'History'}))
+        self.assertEqual(response.content, b'True')
+        cookie = response.cookies['db_primary']
+        self.assertEqual(cookie['max-age'], 15)
+
+        self.assertEqual(middleware(factory.get('/')).content, b'False')
+        pinned = factory.get('/')
+        pinned.COOKIES['db_primary'] = cookie.value
+        self.assertEqual(middleware(pinned).content, b'True')
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 16):
+            self.assertEqual(middleware(pinned).content, b'False')
+
+    def test_reads_do_not_pin(self):
+        response = self._middleware()(RequestFactory().get('/'))
+        self.assertNotIn('db_primary', response.cookies)
+
+    def test_without_replicas_routing_is_left_to_django(self):
+        with override_settings(DATABASE_REPLICAS={}):
+            self.assertIsNone(routers.PrimaryReplicaRouter().db_for_read(Category))
+            self.assertIsNone(routers.PrimaryReplicaRouter().db_for_write(Category))
+            with self.assertRaises(MiddlewareNotUsed):
+                ReplicaPinningMiddleware(lambda request: HttpResponse())
@@ -0,0 +1,247 @@
+import hashlib
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import User, Course, Enrollment, UploadSession
+
+DEFAULTS = {
+    'CHUNK_SIZE': 5 * 1024 * 1024,
+    'TEMP_DIR': 'uploads/tmp',
+    'EXPIRE_AFTER': 24 * 60 * 60,
+    'LIMITS': {},
+}
+READ_SIZE = 64 * 1024
+HASHER_CACHE_SIZE = 64
+
+# session id -> (offset, running sha256); rebuilt from the temp file on a miss.
+_hashers = OrderedDict()
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def config(key):
+    return getattr(settings, 'CHUNKED_UPLOADS', {}).get(key, DEFAULTS[key])
+
+
+def check_file(purpose, filename, size):
+    """Apply the configured size and extension limits for `purpose`."""
+    limits = config('LIMITS').get(purpose, {})
+    max_size = limits.get('MAX_SIZE')
+    if max_size is not None and size > max_size:
+        raise UploadError(f"'{filename}' is larger than the {max_size // (1024 * 1024)} MB limit.", status=413)
+    extensions = limits.get('EXTENSIONS')
+    if extensions and os.path.splitext(filename)[1].lower() not in extensions:
+        raise UploadError(f"'{filename}' is not an allowed file type ({', '.join(extensions)}).", status=415)
+
+
+def _check_target(user, purpose, target_id):
+    if purpose == UploadSession.Purpose.SUBMISSION:
+        allowed = user.role == User.Role.STUDENT and Enrollment.objects.filter(
+            student=user, course__assignments__id=target_id
+        ).exists()
+    else:
+        allowed = user.role == User.Role.INSTRUCTOR and Course.objects.filter(id=target_id, instructor=user).exists()
+    if not allowed:
+        raise UploadError("You cannot upload files here.", status=403)
+
+
+def parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise UploadError(f"'{name}' must be a number.")
+
+
+def temp_path(session):
+    return Path(settings.MEDIA_ROOT) / config('TEMP_DIR') / f'{session.id}.part'
+
+
+def start(user, purpose, target_id, filename, size, content_type=''):
+    if purpose not in UploadSession.Purpose.values:
+        raise UploadError("Unknown upload purpose.")
+    filename = os.path.basename(filename or '').strip()
+    if not filename or size is None or size < 0:
+        raise UploadError("A file name and size are required.")
+    _check_target(user, purpose, target_id)
+    check_file(purpose, filename, size)
+    session = UploadSession.objects.create(
+        owner=user, purpose=purpose, target_id=target_id,
+        filename=filename[:255], content_type=(content_type or '')[:100], size=size,
+    )
+    path = temp_path(session)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return session
+
+
+def get_session(user, session_id):
+    session = UploadSession.objects.filter(id=session_id, owner=user).first()
+    if session is None:
+        raise UploadError("Upload not found.", status=404)
+    return session
+
+
+def _hasher(session):
+    cached = _hashers.pop(session.id, None)
+    if cached and cached[0] == session.offset:
+        hasher = cached[1]
+    else:
+        hasher = hashlib.sha256()
+        with open(temp_path(session), 'rb') as part:
+            remaining = session.offset
+            while remaining:
+                data = part.read(min(READ_SIZE, remaining))
+                if not data:
+                    # The offset counts bytes the temp file no longer holds;
+                    # a digest of what is left would be wrong.
+                    raise UploadError("The received bytes were lost; start the upload again.", status=410)
+                hasher.update(data)
+                remaining -= len(data)
+    return hasher
+
+
+def _remember(session, hasher):
+    _hashers[session.id] = (session.offset, hasher)
+    while len(_hashers) > HASHER_CACHE_SIZE:
+        _hashers.popitem(last=False)
+
+
+def _staging_path(session):
+    return temp_path(session).with_name(f'{session.id}.{uuid.uuid4().hex}.chunk')
+
+
+def write_chunk(user, session_id, offset, stream, length):
+    """
+    Append one chunk at `offset`, streaming it from `stream` into the temp file
+    and the running SHA-256. A chunk whose offset does not match the bytes
+    already received is refused with 409 so the client can resume from the
+    offset reported by the server.
+
+    No transaction is held while the body is read from the network: the
+    chunk is staged in a file of its own first. Then, in one transaction,
+    the session row is locked if it is still at `offset`, the staged bytes
+    are appended to the temp file and only then is the offset moved, so it
+    never counts bytes that are not in place. Of two requests for the same
+    offset, the one that finds the offset moved gets 409 and its bytes are
+    dropped, so only the winner ever writes to the temp file.
+    """
+    chunk_size = config('CHUNK_SIZE')
+    if length is None or length <= 0:
+        raise UploadError("Empty chunk.")
+    if length > chunk_size:
+        raise UploadError(f"Chunks may be at most {chunk_size} bytes.", status=413)
+    session = get_session(user, session_id)
+    if session.is_complete:
+        raise UploadError("This upload is already complete.", status=409)
+    if offset != session.offset:
+        raise UploadError(f"Expected offset {session.offset}.", status=409)
+    if offset + length > session.size:
+        raise UploadError("Chunk runs past the declared file size.", status=413)
+    hasher = _hasher(session).copy()
+    staging = _staging_path(session)
+    received = 0
+    try:
+        with open(staging, 'wb') as chunk:
+            while received < length:
+                data = stream.read(min(READ_SIZE, length - received))
+                if not data:
+                    break
+                chunk.write(data)
+                hasher.update(data)
+                received += len(data)
+        if received != length:
+            raise UploadError("Chunk was cut short; resume from the last offset.")
+        pending = UploadSession.objects.filter(
+            id=session.id, owner=user, status=UploadSession.Status.ACTIVE, offset=offset,
+        )
+        with transaction.atomic():
+            # Touching the row locks it until the transaction ends (select_for_update
+            # is a no-op on SQLite), so a concurrent request for this offset waits
+            # here and then finds the offset moved.
+            if not pending.update(updated_at=timezone.now()):
+                raise UploadError("Another request already wrote this chunk; resume from the current offset.", status=409)
+            with open(staging, 'rb') as chunk, open(temp_path(session), 'r+b') as part:
+                part.seek(offset)
+                part.truncate()
+                shutil.copyfileobj(chunk, part, READ_SIZE)
+            pending.update(offset=offset + received)
+    finally:
+        staging.unlink(missing_ok=True)
+    session.offset = offset + received
+    _remember(session, hasher)
+    return session
+
+
+def finish(user, session_id, checksum=''):
+    """Verify the received bytes and mark the upload ready to be attached."""
+    session = get_session(user, session_id)
+    if session.is_complete:
+        return session
+    if session.offset != session.size:
+        raise UploadError(f"Only {session.offset} of {session.size} bytes have been received.", status=409)
+    digest = _hasher(session).hexdigest()
+    _hashers.pop(session.id, None)
+    if checksum and checksum.lower() != digest:
+        raise UploadError("Checksum mismatch; the upload is corrupt.", status=422)
+    UploadSession.objects.filter(id=session.id, owner=user, status=UploadSession.Status.ACTIVE, offset=session.size).update(
+        sha256=digest, status=UploadSession.Status.COMPLETE, updated_at=timezone.now(),
+    )
+    return get_session(user, session_id)
+
+
+def claim(user, session_id, purpose, target_id):
+    """A completed upload of `user` for the given purpose and target, or None."""
+    return UploadSession.objects.filter(
+        id=session_id, owner=user, purpose=purpose, target_id=target_id, status=UploadSession.Status.COMPLETE,
+    ).first()
+
+
+class _StagedFile(File):
+    # FileSystemStorage moves files that expose a temporary path instead of copying them.
+    def temporary_file_path(self):
+        return self.name
+
+
+def store(session, model, field_name):
+    """
+    Move a completed upload into the storage location of `model.field_name`
+    and drop the session. Returns the stored name, ready to assign to the field.
+    """
+    field = model._meta.get_field(field_name)
+    path = temp_path(session)
+    with open(path, 'rb') as handle:
+        staged = _StagedFile(handle, name=str(path))
+        staged.sha256 = session.sha256
+        name = field.storage.save(field.generate_filename(None, session.filename), staged, max_length=field.max_length)
+    # Content that was already stored is not moved; the duplicate copy goes.
+    path.unlink(missing_ok=True)
+    session.delete()
+    return name
+
+
+def discard(session):
+    _hashers.pop(session.id, None)
+    temp_path(session).unlink(missing_ok=True)
+    session.delete()
+
+
+def purge_expired(now=None):
+    """Delete uploads untouched for longer than EXPIRE_AFTER together with their temp files."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=config('EXPIRE_AFTER'))
+    expired = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+    for session in expired:
+        discard(session)
+    return len(expired)
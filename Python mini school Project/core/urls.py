@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
@@ -7,11 +8,21 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('logged-out/', views.logout_confirmation_view, name='logged_out_confirm'),
     path('dashboard/', views.dashboard_redirect, name='dashboard'),
+    path('export/<str:dataset>/', views.export_data, name='export_data'),
+    path('search/', views.search_typeahead, name='search_typeahead'),
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:name>", views.serve_media, name='serve_media'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.upload_complete, name='upload_complete'),
     path('employee/dashboard/', views.employee_dashboard, name='employee_dashboard'),
     path('instructor/dashboard/', views.instructor_dashboard, name='instructor_dashboard'),
     path('student/dashboard/', views.student_dashboard, name='student_dashboard'),
+    path('employee/dashboard/async/', views.employee_dashboard_async, name='employee_dashboard_async'),
+    path('instructor/dashboard/async/', views.instructor_dashboard_async, name='instructor_dashboard_async'),
+    path('student/dashboard/async/', views.student_dashboard_async, name='student_dashboard_async'),
 
     path('employee/create_user/<str:role>/', views.create_user, name='create_user'),
+    path('employee/users/student/import/', views.import_students, name='import_students'),
     path('employee/users/<str:role>/', views.user_list, name='user_list'),
     path('employee/user/<int:user_id>/edit/', views.edit_user, name='edit_user'),
     path('employee/user/<int:user_id>/remove/', views.remove_user, name='remove_user'),
@@ -31,8 +42,14 @@ urlpatterns = [
     path('instructor/course/<int:course_id>/create_lesson/', views.create_lesson, name='create_lesson'),
     path('instructor/course/<int:course_id>/create-assignment/', views.create_assignment_or_exam, {'assignment_type': 'assignment'}, name='create_assignment'),
     path('instructor/course/<int:course_id>/create-exam/', views.create_assignment_or_exam, {'assignment_type': 'exam'}, name='create_exam'),
+    path('instructor/schedule/<int:schedule_id>/attendance/<str:date_str>/', views.take_attendance, name='take_attendance'),
+    path('instructor/course/<int:course_id>/attendance/week/<str:date_str>/', views.take_week_attendance, name='take_week_attendance'),
     path('instructor/assignment/<int:assignment_id>/submissions/', views.view_submissions, name='view_submissions'),
     path('instructor/submission/<int:submission_id>/grade/', views.grade_submission, name='grade_submission'),
+    path('instructor/course/<int:course_id>/gradebook/', views.instructor_gradebook, name='instructor_gradebook'),
+    path('instructor/assignment/<int:assignment_id>/grades/', views.grade_submissions, name='grade_submissions'),
+    path('instructor/course/<int:course_id>/analytics.json', views.course_analytics_json, name='course_analytics_json'),
+    path('instructor/assignment/<int:assignment_id>/analytics.json', views.assignment_analytics_json, name='assignment_analytics_json'),
 
     path('student/courses/', views.student_course_list, name='student_course_list'),
     path('student/course/<int:course_id>/enroll/', views.enroll_course, name='enroll_course'),
@@ -1,42 +1,152 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Avg
-from datetime import date
+from django.db import transaction
+from datetime import date, timedelta
 from .decorators import employee_required, instructor_required, student_required
-from .models import (User, Course, Lesson, Assignment, Submission, Category, Enrollment, Review, Schedule, Attendance)
-from .forms import (StudentCreationForm, UserCreationForm, UserEditForm, CourseForm, LessonForm, AssignmentForm,SubmissionForm, GradeForm, CategoryForm, ReviewForm, EnrollmentForm, ScheduleForm)
+from .models import (User, Course, Lesson, Assignment, Submission, Category, Enrollment, Review, Schedule, UploadSession, SearchEntry)
+from .pagination import paginate
+from . import analytics, attendance, dashboards, exports, gradebook, grades, importers, jobs, media, roster, search, uploads
+from .forms import (StudentCreationForm, StudentImportForm, UserCreationForm, UserEditForm, CourseForm, LessonForm, AssignmentForm,SubmissionForm, GradeForm, GradeFormSet, GradeImportForm, GradeWeightsForm, CategoryForm, ReviewForm, EnrollmentForm, ScheduleForm)
+
+# Rows per page of the batch grading view; each row posts five fields.
+GRADING_PAGE_SIZE = 100
 
 @login_required
 def dashboard_redirect(request):
+    suffix = '_async' if getattr(settings, 'ASYNC_DASHBOARDS', False) else ''
     if request.user.role == 'EMPLOYEE':
-        return redirect('employee_dashboard')
+        return redirect('employee_dashboard' + suffix)
     elif request.user.role == 'INSTRUCTOR':
-        return redirect('instructor_dashboard')
+        return redirect('instructor_dashboard' + suffix)
     elif request.user.role == 'STUDENT':
-        return redirect('student_dashboard')
+        return redirect('student_dashboard' + suffix)
     else:
         return redirect('admin:index')
 
 def logout_confirmation_view(request):
     return render(request, 'registration/logged_out.html')
 
+def _upload_state(session, status=200):
+    return JsonResponse({
+        'id': str(session.id),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.offset,
+        'complete': session.is_complete,
+        'sha256': session.sha256,
+        'chunk_size': uploads.config('CHUNK_SIZE'),
+    }, status=status)
+
+def _upload_error(error):
+    return JsonResponse({'error': str(error)}, status=error.status)
+
+@login_required
+@require_POST
+def upload_start(request):
+    try:
+        session = uploads.start(
+            request.user,
+            request.POST.get('purpose'),
+            uploads.parse_int(request.POST.get('target'), 'target'),
+            request.POST.get('filename'),
+            uploads.parse_int(request.POST.get('size'), 'size'),
+            request.POST.get('content_type', ''),
+        )
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return _upload_state(session, status=201)
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def upload_chunk(request, upload_id):
+    """GET reports the received offset so a client can resume; PUT appends the body at Upload-Offset."""
+    try:
+        if request.method == 'GET':
+            session = uploads.get_session(request.user, upload_id)
+        else:
+            session = uploads.write_chunk(
+                request.user,
+                upload_id,
+                uploads.parse_int(request.headers.get('Upload-Offset'), 'Upload-Offset'),
+                request,
+                uploads.parse_int(request.headers.get('Content-Length') or 0, 'Content-Length'),
+            )
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return _upload_state(session)
+
+@login_required
+@require_POST
+def upload_complete(request, upload_id):
+    try:
+        session = uploads.finish(request.user, upload_id, request.POST.get('sha256', ''))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return _upload_state(session)
+
+@login_required
+@require_GET
+def search_typeahead(request):
+    kinds = [kind for kind in request.GET.getlist('kind') if kind in SearchEntry.Kind.values]
+    entries = search.search(request.user, request.GET.get('q', ''), kinds=kinds or None)
+    return JsonResponse({'results': [
+        {
+            'kind': entry.kind,
+            'label': entry.get_kind_display(),
+            'title': entry.title,
+            'url': search.url_for(request.user, entry),
+        }
+        for entry in entries
+    ]})
+
+@login_required
+@require_GET
+def serve_media(request, name):
+    return media.serve(request, name)
+
+@login_required
+def export_data(request, dataset):
+    spec = exports.DATASETS.get(dataset)
+    if spec is None:
+        raise Http404("Unknown export.")
+    if request.user.role not in spec.roles:
+        raise PermissionDenied
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'xlsx'):
+        return HttpResponseBadRequest("Format must be 'csv' or 'xlsx'.")
+    try:
+        columns = spec.select_columns([key for key in request.GET.get('columns', '').split(',') if key])
+        rows = spec.rows(request.user, request.GET)
+    except exports.ExportError as e:
+        return HttpResponseBadRequest(str(e))
+    if export_format == 'xlsx':
+        stream = exports.stream_xlsx(columns, rows)
+        content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        stream = exports.stream_csv(columns, rows)
+        content_type = 'text/csv'
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{dataset}-{date.today().isoformat()}.{export_format}"'
+    return response
+
 @employee_required
 def employee_dashboard(request):
-    student_count = User.objects.filter(role='STUDENT').count()
-    instructor_count = User.objects.filter(role='INSTRUCTOR').count()
-    course_count = Course.objects.count()
-    enrollment_count = Enrollment.objects.count()
-    recent_students = User.objects.filter(role='STUDENT').order_by('-date_joined')[:5]
-    context = {
-        'student_count': student_count,
-        'instructor_count': instructor_count,
-        'course_count': course_count,
-        'enrollment_count': enrollment_count,
-        'recent_students': recent_students,
-    }
+    context = dashboards.employee_snapshot()
     return render(request, 'employee/dashboard.html', context)
 
+@employee_required
+async def employee_dashboard_async(request):
+    context = await dashboards.employee_snapshot_async()
+    return await sync_to_async(render)(request, 'employee/dashboard.html', context)
+
 @employee_required
 def create_user(request, role):
     if role.upper() == 'STUDENT':
@@ -62,10 +172,38 @@ def create_user(request, role):
     }
     return render(request, 'employee/create_user.html', context)
 
+@employee_required
+def import_students(request):
+    result = None
+    if request.method == 'POST':
+        form = StudentImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = importers.import_students(upload, upload.name, dry_run=form.cleaned_data['dry_run'])
+            except importers.ImportFileError as e:
+                form.add_error('file', str(e))
+            else:
+                if result.dry_run:
+                    messages.info(request, f"Dry run: {result.created} student(s) would be created.")
+                elif result.created:
+                    messages.success(request, f"{result.created} student(s) were imported successfully.")
+    else:
+        form = StudentImportForm()
+    context = {
+        'form': form,
+        'result': result,
+    }
+    return render(request, 'employee/import_students.html', context)
+
 @employee_required
 def user_list(request, role):
-    users = User.objects.filter(role=role.upper())
-    return render(request, 'employee/user_list.html', {'users': users, 'role': role})
+    users = User.objects.filter(role=role.upper(), is_active=True)
+    query = request.GET.get('q', '').strip()
+    if query:
+        users = users.filter(id__in=search.matching_ids(request.user, SearchEntry.Kind.USER, query))
+    users = paginate(request, users, ('username',))
+    return render(request, 'employee/user_list.html', {'users': users, 'role': role, 'query': query})
 
 @employee_required
 def edit_user(request, user_id):
@@ -89,9 +227,13 @@ def remove_user(request, user_id):
     user_to_remove = get_object_or_404(User, id=user_id)
     user_role = user_to_remove.role.lower()
     if request.method == 'POST':
-        username = user_to_remove.username
-        user_to_remove.delete()
-        messages.success(request, f"Successfully removed user: {username}")
+        # Deactivating signs the user out and hides them at once; the
+        # cascading deletes run in a background job (see core/tasks.py).
+        with transaction.atomic():
+            user_to_remove.is_active = False
+            user_to_remove.save(update_fields=['is_active'])
+            jobs.enqueue('delete_user', {'user_id': user_to_remove.id}, key=f'delete_user:{user_to_remove.id}')
+        messages.success(request, f"Successfully removed user: {user_to_remove.username}")
         return redirect('user_list', role=user_role)
     context = {'user_to_remove': user_to_remove}
     return render(request, 'employee/remove_user_confirm.html', context)
@@ -118,7 +260,7 @@ def course_list_create(request):
             return redirect('course_list_create')
     else:
         form = CourseForm()
-    courses = Course.objects.all().select_related('category', 'instructor').order_by('title')
+    courses = paginate(request, Course.objects.select_related('category', 'instructor', 'stats'), ('title', 'id'))
     context = {'form': form, 'courses': courses}
     return render(request, 'employee/course_management.html', context)
 @employee_required
@@ -161,7 +303,7 @@ def remove_category(request, category_id):
 
 @employee_required
 def view_reviews(request):
-    all_reviews = Review.objects.select_related('student', 'course', 'course__instructor').order_by('-created_at')
+    all_reviews = paginate(request, Review.objects.select_related('student', 'course', 'course__instructor'), ('-created_at', '-id'))
     context = {'reviews': all_reviews}
     return render(request, 'employee/view_reviews.html', context)
 
@@ -171,14 +313,16 @@ def manage_enrollments(request):
         form = EnrollmentForm(request.POST)
         if form.is_valid():
             try:
-                form.save()
+                # The enrollment and its course counter commit together (see core/stats.py).
+                with transaction.atomic():
+                    form.save()
                 messages.success(request, "Enrollment created successfully!")
             except Exception:
                 messages.error(request, "Could not create enrollment. The student may already be enrolled.")
             return redirect('manage_enrollments')
     else:
         form = EnrollmentForm()
-    all_enrollments = Enrollment.objects.select_related('student', 'course', 'course__instructor').order_by('-enrolled_on')
+    all_enrollments = paginate(request, Enrollment.objects.filter(student__is_active=True).select_related('student', 'course', 'course__instructor'), ('-enrolled_on', '-id'))
     context = {'form': form, 'enrollments': all_enrollments}
     return render(request, 'employee/manage_enrollments.html', context)
 
@@ -203,7 +347,7 @@ def manage_schedules(request):
             return redirect('manage_schedules')
     else:
         form = ScheduleForm()
-    schedules = Schedule.objects.select_related('course').order_by('course__title', 'day_of_week')
+    schedules = paginate(request, Schedule.objects.select_related('course'), ('course_id', 'day_number', 'start_time'))
     context = {
         'form': form,
         'schedules': schedules,
@@ -220,28 +364,15 @@ def remove_schedule(request, schedule_id):
 
 @instructor_required
 def instructor_dashboard(request):
-    courses = Course.objects.filter(instructor=request.user).annotate(
-        student_count=Count('enrollment', distinct=True),
-    ).order_by('-created_at')
-    
-    submissions_to_grade = Submission.objects.filter(
-        assignment__course__instructor=request.user, 
-        grade__isnull=True
-    ).select_related('student', 'assignment', 'assignment__course').order_by('submitted_at')
-
-    day_order = {'MON': 1, 'TUE': 2, 'WED': 3, 'THU': 4, 'FRI': 5, 'SAT': 6, 'SUN': 7}
-    instructor_schedules = Schedule.objects.filter(
-        course__instructor=request.user
-    ).select_related('course').order_by('start_time')
-    sorted_schedules = sorted(instructor_schedules, key=lambda s: day_order.get(s.day_of_week, 8))
-    context = {
-        'courses': courses,
-        'submissions_to_grade': submissions_to_grade,
-        'schedules': sorted_schedules,
-        'today': date.today(),
-    }
+    context = dashboards.instructor_context(dashboards.run(dashboards.instructor_queries(request.user)))
     return render(request, 'instructor/dashboard.html', context)
 
+@instructor_required
+async def instructor_dashboard_async(request):
+    user = await request.auser()
+    context = dashboards.instructor_context(await dashboards.gather(dashboards.instructor_queries(user)))
+    return await sync_to_async(render)(request, 'instructor/dashboard.html', context)
+
 @instructor_required
 def instructor_create_course(request):
     if request.method == 'POST':
@@ -261,14 +392,82 @@ def instructor_course_detail(request, course_id):
     course = get_object_or_404(Course, id=course_id, instructor=request.user)
     lessons = course.lessons.all().order_by('order')
     assignments = course.assignments.all()
-    context = {'course': course, 'lessons': lessons, 'assignments': assignments}
+    try:
+        course_analytics = analytics.for_course(assignments)
+    except analytics.AnalyticsError as e:
+        messages.error(request, str(e))
+        course_analytics = None
+    per_assignment = course_analytics['assignments'] if course_analytics else {}
+    context = {
+        'course': course, 'lessons': lessons, 'analytics': course_analytics,
+        'assignments': [(assignment, per_assignment.get(assignment.id)) for assignment in assignments],
+    }
     return render(request, 'instructor/course_detail.html', context)
 
+@instructor_required
+@require_GET
+def course_analytics_json(request, course_id):
+    course = get_object_or_404(Course, id=course_id, instructor=request.user)
+    assignments = list(course.assignments.order_by('due_date', 'id'))
+    try:
+        result = analytics.for_course(assignments)
+    except analytics.AnalyticsError as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    result['assignments'] = [
+        {'id': assignment.id, 'title': assignment.title, 'due_date': assignment.due_date, **result['assignments'][assignment.id]}
+        for assignment in assignments
+    ]
+    return JsonResponse(result)
+
+@instructor_required
+@require_GET
+def assignment_analytics_json(request, assignment_id):
+    assignment = get_object_or_404(Assignment, id=assignment_id, course__instructor=request.user)
+    try:
+        result = analytics.for_assignments([assignment])[assignment.id]
+    except analytics.AnalyticsError as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    return JsonResponse({'id': assignment.id, 'title': assignment.title, 'due_date': assignment.due_date, **result})
+
+@instructor_required
+def instructor_gradebook(request, course_id):
+    course = get_object_or_404(Course, id=course_id, instructor=request.user)
+    if request.method == 'POST':
+        weights_form = GradeWeightsForm(course, request.POST)
+        if weights_form.is_valid():
+            weights_form.save()
+            messages.success(request, "Grade weights were updated.")
+            return redirect('instructor_gradebook', course_id=course.id)
+    else:
+        weights_form = GradeWeightsForm(course)
+    sort = 'total' if request.GET.get('sort') == 'total' else 'name'
+    context = {'course': course, 'weights_form': weights_form, 'sort': sort, 'book': None}
+    try:
+        book = gradebook.course_gradebook(course)
+    except gradebook.GradebookError as e:
+        messages.error(request, str(e))
+    else:
+        page = Paginator(book.order(sort), 50).get_page(request.GET.get('page'))
+        context.update(
+            book=book, page=page, rows=list(book.rows(page.object_list)),
+            columns=list(zip(book.assignments, book.assignment_stats)),
+            category_columns=list(zip(book.categories, book.category_stats)),
+            width=len(book.assignments) + len(book.categories) + 3,
+        )
+    return render(request, 'instructor/gradebook.html', context)
+
 @instructor_required
 def view_student_roster(request, course_id):
     course = get_object_or_404(Course, id=course_id, instructor=request.user)
-    enrollments = Enrollment.objects.filter(course=course).select_related('student').order_by('student__last_name')
-    context = {'course': course, 'enrollments': enrollments}
+    sort = request.GET.get('sort', 'name')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort not in roster.SORTS:
+        sort, descending = 'name', False
+    enrollments = list(roster.course_roster(course, sort, descending))
+    # Each column header links to sorting by it, flipping the direction of the current one.
+    sort_links = {column: ('' if column != sort or descending else '-') + column for column in roster.SORTS}
+    context = {'course': course, 'enrollments': enrollments, 'sort': sort, 'descending': descending, 'sort_links': sort_links}
     return render(request, 'instructor/student_roster.html', context)
 
 @instructor_required
@@ -279,9 +478,22 @@ def create_lesson(request, course_id):
         if form.is_valid():
             lesson = form.save(commit=False)
             lesson.course = course
-            lesson.save()
-            messages.success(request, f"Lesson '{lesson.title}' was created successfully.")
-            return redirect('instructor_course_detail', course_id=course.id)
+            sessions = {}
+            for field_name, purpose in LessonForm.UPLOAD_PURPOSES.items():
+                upload_id = form.cleaned_data[f'{field_name}_upload']
+                if upload_id:
+                    sessions[field_name] = uploads.claim(request.user, upload_id, purpose, course.id)
+                    if sessions[field_name] is None:
+                        form.add_error(field_name, "The uploaded file has expired; please upload it again.")
+            if form.is_valid():
+                # One transaction for the files, the row and its course counter
+                # (see core/storage.py and core/stats.py).
+                with transaction.atomic():
+                    for field_name, session in sessions.items():
+                        setattr(lesson, field_name, uploads.store(session, Lesson, field_name))
+                    lesson.save()
+                messages.success(request, f"Lesson '{lesson.title}' was created successfully.")
+                return redirect('instructor_course_detail', course_id=course.id)
     else:
         form = LessonForm()
     context = {
@@ -300,7 +512,8 @@ def create_assignment_or_exam(request, course_id, assignment_type):
             instance = form.save(commit=False)
             instance.course = course
             instance.assignment_type = assignment_type.upper()
-            instance.save()
+            with transaction.atomic():
+                instance.save()
             messages.success(request, f"{type_display} '{instance.title}' was created successfully.")
             return redirect('instructor_course_detail', course_id=course.id)
     else:
@@ -310,33 +523,18 @@ def create_assignment_or_exam(request, course_id, assignment_type):
 
 @instructor_required
 def take_attendance(request, schedule_id, date_str):
-    schedule = get_object_or_404(Schedule, id=schedule_id, course__instructor=request.user)
+    schedule = get_object_or_404(Schedule.objects.select_related('course'), id=schedule_id, course__instructor=request.user)
     try:
         attendance_date = date.fromisoformat(date_str)
     except (ValueError, TypeError):
         messages.error(request, "Invalid date format provided.")
         return redirect('instructor_dashboard')
-    enrolled_students = User.objects.filter(enrollment__course=schedule.course)
     if request.method == 'POST':
-        present_student_ids = request.POST.getlist('present_students')
-        
-        for student in enrolled_students:
-            Attendance.objects.update_or_create(
-                schedule=schedule, 
-                student=student, 
-                date=attendance_date,
-                defaults={'is_present': (str(student.id) in present_student_ids)}
-            )
-        
+        present_student_ids = {int(pk) for pk in request.POST.getlist('present_students') if pk.isdigit()}
+        attendance.save_sheet(schedule, attendance_date, present_student_ids)
         messages.success(request, f"Attendance for {attendance_date.strftime('%B %d, %Y')} has been saved.")
         return redirect('instructor_dashboard')
-    attendance_list = []
-    for student in enrolled_students:
-        record, created = Attendance.objects.get_or_create(
-            schedule=schedule, student=student, date=attendance_date,
-            defaults={'is_present': False}
-        )
-        attendance_list.append(record)
+    attendance_list = attendance.build_sheet(schedule, attendance_date)
 
     context = {
         'schedule': schedule,
@@ -345,6 +543,32 @@ def take_attendance(request, schedule_id, date_str):
     }
     return render(request, 'instructor/take_attendance.html', context)
 
+@instructor_required
+def take_week_attendance(request, course_id, date_str):
+    course = get_object_or_404(Course, id=course_id, instructor=request.user)
+    try:
+        monday = attendance.week_start(date.fromisoformat(date_str))
+    except (ValueError, TypeError):
+        messages.error(request, "Invalid date format provided.")
+        return redirect('instructor_dashboard')
+    sessions = attendance.week_sessions(course, monday)
+    students = list(attendance.enrolled_students(course))
+    if request.method == 'POST':
+        student_ids = [student.id for student in students]
+        present = attendance.parse_week_marks(request.POST.getlist('present'), sessions, student_ids)
+        attendance.save_sessions(sessions, student_ids, present)
+        messages.success(request, f"Attendance for the week of {monday.strftime('%B %d, %Y')} has been saved.")
+        return redirect('take_week_attendance', course_id=course.id, date_str=monday.isoformat())
+    context = {
+        'course': course,
+        'week_start': monday,
+        'previous_week': monday - timedelta(weeks=1),
+        'next_week': monday + timedelta(weeks=1),
+        'sessions': sessions,
+        'rows': attendance.build_week(sessions, students),
+    }
+    return render(request, 'instructor/week_attendance.html', context)
+
 @instructor_required
 def view_submissions(request, assignment_id):
     assignment = get_object_or_404(Assignment, id=assignment_id, course__instructor=request.user)
@@ -354,43 +578,84 @@ def view_submissions(request, assignment_id):
 
 @instructor_required
 def grade_submission(request, submission_id):
-    submission = get_object_or_404(Submission, id=submission_id, assignment__course__instructor=request.user)
+    submission = get_object_or_404(Submission.objects.select_related('assignment'), id=submission_id, assignment__course__instructor=request.user)
     if request.method == 'POST':
         form = GradeForm(request.POST, instance=submission)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                # Read the stored grade under the row lock, so that two instructors grading at
+                # once each fold their change in against the grade the other one left.
+                previous_grade = Submission.objects.select_for_update().values_list('grade', flat=True).get(id=submission.id)
+                form.save()
+                grades.record_grade_changes([(submission, previous_grade)])
             return redirect('view_submissions', assignment_id=submission.assignment.id)
     else:
         form = GradeForm(instance=submission)
     context = {'form': form, 'submission': submission}
     return render(request, 'instructor/grade_submission.html', context)
 
+@instructor_required
+def grade_submissions(request, assignment_id):
+    assignment = get_object_or_404(Assignment.objects.select_related('course'), id=assignment_id, course__instructor=request.user)
+    submissions = assignment.submissions.select_related('student').order_by('student__username', 'id')
+    # Paged so that a page's rows stay well under DATA_UPLOAD_MAX_NUMBER_FIELDS.
+    page = Paginator(submissions, GRADING_PAGE_SIZE).get_page(request.GET.get('page'))
+    formset, import_form, result = GradeFormSet(queryset=page.object_list), GradeImportForm(), None
+    if request.method == 'POST' and 'import' in request.POST:
+        import_form = GradeImportForm(request.POST, request.FILES)
+        if import_form.is_valid():
+            upload = import_form.cleaned_data['file']
+            try:
+                result = importers.import_grades(upload, upload.name, assignment, dry_run=import_form.cleaned_data['dry_run'])
+            except importers.ImportFileError as e:
+                import_form.add_error('file', str(e))
+            else:
+                if result.dry_run:
+                    messages.info(request, f"Dry run: {result.updated} grade(s) would be updated.")
+                elif result.updated:
+                    messages.success(request, f"{result.updated} grade(s) were imported successfully.")
+    elif request.method == 'POST':
+        with transaction.atomic():
+            # Rows are looked up by the posted ids, so they are found even if
+            # submissions came in and moved the page boundaries meanwhile.
+            # They stay locked until the edits are saved.
+            formset = GradeFormSet(request.POST, queryset=submissions.select_for_update(of=('self',)))
+            if formset.is_valid():
+                edited = [form for form in formset.forms if form.edited]
+                conflicts = [form.instance.student for form in edited if form.stale]
+                changes = [(form.instance, form.stored[0]) for form in edited if not form.stale]
+                if changes:
+                    grades.save_grades(changes)
+        if formset.is_valid():
+            messages.success(request, f"Saved {len(changes)} grade(s).")
+            if conflicts:
+                names = ', '.join(student.get_full_name() or student.username for student in conflicts)
+                messages.warning(request, f"Not saved, as they were changed elsewhere after you opened this page: {names}. Their current grades are shown below.")
+            url = reverse('grade_submissions', args=[assignment.id])
+            return redirect(f'{url}?page={page.number}' if page.number > 1 else url)
+    context = {'assignment': assignment, 'formset': formset, 'import_form': import_form, 'result': result, 'page': page}
+    return render(request, 'instructor/grade_submissions.html', context)
+
 @student_required
 def student_dashboard(request):
-    enrollments = Enrollment.objects.filter(student=request.user).select_related('course', 'course__instructor')
-    graded_submissions = Submission.objects.filter(student=request.user, grade__isnull=False)
-    grade_stats = graded_submissions.aggregate(average_grade=Avg('grade'), graded_count=Count('id'))
-    recent_grades = graded_submissions.order_by('-assignment__due_date')[:3]
-    enrolled_course_ids = enrollments.values_list('course_id', flat=True)
-    day_order = {'MON': 1, 'TUE': 2, 'WED': 3, 'THU': 4, 'FRI': 5, 'SAT': 6, 'SUN': 7}
-    student_schedules = Schedule.objects.filter(
-        course_id__in=enrolled_course_ids
-    ).select_related('course').order_by('start_time')
-    sorted_schedules = sorted(student_schedules, key=lambda s: day_order.get(s.day_of_week, 8))
-    context = {
-        'enrollments': enrollments,
-        'average_grade': grade_stats.get('average_grade'),
-        'graded_count': grade_stats.get('graded_count'),
-        'recent_grades': recent_grades,
-        'schedules': sorted_schedules,
-    }
+    context = dashboards.student_context(dashboards.run(dashboards.student_queries(request.user)))
     return render(request, 'student/dashboard.html', context)
 
+@student_required
+async def student_dashboard_async(request):
+    user = await request.auser()
+    context = dashboards.student_context(await dashboards.gather(dashboards.student_queries(user)))
+    return await sync_to_async(render)(request, 'student/dashboard.html', context)
+
 @student_required
 def student_course_list(request):
-    all_courses = Course.objects.select_related('category', 'instructor').all()
-    enrolled_course_ids = Enrollment.objects.filter(student=request.user).values_list('course_id', flat=True)
-    context = {'courses': all_courses, 'enrolled_course_ids': enrolled_course_ids}
+    all_courses = Course.objects.select_related('category', 'instructor', 'stats').all()
+    query = request.GET.get('q', '').strip()
+    if query:
+        all_courses = all_courses.filter(id__in=search.matching_ids(request.user, SearchEntry.Kind.COURSE, query))
+    enrolled_course_ids = set(Enrollment.objects.filter(student=request.user).values_list('course_id', flat=True))
+    courses = paginate(request, all_courses, ('title', 'id'))
+    context = {'courses': courses, 'enrolled_course_ids': enrolled_course_ids, 'query': query}
     return render(request, 'student/course_list.html', context)
 
 @student_required
@@ -431,11 +696,23 @@ def submit_assignment(request, assignment_id):
     if request.method == 'POST':
         form = SubmissionForm(request.POST, request.FILES)
         if form.is_valid():
-            submission, created = Submission.objects.update_or_create(
-                assignment=assignment,
-                student=request.user,
-                defaults={'submitted_file': form.cleaned_data['submitted_file']}
-            )
+            submitted_file = form.cleaned_data['submitted_file']
+            upload_id = form.cleaned_data['submitted_file_upload']
+            session = None
+            if upload_id:
+                session = uploads.claim(request.user, upload_id, UploadSession.Purpose.SUBMISSION, assignment.id)
+                if session is None:
+                    form.add_error('submitted_file', "The uploaded file has expired; please upload it again.")
+        if form.is_valid():
+            # One transaction for the file and the row (see core/storage.py).
+            with transaction.atomic():
+                if session is not None:
+                    submitted_file = uploads.store(session, Submission, 'submitted_file')
+                submission, created = Submission.objects.update_or_create(
+                    assignment=assignment,
+                    student=request.user,
+                    defaults={'submitted_file': submitted_file}
+                )
             messages.success(request, "Your submission has been received!")
             return redirect('student_course_detail', course_id=assignment.course.id)
     else:
@@ -445,7 +722,8 @@ def submit_assignment(request, assignment_id):
 @student_required
 def student_my_grades(request):
     submissions = Submission.objects.filter(student=request.user, grade__isnull=False).select_related('assignment', 'assignment__course').order_by('-submitted_at')
-    context = {'submissions': submissions}
+    course_averages = Enrollment.objects.filter(student=request.user, graded_count__gt=0).select_related('course').order_by('course__title')
+    context = {'submissions': submissions, 'course_averages': course_averages}
     return render(request, 'student/my_grades.html', context)
 
 @student_required
@@ -462,7 +740,8 @@ def add_review(request, course_id):
             new_review = form.save(commit=False)
             new_review.student = request.user
             new_review.course = course
-            new_review.save()
+            with transaction.atomic():
+                new_review.save()
             messages.success(request, "Your review has been submitted!")
             return redirect('student_course_detail', course_id=course.id)
     else:
@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestProfilingMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,37 +52,124 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Opt-in per-request profiling: query count, DB/template time and slowest SQL,
+# exposed as a Server-Timing header and appended to a rotating JSON-lines log.
+REQUEST_PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.05,
+    'SLOW_QUERY_COUNT': 5,
+    'LOG_FILE': BASE_DIR / 'logs' / 'request_profile.jsonl',
+    'LOG_MAX_BYTES': 10 * 1024 * 1024,
+    'LOG_BACKUP_COUNT': 5,
+}
+
+# Full-text search (core/search.py). Queries shorter than MIN_LENGTH characters
+# are ignored; LIMIT caps typeahead suggestions, LIST_LIMIT the matches used to
+# narrow the user and course lists. On SQLite, words found in more than
+# FREQUENT_ABOVE entries must match but are not ranked by; refresh their
+# statistics with "manage.py rebuild_search_index --terms-only".
+SEARCH = {
+    'MIN_LENGTH': 2,
+    'LIMIT': 10,
+    'LIST_LIMIT': 1000,
+    'FREQUENT_ABOVE': 20_000,
+    'TERMS_TTL': 5 * 60,
+}
+
+# Employee dashboard headline numbers are cached for TTL seconds and dropped on
+# writes to users, courses and enrollments. Tables whose planner estimate
+# exceeds ESTIMATE_ABOVE rows are reported from statistics, not counted.
+DASHBOARD_SNAPSHOT = {
+    'TTL': 60,
+    'ESTIMATE_ABOVE': 1_000_000,
+}
+
+# When served through lms_project/asgi.py, send users to the async dashboards,
+# which run their independent queries concurrently.
+ASYNC_DASHBOARDS = False
+
 ROOT_URLCONF = 'lms_project.urls'
 
+# Compiled templates are kept in memory by the cached loader; the development
+# server still reloads them when a template file changes.
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.template_fragments',
+            ],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
 ]
 
+# 'template_fragments' holds rendered {% cache %} blocks: the role navbar and
+# review rows, keyed by object and updated_at. Fragments live for
+# TEMPLATE_FRAGMENTS['TTL'] seconds; bump VERSION when a cached block's markup
+# changes (defaults in core/context_processors.py), e.g.
+#     TEMPLATE_FRAGMENTS = {'VERSION': 2}
+# Use a shared cache such as Redis with several worker processes.
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 50_000},
+    },
+}
 WSGI_APPLICATION = 'lms_project.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Write transactions take the lock up front (BEGIN IMMEDIATE) so concurrent
+# writers queue on busy_timeout instead of failing with "database is locked".
+# Connections are kept for CONN_MAX_AGE seconds rather than reopened, and
+# re-tuned, on every request.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Reads go to one of REPLICAS and writes to PRIMARY (core/routers.py); with no
+# replicas everything uses 'default'. After writing, a browser keeps reading
+# from the primary for STICKY_SECONDS so replication lag never hides its own
+# changes (defaults in core/routers.py). A replica is another DATABASES
+# alias, e.g. for PostgreSQL:
+#     'replica': {'ENGINE': 'django.db.backends.postgresql', 'HOST': 'replica-1', ...,
+#                 'TEST': {'MIRROR': 'default'}},
+#     DATABASE_REPLICAS = {'REPLICAS': ['replica']}
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+# Pragmas applied to every SQLite connection by core/sqlite.py, which holds
+# the defaults (WAL, synchronous=NORMAL, a busy timeout and larger caches);
+# None keeps SQLite's own default. The demo database ships in the repository,
+# and WAL is recorded in the file itself, so it stays in rollback-journal
+# mode here; drop this override for a deployed database.
+# "manage.py benchmark_sqlite" compares this setup with SQLite's defaults.
+SQLITE_PRAGMAS = {
+    'JOURNAL_MODE': None,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,6 +210,66 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Uploaded media is stored once per distinct content; see core/storage.py and
+# 'manage.py dedup_media' for converting an existing media/ tree.
+STORAGES = {
+    'default': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Media files go through a permission-checked view (core/media.py). MODE is
+# 'django' to stream from Python with Range support, or 'x-accel-redirect' /
+# 'x-sendfile' to let the front proxy send the bytes. For nginx, map
+# ACCEL_PREFIX to MEDIA_ROOT in an internal location:
+#     location /protected-media/ { internal; alias /path/to/media/; }
+#     MEDIA_SERVING = {'MODE': 'x-accel-redirect'}
+# Defaults are in core/media.py.
+
+# Chunked, resumable uploads. Partial files live under MEDIA_ROOT/TEMP_DIR until
+# they are attached; sessions untouched for EXPIRE_AFTER seconds are purged by
+# 'manage.py purge_uploads'. LIMITS also apply to regular form uploads; the
+# other defaults are in core/uploads.py.
+CHUNKED_UPLOADS = {
+    'LIMITS': {
+        'SUBMISSION': {
+            'MAX_SIZE': 100 * 1024 * 1024,
+            'EXTENSIONS': ['.pdf', '.doc', '.docx', '.odt', '.txt', '.rtf', '.zip', '.png', '.jpg', '.jpeg', '.gif'],
+        },
+        'LESSON_VIDEO': {
+            'MAX_SIZE': 4 * 1024 * 1024 * 1024,
+            'EXTENSIONS': ['.mp4', '.webm', '.mov', '.mkv', '.m4v'],
+        },
+        'LESSON_RESOURCE': {
+            'MAX_SIZE': 200 * 1024 * 1024,
+            'EXTENSIONS': ['.pdf', '.doc', '.docx', '.odt', '.ppt', '.pptx', '.xls', '.xlsx', '.txt', '.zip'],
+        },
+    },
+}
+
+# Sessions are read from the cache and written through to the database, and
+# the logged-in user is cached for AUTH_USER_CACHE['TTL'] seconds (dropped when
+# the user is saved; defaults in core/auth.py), so authenticated requests
+# usually resolve request.user and its role without a query. Use
+# 'django.contrib.sessions.backends.signed_cookies' to keep sessions out of
+# the server entirely. With several worker processes, point CACHES at a
+# shared cache such as Redis so invalidations reach them all.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = ['core.auth.CachedModelBackend']
+
+# Slow work queued by views (deleting a removed user) is stored as core.Job
+# rows and run by 'manage.py runworker' alongside the web server (see
+# READ.md.txt), so no broker is needed. Failed jobs are retried after
+# BACKOFF seconds, doubling up to BACKOFF_MAX, at most MAX_ATTEMPTS times; a
+# job whose worker died is run again once its LEASE expires. Completed jobs
+# are purged after KEEP_FINISHED. Defaults are in core/jobs.py; override
+# any key with JOB_QUEUE = {...}.
+
+# Per-assignment grade analytics (core/analytics.py), kept in the default
+# cache for TTL seconds or until a grade, submission or due date changes.
+# Histograms use BUCKET_WIDTH-point buckets from 0 to 100. Defaults are in
+# core/analytics.py; override them with GRADE_ANALYTICS = {...}.
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 LOGIN_REDIRECT_URL = 'dashboard'
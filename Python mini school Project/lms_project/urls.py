@@ -16,8 +16,6 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
 from core.views import dashboard_redirect
 
 urlpatterns = [
@@ -25,5 +23,4 @@ urlpatterns = [
     path('', include('core.urls')),
     path('dashboard/', dashboard_redirect, name='dashboard'),
 ]
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media is served by core.views.serve_media, which checks course access.
@@ -0,0 +1,160 @@
+/*
+ * Chunked, resumable uploads for file inputs marked with data-upload-purpose
+ * inside a form carrying data-upload-url and data-upload-target.
+ *
+ * The file is sent in CHUNK_SIZE pieces to the upload session endpoint. On a
+ * failed chunk the client asks the server for the offset it has and resumes
+ * from there; the session id is kept in localStorage so a reload can pick up
+ * where the last attempt stopped. When the upload completes, the session id is
+ * written to the hidden "<field>_upload" input and the file input is disabled
+ * so the browser does not post the file a second time.
+ */
+(function () {
+    'use strict';
+
+    const MAX_RETRIES = 5;
+
+    function csrfToken(form) {
+        const input = form.querySelector('input[name=csrfmiddlewaretoken]');
+        return input ? input.value : '';
+    }
+
+    function storageKey(purpose, target, file) {
+        return ['upload', purpose, target, file.name, file.size, file.lastModified].join(':');
+    }
+
+    async function request(url, options) {
+        const response = await fetch(url, Object.assign({credentials: 'same-origin'}, options));
+        const data = await response.json().catch(() => ({}));
+        return {ok: response.ok, status: response.status, data: data};
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function openSession(form, input, file) {
+        const purpose = input.dataset.uploadPurpose;
+        const target = form.dataset.uploadTarget;
+        const key = storageKey(purpose, target, file);
+        const saved = window.localStorage.getItem(key);
+        if (saved) {
+            const status = await request(`${form.dataset.uploadUrl}${saved}/`);
+            if (status.ok) {
+                return {key: key, session: status.data};
+            }
+            window.localStorage.removeItem(key);
+        }
+        const body = new FormData();
+        body.append('purpose', purpose);
+        body.append('target', target);
+        body.append('filename', file.name);
+        body.append('size', file.size);
+        body.append('content_type', file.type);
+        const created = await request(form.dataset.uploadUrl, {
+            method: 'POST', body: body, headers: {'X-CSRFToken': csrfToken(form)},
+        });
+        if (!created.ok) {
+            throw new Error(created.data.error || 'Could not start the upload.');
+        }
+        window.localStorage.setItem(key, created.data.id);
+        return {key: key, session: created.data};
+    }
+
+    async function sendChunks(form, file, session, onProgress) {
+        const url = `${form.dataset.uploadUrl}${session.id}/`;
+        let offset = session.offset;
+        let retries = 0;
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + session.chunk_size);
+            let result;
+            try {
+                result = await request(url, {
+                    method: 'PUT',
+                    body: chunk,
+                    headers: {'X-CSRFToken': csrfToken(form), 'Upload-Offset': offset, 'Content-Type': 'application/octet-stream'},
+                });
+            } catch (networkError) {
+                result = {ok: false, status: 0, data: {}};
+            }
+            if (result.ok) {
+                offset = result.data.offset;
+                retries = 0;
+                onProgress(offset / file.size);
+                continue;
+            }
+            if ((result.status && result.status !== 409 && result.status < 500) || ++retries > MAX_RETRIES) {
+                throw new Error(result.data.error || 'The upload failed.');
+            }
+            await sleep(1000 * retries);
+            const status = await request(url).catch(() => null);
+            if (status && status.ok) {
+                offset = status.data.offset;
+            }
+        }
+        const body = new FormData();
+        const done = await request(`${url}complete/`, {
+            method: 'POST', body: body, headers: {'X-CSRFToken': csrfToken(form)},
+        });
+        if (!done.ok) {
+            throw new Error(done.data.error || 'The upload could not be completed.');
+        }
+        return done.data;
+    }
+
+    function progressBar(input) {
+        const wrapper = document.createElement('div');
+        wrapper.className = 'progress mt-2';
+        wrapper.innerHTML = '<div class="progress-bar" role="progressbar" style="width: 0%">0%</div>';
+        input.insertAdjacentElement('afterend', wrapper);
+        return wrapper;
+    }
+
+    function enhance(form) {
+        const pending = new Set();
+        form.querySelectorAll('input[type=file][data-upload-purpose]').forEach(input => {
+            const hidden = form.querySelector(`input[name="${input.name}_upload"]`);
+            if (!hidden) {
+                return;
+            }
+            input.addEventListener('change', async () => {
+                const file = input.files[0];
+                hidden.value = '';
+                if (!file) {
+                    return;
+                }
+                const wrapper = progressBar(input);
+                const bar = wrapper.firstElementChild;
+                pending.add(input);
+                try {
+                    const opened = await openSession(form, input, file);
+                    const result = await sendChunks(form, file, opened.session, fraction => {
+                        const pct = Math.floor(fraction * 100);
+                        bar.style.width = `${pct}%`;
+                        bar.textContent = `${pct}%`;
+                    });
+                    window.localStorage.removeItem(opened.key);
+                    hidden.value = result.id;
+                    input.disabled = true;
+                    bar.classList.add('bg-success');
+                    bar.style.width = '100%';
+                    bar.textContent = `${file.name} uploaded`;
+                } catch (error) {
+                    bar.classList.add('bg-danger');
+                    bar.style.width = '100%';
+                    bar.textContent = error.message;
+                } finally {
+                    pending.delete(input);
+                }
+            });
+        });
+        form.addEventListener('submit', event => {
+            if (pending.size) {
+                event.preventDefault();
+                window.alert('Please wait for the upload to finish.');
+            }
+        });
+    }
+
+    document.querySelectorAll('form[data-upload-url][data-upload-target]').forEach(enhance);
+})();
@@ -0,0 +1,108 @@
+/*
+ * Search-as-you-type for inputs carrying data-typeahead-url (and optionally
+ * data-typeahead-kind to restrict the result kinds).
+ *
+ * Requests are debounced and a response is only shown if it belongs to the
+ * latest keystroke, so slow answers never overwrite newer ones. Arrow keys
+ * move through the suggestions and Enter opens the highlighted one; inputs
+ * without a name (the navbar box) open the first suggestion on Enter.
+ */
+(function () {
+    'use strict';
+
+    const DELAY_MS = 150;
+    const MIN_LENGTH = 2;
+
+    function attach(input) {
+        const menu = document.createElement('div');
+        menu.className = 'dropdown-menu shadow-sm typeahead-menu';
+        input.parentNode.style.position = 'relative';
+        input.insertAdjacentElement('afterend', menu);
+
+        let timer = null;
+        let latest = 0;
+        let active = -1;
+
+        function items() {
+            return Array.from(menu.querySelectorAll('.dropdown-item'));
+        }
+
+        function hide() {
+            menu.classList.remove('show');
+            active = -1;
+        }
+
+        function highlight(index) {
+            const links = items();
+            links.forEach((link, i) => link.classList.toggle('active', i === index));
+            active = index;
+        }
+
+        function render(results) {
+            menu.replaceChildren();
+            results.forEach(result => {
+                const link = document.createElement('a');
+                link.className = 'dropdown-item d-flex justify-content-between gap-3';
+                link.href = result.url;
+                const title = document.createElement('span');
+                title.className = 'text-truncate';
+                title.textContent = result.title;
+                const label = document.createElement('small');
+                label.className = 'text-muted';
+                label.textContent = result.label;
+                link.append(title, label);
+                menu.append(link);
+            });
+            active = -1;
+            menu.classList.toggle('show', results.length > 0);
+        }
+
+        async function lookup() {
+            const query = input.value.trim();
+            const request = ++latest;
+            if (query.length < MIN_LENGTH) {
+                hide();
+                return;
+            }
+            const params = new URLSearchParams({q: query});
+            if (input.dataset.typeaheadKind) {
+                params.append('kind', input.dataset.typeaheadKind);
+            }
+            const response = await fetch(`${input.dataset.typeaheadUrl}?${params}`, {credentials: 'same-origin'});
+            if (!response.ok || request !== latest) {
+                return;
+            }
+            render((await response.json()).results);
+        }
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(lookup, DELAY_MS);
+        });
+
+        input.addEventListener('keydown', event => {
+            const links = items();
+            if (!menu.classList.contains('show') || !links.length) {
+                return;
+            }
+            if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+                event.preventDefault();
+                const step = event.key === 'ArrowDown' ? 1 : -1;
+                highlight((active + step + links.length) % links.length);
+            } else if (event.key === 'Enter' && (active >= 0 || !input.name)) {
+                event.preventDefault();
+                window.location.href = links[Math.max(active, 0)].href;
+            } else if (event.key === 'Escape') {
+                hide();
+            }
+        });
+
+        input.addEventListener('blur', () => setTimeout(hide, 150));
+
+        if (!input.name && input.form) {
+            input.form.addEventListener('submit', event => event.preventDefault());
+        }
+    }
+
+    document.querySelectorAll('input[data-typeahead-url]').forEach(attach);
+})();